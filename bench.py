@@ -0,0 +1,186 @@
+import argparse
+import io
+import itertools
+import json
+import platform
+import resource
+import sqlite3
+import subprocess
+import time
+import tracemalloc
+import numpy as np, pandas as pd
+from infogain import ID3
+from gini import gini_tree
+from model import LEAF, compile_tree
+from synthetic import make_dataset
+from tracing import NULL_TRACER
+from render import write_dot
+from rules import compile_numpy, extract_rules, sql_query
+
+# Benchmarks for the tree builders and the tools around them on synthetic
+# data with a planted tree (see synthetic.py). Every configuration in the
+# grid of --rows x --features x --cardinality x ... is generated once, then
+# each stage is timed --repeat times and run once more under tracemalloc for
+# its peak memory. Results are written as JSON so runs on different commits
+# can be compared with --compare.
+#
+# Stages, per criterion (id3 / gini):
+#   build    grow the tree
+#   compile  compile it into a FlatTree (with training counts)
+#   predict  batch predict the training rows
+#   dot      build the Graphviz source (not rendered)
+#   rules    extract the classification rules
+#   numpy    batch predict the training rows with the rules compiled to NumPy
+#   sql      predict them with the rules compiled to a SQL CASE expression
+#            (run by an in-memory SQLite database holding the rows)
+#
+# Correctness is recorded next to the timings: accuracy on the training rows
+# and agreement with the planted tree on fresh noiseless rows. The compiled
+# rules must predict exactly like the FlatTree on the training and fresh
+# rows; the fraction of rows on which they do is recorded as well.
+
+STAGES = ["build", "compile", "predict", "dot", "rules", "numpy", "sql"]
+CRITERIA = ["id3", "gini"]
+
+def time_stage(func, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+def build(criterion, df, features, n_jobs):
+    if criterion == "id3":
+        return ID3(df, df, features, "target", tracer=NULL_TRACER, n_jobs=n_jobs)
+    return gini_tree(df, df, features, "target", tracer=NULL_TRACER, n_jobs=n_jobs)
+
+def bench_config(config, criteria, stages, repeat, n_jobs, holdout_rows):
+    df, planted = make_dataset(**config)
+    holdout, _ = make_dataset(**{**config, "n_rows": holdout_rows, "noise": 0.0, "seed": config["seed"] + 1}, planted=planted)
+    features = [column for column in df.columns if column != "target"]
+    results = []
+    for criterion in criteria:
+        record = {"config": config, "criterion": criterion, "stages": {}}
+        tree, seconds, peak = time_stage(lambda: build(criterion, df, features, n_jobs), repeat)
+        record["stages"]["build"] = stage_result(seconds, peak)
+        model, seconds, peak = time_stage(lambda: compile_tree(tree, features=features, data=df, target_attribute="target"), repeat)
+        if "compile" in stages:
+            record["stages"]["compile"] = stage_result(seconds, peak)
+        if "predict" in stages:
+            _, seconds, peak = time_stage(lambda: model.predict(df), repeat)
+            record["stages"]["predict"] = stage_result(seconds, peak)
+        if "dot" in stages:
+            _, seconds, peak = time_stage(lambda: write_dot(tree, sorted(df["target"].unique()), io.StringIO()), repeat)
+            record["stages"]["dot"] = stage_result(seconds, peak)
+        if "rules" in stages:
+            _, seconds, peak = time_stage(lambda: extract_rules(tree, "target"), repeat)
+            record["stages"]["rules"] = stage_result(seconds, peak)
+        if "numpy" in stages:
+            score = compile_numpy(model)
+            _, seconds, peak = time_stage(lambda: score(df), repeat)
+            record["stages"]["numpy"] = stage_result(seconds, peak)
+            record["numpy_agreement"] = float(np.mean(np.concatenate([model.predict(df) == score(df),
+                                                                      model.predict(holdout) == score(holdout)])))
+        if "sql" in stages:
+            database = sqlite3.connect(":memory:")
+            df.to_sql("train", database, index=False)
+            holdout.to_sql("holdout", database, index=False)
+            score = lambda table: np.array([row[-1] for row in database.execute(sql_query(model, table))], dtype=object)
+            _, seconds, peak = time_stage(lambda: score("train"), repeat)
+            record["stages"]["sql"] = stage_result(seconds, peak)
+            record["sql_agreement"] = float(np.mean(np.concatenate([model.predict(df) == score("train"),
+                                                                    model.predict(holdout) == score("holdout")])))
+            database.close()
+        record["tree"] = {"nodes": int(model.n_nodes), "leaves": int(np.sum(model.kind == LEAF)), "depth": int(model.depth.max())}
+        record["train_accuracy"] = float(np.mean(model.predict(df) == df["target"].to_numpy()))
+        record["planted_agreement"] = float(np.mean(model.predict(holdout) == holdout["target"].to_numpy()))
+        results.append(record)
+    return results
+
+def stage_result(seconds, peak):
+    return {"seconds": seconds, "best": min(seconds), "peak_bytes": peak}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+    }
+
+def config_key(record):
+    return (json.dumps(record["config"], sort_keys=True), record["criterion"])
+
+def print_results(results, baseline=None):
+    baseline = {config_key(r): r for r in baseline["results"]} if baseline else {}
+    header = f"{'rows':>8} {'feat':>4} {'card':>4} {'num':>4} {'cls':>3} {'noise':>5} {'crit':>4} {'stage':>8} {'best s':>9} {'peak MB':>8}"
+    print(header + (f" {'vs base':>8}" if baseline else "") + f" {'nodes':>6} {'train':>6} {'planted':>7}")
+    for record in results:
+        config = record["config"]
+        old = baseline.get(config_key(record))
+        for stage, result in record["stages"].items():
+            line = (f"{config['n_rows']:>8} {config['n_features']:>4} {config['cardinality']:>4} {config['numeric_fraction']:>4} "
+                    f"{config['n_classes']:>3} {config['noise']:>5} {record['criterion']:>4} {stage:>8} "
+                    f"{result['best']:>9.4f} {result['peak_bytes'] / 2**20:>8.1f}")
+            if baseline:
+                ratio = result["best"] / old["stages"][stage]["best"] if old and stage in old["stages"] else None
+                line += f" {ratio:>7.2f}x" if ratio else f" {'-':>8}"
+            tree = record["tree"]
+            print(line + f" {tree['nodes']:>6} {record['train_accuracy']:>6.3f} {record['planted_agreement']:>7.3f}")
+        for form in ("numpy", "sql"):
+            if record.get(f"{form}_agreement", 1.0) < 1.0:
+                print(f"  warning: {form} rules agree with the tree on only {record[f'{form}_agreement']:.4f} of the rows")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the decision tree builders on synthetic data with a planted tree')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000], help='Row counts to benchmark')
+    parser.add_argument('--features', type=int, nargs='+', default=[8], help='Feature counts')
+    parser.add_argument('--cardinality', type=int, nargs='+', default=[4], help='Levels per categorical feature')
+    parser.add_argument('--numeric', type=float, nargs='+', default=[0.25], help='Fraction of numeric features')
+    parser.add_argument('--classes', type=int, nargs='+', default=[2], help='Number of classes')
+    parser.add_argument('--noise', type=float, nargs='+', default=[0.0], help='Fraction of flipped labels')
+    parser.add_argument('--depth', type=int, default=4, help='Depth of the planted tree')
+    parser.add_argument('--decimals', type=int, default=2, help='Decimal places of numeric features')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the generator')
+    parser.add_argument('--criteria', nargs='+', default=CRITERIA, choices=CRITERIA, help='Builders to benchmark')
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES, help='Stages to time (build is always run)')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (the best is reported)')
+    parser.add_argument('--n-jobs', type=int, default=1, help='Worker processes used to build each tree')
+    parser.add_argument('--holdout', type=int, default=2000, help='Fresh rows used to check agreement with the planted tree')
+    parser.add_argument('--output', type=str, help='Write the results as JSON to this file')
+    parser.add_argument('--compare', type=str, help='JSON results of an earlier run to compare against')
+    args = parser.parse_args()
+
+    results = []
+    for n_rows, n_features, cardinality, numeric_fraction, n_classes, noise in itertools.product(
+            args.rows, args.features, args.cardinality, args.numeric, args.classes, args.noise):
+        config = {"n_rows": n_rows, "n_features": n_features, "cardinality": cardinality, "numeric_fraction": numeric_fraction,
+                  "n_classes": n_classes, "noise": noise, "depth": args.depth, "decimals": args.decimals, "seed": args.seed}
+        results += bench_config(config, args.criteria, args.stages, args.repeat, args.n_jobs, args.holdout)
+
+    report = {"environment": environment(), "n_jobs": args.n_jobs, "results": results,
+              "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import pandas as pd, numpy as np
+
+# Columnar, integer-encoded view of a training frame shared by the ID3 and
+# Gini builders. Every feature is factorized once into a compact code array
+# (codes follow the sorted order of the values, so numeric codes are ranks)
+# and the target into class codes. A node is just a (lo, hi) range into
+# `perm`, a permutation of the row indices that is partitioned in place as
+# the tree grows, so the data is never copied per node.
+#
+# With `n_bins`, numeric features with more distinct values than that are
+# bucketed once on quantiles of the whole column (see bin_bounds): their
+# codes are bins, their categories the bins' upper bounds and `binned` marks
+# them, so no node table of theirs is more than n_bins (+1 for NaN) tall.
+class EncodedDataset:
+    def __init__(self, data, features, target_attribute, n_bins=None):
+        self.features = list(features)
+        self.target_attribute = target_attribute
+        self.feature_index = {feature: j for j, feature in enumerate(self.features)}
+        self.classes, y = np.unique(data[target_attribute], return_inverse=True)
+        self.y = y.astype(np.int32)
+        self.n_rows = len(data)
+        self.n_classes = len(self.classes)
+
+        self.categories = []
+        self.numeric = np.zeros(len(self.features), dtype=bool)
+        self.binned = np.zeros(len(self.features), dtype=bool)
+        self.codes = np.empty((len(self.features), self.n_rows), dtype=np.int32)
+        for j, feature in enumerate(self.features):
+            column = data[feature]
+            self.numeric[j] = column.dtype.kind in 'iufc'
+            codes, categories = pd.factorize(column.to_numpy(), sort=True, use_na_sentinel=False)
+            if self.numeric[j] and n_bins and np.count_nonzero(~np.isnan(categories)) > n_bins:
+                bounds = bin_bounds(categories, np.bincount(codes, minlength=len(categories)), n_bins)
+                codes, categories = bin_codes(bounds, categories)[codes], bounds
+                self.binned[j] = True
+            self.codes[j] = codes
+            self.categories.append(categories)
+
+        self.perm = np.arange(self.n_rows, dtype=np.intp)
+
+    # Rebuild a dataset around existing arrays (e.g. views of shared memory)
+    @classmethod
+    def from_arrays(cls, features, target_attribute, classes, categories, numeric, codes, y, perm, binned=None):
+        dataset = cls.__new__(cls)
+        dataset.features = list(features)
+        dataset.target_attribute = target_attribute
+        dataset.feature_index = {feature: j for j, feature in enumerate(dataset.features)}
+        dataset.classes = classes
+        dataset.categories = categories
+        dataset.numeric = numeric
+        dataset.binned = np.zeros(len(dataset.features), dtype=bool) if binned is None else binned
+        dataset.codes = codes
+        dataset.y = y
+        dataset.perm = perm
+        dataset.n_rows = len(y)
+        dataset.n_classes = len(classes)
+        return dataset
+
+    def rows(self, lo, hi):
+        return self.perm[lo:hi]
+
+    # Class histogram of the rows in a node
+    def class_counts(self, lo, hi):
+        return np.bincount(self.y[self.perm[lo:hi]], minlength=self.n_classes)
+
+    # Level x class count table of feature `j` over the rows in a node. Rows
+    # are levels of the whole column, so levels absent from the node are zero.
+    def contingency(self, j, lo, hi):
+        rows = self.perm[lo:hi]
+        n_levels = len(self.categories[j])
+        flat = self.codes[j, rows].astype(np.intp) * self.n_classes + self.y[rows]
+        return np.bincount(flat, minlength=n_levels * self.n_classes).reshape(n_levels, self.n_classes)
+
+    # Same table over only the levels present in the node, as (levels, table)
+    # with the level codes in ascending order. A column with more levels than
+    # the node has rows is not counted level by level but through the node's
+    # own distinct codes, so small nodes of high-cardinality columns cost
+    # their rows rather than the size of the column.
+    def node_contingency(self, j, lo, hi):
+        rows = self.perm[lo:hi]
+        if len(self.categories[j]) <= len(rows):
+            table = self.contingency(j, lo, hi)
+            levels = np.flatnonzero(table.sum(axis=1))
+            return levels, table[levels]
+        levels, inverse = np.unique(self.codes[j, rows], return_inverse=True)
+        flat = inverse.reshape(-1).astype(np.intp) * self.n_classes + self.y[rows]
+        return levels, np.bincount(flat, minlength=len(levels) * self.n_classes).reshape(len(levels), self.n_classes)
+
+    # Position of each code of feature `j` in the node perm[lo:hi] among the
+    # node's `levels` (as node_contingency returns them)
+    def level_positions(self, j, lo, hi, levels):
+        return np.searchsorted(levels, self.codes[j, self.perm[lo:hi]])
+
+    # Reorder perm[lo:hi] so that rows with the same child id are contiguous
+    # (keeping their relative order) and return the (lo, hi) range of each child
+    def partition(self, lo, hi, child_ids, n_children):
+        order = np.argsort(child_ids, kind='stable')
+        self.perm[lo:hi] = self.perm[lo:hi][order]
+        bounds = lo + np.concatenate([[0], np.cumsum(np.bincount(child_ids, minlength=n_children))])
+        return [(int(bounds[i]), int(bounds[i + 1])) for i in range(n_children)]
+
+# Upper bounds of quantile bins over the distinct `values` of a numeric
+# feature, sorted as EncodedDataset codes them, with their row `counts`
+# (cut midway between values, like exact splits), then +inf and, if the
+# column has missing values, a trailing NaN bin
+def bin_bounds(values, counts, n_bins):
+    observed = ~np.isnan(values)
+    values, counts = values[observed].astype(float), counts[observed]
+    cumulative = np.cumsum(counts)
+    cuts = np.unique(np.searchsorted(cumulative, cumulative[-1] * np.arange(1, n_bins) / n_bins))
+    cuts = cuts[cuts < len(values) - 1]
+    bounds = np.append((values[cuts] + values[cuts + 1]) / 2, np.inf)
+    return np.append(bounds, np.nan) if not observed.all() else bounds
+
+# Bin of every value given the bounds from bin_bounds (missing values fall in
+# the NaN bin)
+def bin_codes(bounds, values):
+    return np.searchsorted(bounds[~np.isnan(bounds)], np.asarray(values, dtype=float))
+
+# Statistics of one node, each computed at most once: the class histogram
+# (handed down by the parent when it already knows it), the node impurity
+# under the builder's criterion and the level x class table of every
+# feature asked for, over the levels present in the node (`levels` gives
+# their codes). Split scoring, partitioning and the
+# trace all read from here; `release` drops the tables once the node has
+# been split so only the node currently being scored holds any (`keep`
+# spares the table of the feature a node waiting to be split will use).
+class NodeStats:
+    def __init__(self, dataset, lo, hi, class_counts=None):
+        self.dataset = dataset
+        self.lo = lo
+        self.hi = hi
+        self.n_rows = hi - lo
+        self.class_counts = dataset.class_counts(lo, hi) if class_counts is None else class_counts
+        self.node_impurity = None
+        self.tables = {}
+
+    def impurity(self, impurity_from_counts):
+        if self.node_impurity is None:
+            self.node_impurity = impurity_from_counts(self.class_counts)
+        return self.node_impurity
+
+    def contingency(self, j):
+        if j not in self.tables:
+            self.tables[j] = self.dataset.node_contingency(j, self.lo, self.hi)
+        return self.tables[j][1]
+
+    def levels(self, j):
+        self.contingency(j)
+        return self.tables[j][0]
+
+    # Take tables already counted elsewhere over every level of their
+    # columns, by feature index
+    def add_tables(self, tables):
+        for j, table in tables.items():
+            levels = np.flatnonzero(table.sum(axis=1))
+            self.tables[j] = levels, table[levels]
+
+    def release(self, keep=None):
+        table = self.tables.get(keep)
+        self.tables.clear()
+        if table is not None:
+            self.tables[keep] = table
@@ -0,0 +1,128 @@
+import math
+import numpy as np
+from dataset import EncodedDataset
+from infogain import ID3_, ID3_best_first
+from gini import gini_tree_, gini_tree_best_first
+from model import compile_tree, encoded_rows, threshold_features
+from parallel import WorkerPool, resolve_n_jobs
+from stopping import NO_LIMITS, Limits
+
+# Random forests: bagged ensembles of ID3 or Gini trees. Every tree is grown
+# by the usual builder on a bootstrap sample of the rows (n rows drawn with
+# replacement) and scores a random subset of `max_features` features at each
+# node (see stopping.Limits.candidates). The data is encoded once; with
+# n_jobs > 1 whole trees are built by a WorkerPool over that single encoded
+# dataset in shared memory, each worker drawing its sample as its own row
+# permutation, so the rows are never copied per worker. A tree depends only
+# on its seed, so the forest is the same whatever n_jobs is.
+#
+# Each tree is compiled into a FlatTree on the forest's shared vocabulary,
+# so a batch is encoded once and sent down every tree. The rows a tree did
+# not draw (its out-of-bag rows) are predicted as it is built, which gives
+# the out-of-bag error without a separate validation pass.
+
+# Features scored per node for a `max_features` of None (all), an int, a
+# fraction of the features, "sqrt" or "log2"
+def resolve_max_features(max_features, n_features):
+    if max_features is None:
+        return None
+    if max_features == "sqrt":
+        return max(1, int(math.sqrt(n_features)))
+    if max_features == "log2":
+        return max(1, int(math.log2(n_features)))
+    if isinstance(max_features, float):
+        return max(1, int(max_features * n_features))
+    return max_features
+
+# Worker task: grow one tree on the bootstrap sample drawn from `seed`, then
+# compile it and predict its out-of-bag rows. Returns the tree, its
+# FlatTree (with class counts of the sample) and the out-of-bag rows with
+# their predicted class codes.
+def grow_tree(dataset, criterion, seed, numeric, limits, max_exhaustive_levels, beam_width, beam_rounds):
+    sample = np.random.default_rng(seed).integers(0, dataset.n_rows, dataset.n_rows)
+    bag = EncodedDataset.from_arrays(dataset.features, dataset.target_attribute, dataset.classes, dataset.categories, dataset.numeric,
+                                     dataset.codes, dataset.y, sample, dataset.binned)
+    if criterion == "entropy":
+        grow = ID3_best_first if limits.best_first else ID3_
+        tree = grow(bag, 0, len(sample), dataset.features, limits=limits)
+    else:
+        grow = gini_tree_best_first if limits.best_first else gini_tree_
+        tree = grow(bag, 0, len(sample), dataset.features, max_exhaustive_levels=max_exhaustive_levels, beam_width=beam_width,
+                    beam_rounds=beam_rounds, limits=limits)
+    model = compile_tree(tree, features=dataset.features, classes=dataset.classes, vocabulary=(dataset.categories, numeric))
+    rows = np.sort(sample)
+    model.fit_encoded_counts(*encoded_rows(dataset, numeric, rows), dataset.y[rows])
+    out_of_bag = np.flatnonzero(np.bincount(sample, minlength=dataset.n_rows) == 0)
+    node, _ = model.route(*encoded_rows(dataset, numeric, out_of_bag))
+    return tree, model, out_of_bag, model.value[node]
+
+class Forest:
+    def __init__(self, trees, models, classes, criterion):
+        self.trees = trees
+        self.models = models
+        self.classes = classes
+        self.criterion = criterion
+        self.oob_votes = None
+        self.oob_error = None
+
+    # Votes of the trees for every class, as an n x classes count matrix
+    def votes(self, X):
+        codes, values = self.models[0].encode(X)
+        n = codes.shape[1]
+        flat = np.zeros(n * len(self.classes), dtype=np.int64)
+        offsets = np.arange(n) * len(self.classes)
+        for model in self.models:
+            node, _ = model.route(codes, values)
+            flat += np.bincount(offsets + model.value[node], minlength=len(flat))
+        return flat.reshape(n, len(self.classes))
+
+    # Majority vote of the trees (ties go to the first class)
+    def predict(self, X):
+        return self.classes[np.argmax(self.votes(X), axis=1)]
+
+    # Class proportions of the leaves each row ends in, averaged over the trees
+    def predict_proba(self, X):
+        codes, values = self.models[0].encode(X)
+        proba = np.zeros((codes.shape[1], len(self.classes)))
+        for model in self.models:
+            node, _ = model.route(codes, values)
+            counts = model.counts[node].astype(float)
+            proba += counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+        return proba / len(self.models)
+
+# Grow a forest of `n_trees` trees with the "entropy" (ID3) or "gini"
+# criterion. `limits` (a stopping.Limits) applies to every tree; its
+# max_features is replaced by `max_features`. Trees are built on `n_jobs`
+# processes (-1 for all cores).
+def random_forest(data, features, target_attribute, n_trees=100, criterion="entropy", max_features="sqrt", seed=0, n_jobs=1,
+                  limits=None, max_exhaustive_levels=12, beam_width=8, beam_rounds=None, n_bins=None):
+    if criterion not in ("entropy", "gini"):
+        raise ValueError(f"Unknown criterion {criterion!r}; use 'entropy' or 'gini'")
+    if len(data) == 0:
+        raise ValueError("No rows to train on")
+    dataset = EncodedDataset(data, features, target_attribute, n_bins if criterion == "gini" else None)
+    numeric = threshold_features(dataset, criterion == "gini")
+    limits = NO_LIMITS if limits is None else limits
+    max_features = resolve_max_features(max_features, len(dataset.features))
+    tasks = []
+    for tree_seed in np.random.SeedSequence(seed).generate_state(n_trees):
+        tree_limits = Limits(limits.max_depth, limits.min_samples_split, limits.min_samples_leaf, limits.min_impurity_decrease,
+                             limits.max_leaf_nodes, limits.max_nodes, limits.max_seconds, max_features, int(tree_seed))
+        tasks.append((criterion, int(tree_seed), numeric, tree_limits, max_exhaustive_levels, beam_width, beam_rounds))
+
+    if resolve_n_jobs(n_jobs) > 1 and n_trees > 1:
+        with WorkerPool(dataset, n_jobs) as pool:
+            results = pool.map(grow_tree, tasks)
+    else:
+        results = [grow_tree(dataset, *args) for args in tasks]
+
+    forest = Forest([r[0] for r in results], [r[1] for r in results], dataset.classes, criterion)
+    n_classes = len(dataset.classes)
+    flat = np.zeros(dataset.n_rows * n_classes, dtype=np.int64)
+    for _, _, out_of_bag, predicted in results:
+        flat += np.bincount(out_of_bag * n_classes + predicted, minlength=len(flat))
+    forest.oob_votes = flat.reshape(dataset.n_rows, n_classes)
+    voted = forest.oob_votes.sum(axis=1) > 0
+    if voted.any():
+        forest.oob_error = float(np.mean(np.argmax(forest.oob_votes[voted], axis=1) != dataset.y[voted]))
+    return forest
@@ -1,8 +1,12 @@
 import pandas as pd, numpy as np
 from itertools import combinations
-
-def generate_indent_tree_blocks(depth, right):
-    return "".join(["│  " if not int(right[i]) else "   " for i in range(depth)])
+from functools import lru_cache
+from dataset import EncodedDataset, NodeStats
+from tracing import ConsoleTracer, RecordingTracer, NULL_TRACER, replay
+from parallel import WorkerPool, PARALLEL_MIN_ROWS, resolve_n_jobs
+from profiling import Profiler, NULL_PROFILER
+from model import BranchLabel
+from stopping import NO_LIMITS, Frontier, cut_leaf, leaf_before_split
 
 # Gini Index function
 def gini_index(target_col):
@@ -12,173 +16,590 @@ def gini_index(target_col):
     gini = 1 - np.sum(gini_components)
     return gini, elements, counts, gini_components
 
-# Helper function to print Gini calculation details
-def print_gini_details(elements, counts, gini_components):
-    total_elements = np.sum(counts)
-    details = []
-    for i in range(len(elements)):
-        details.append(f"({counts[i]}/{total_elements})^2")
-    joined_details = " + ".join(details)
-    gini_values = " + ".join([f"{1 - gini_component:0.4f}" for gini_component in gini_components])
-    total_gini = 1 - np.sum(gini_components)
-    return f"{joined_details} = {gini_values} = {total_gini:0.4f}"
-
-# Gini binary split function
-def gini_split(data, feature, target_attribute, depth=0, right=""):
-    total_gini, _, _, _ = gini_index(data[target_attribute])
-    vals = np.unique(data[feature])
-    
+# Gini index of every row of a count table (last axis = classes)
+def gini_from_counts(counts):
+    counts = np.asarray(counts, dtype=float)
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        proportions = np.where(totals > 0, counts / totals, 0.0)
+    return 1 - np.sum(proportions ** 2, axis=-1)
+
+# Weighted Gini of the binary partitions described by `masks` (one row per
+# candidate, one column per level) over a level x class count table
+def weighted_gini_of_partitions(table, masks):
+    table = np.asarray(table, dtype=float)
+    return weighted_gini_of_left(masks.astype(float) @ table, table.sum(axis=0))
+
+# Weighted Gini of binary partitions from the class counts of their left
+# sides (one row per partition) and of the whole node
+def weighted_gini_of_left(left, total):
+    right = total - left
+    n_left = left.sum(axis=1)
+    n_right = right.sum(axis=1)
+    n = n_left + n_right
+    return (n_left / n) * gini_from_counts(left) + (n_right / n) * gini_from_counts(right)
+
+# All 2^(k-1) - 1 distinct binary partitions of k levels as boolean masks, in
+# the order `combinations` visits them (a subset is skipped when its complement
+# was already seen, so half-size subsets must contain the first level)
+@lru_cache(maxsize=None)
+def exhaustive_partitions(k):
+    masks = []
+    for i in range(1, k // 2 + 1):
+        for subset in combinations(range(k), i):
+            if 2 * i == k and subset[0] != 0:
+                continue
+            mask = np.zeros(k, dtype=bool)
+            mask[list(subset)] = True
+            masks.append(mask)
+    masks = np.array(masks, dtype=bool).reshape(-1, k)
+    masks.flags.writeable = False
+    return masks
+
+# Prefixes of a level ordering as partition masks (k - 1 candidates)
+def ordered_partitions(order):
+    k = len(order)
+    ranks = np.empty(k, dtype=int)
+    ranks[order] = np.arange(k)
+    return ranks[None, :] < np.arange(1, k)[:, None]
+
+# Breiman's shortcut for two classes: sorting the levels by the proportion of
+# one class, the optimal partition is one of the k - 1 prefixes of that order
+def sorted_partitions(table):
+    present = np.flatnonzero(table.sum(axis=0))
+    positive = table[:, present[-1]] if len(present) else table[:, 0]
+    proportions = positive / np.maximum(table.sum(axis=1), 1)
+    return ordered_partitions(np.argsort(proportions, kind='stable'))
+
+# Beam search over partitions for many levels and more than two classes: seed
+# with the class-proportion orderings of every class, then repeatedly move one
+# level across the split, keeping the `beam_width` best partitions each round,
+# for at most `max_rounds` rounds (default: one per level). A move is scored
+# from the class counts of its beam partition's left side plus or minus the
+# moved level's row of the table, and partitions are told apart by a 64-bit
+# key (the XOR of random keys of their left levels, or of their right levels
+# if smaller), so only the partitions kept in the beam are built as masks.
+# Moves already in the beam or repeated within a round are dropped. This is
+# a heuristic: unlike the two-class ordering it can miss the optimal
+# partition, but since it starts from the class-proportion orderings it
+# never does worse than the best of them.
+#
+# Returns the best partition leaving at least `min_samples_leaf` rows on both
+# sides (or, if none does, the best one) as a one-row mask array with its
+# score or, with `keep_visited`, every partition visited in the order they
+# were first visited, plus the number of partitions scored.
+def beam_partitions(table, beam_width=8, max_rounds=None, min_samples_leaf=1, keep_visited=False):
+    table = np.asarray(table, dtype=float)
+    k = table.shape[0]
+    level_counts = table.sum(axis=1)
+    total = table.sum(axis=0)
+    level_keys = np.random.default_rng(k).integers(0, np.iinfo(np.int64).max, k, dtype=np.int64)
+    all_levels = np.bitwise_xor.reduce(level_keys)
+
+    def canonical_keys(keys):
+        return np.minimum(keys, keys ^ all_levels)
+
+    # Scores of partitions from the class counts of their left sides, inf
+    # when a side is too small (for picking the best partition)
+    def allowed(left, scores):
+        if min_samples_leaf <= 1:
+            return scores
+        n_left = left.sum(axis=1)
+        return np.where((n_left >= min_samples_leaf) & (level_counts.sum() - n_left >= min_samples_leaf), scores, np.inf)
+
+    proportions = table / np.maximum(level_counts[:, None], 1)
+    seeds = np.vstack([ordered_partitions(np.argsort(proportions[:, c], kind='stable')) for c in np.flatnonzero(total)])
+    keys = canonical_keys(np.bitwise_xor.reduce(np.where(seeds, level_keys, 0), axis=1))
+    _, first = np.unique(keys, return_index=True)
+    first = np.sort(first)
+    masks, keys = seeds[first], keys[first]
+    left = masks.astype(float) @ table
+    scores = weighted_gini_of_left(left, total)
+    n_scored = len(masks)
+    visited_masks, visited_keys, visited_scores = [masks], [keys], [scores]
+    candidate = allowed(left, scores)
+    best_mask, best_score = masks[np.argmin(candidate)], candidate.min()
+
+    # Partitions of the beam members `member` with `level` moved across
+    def moved_masks(beam, member, level):
+        masks = beam[member]
+        masks[np.arange(len(masks)), level] ^= True
+        return masks
+
+    order = np.argsort(scores, kind='stable')[:beam_width]
+    beam, beam_left, beam_keys, beam_scores = masks[order], left[order], keys[order], scores[order]
+    lowest = scores.min()
+    for _ in range(max_rounds if max_rounds is not None else k):
+        # Every move of every beam partition, as (beam member, level)
+        sizes = (beam.sum(axis=1)[:, None] + np.where(beam, -1, 1)).ravel()
+        keys = canonical_keys(beam_keys[:, None] ^ level_keys[None, :]).ravel()
+        moves = np.flatnonzero((sizes > 0) & (sizes < k))
+        _, first = np.unique(keys[moves], return_index=True)
+        moves = moves[np.sort(first)]
+        moves = moves[~np.isin(keys[moves], beam_keys)]
+        if len(moves) == 0:
+            break
+        member, level = np.divmod(moves, k)
+        left = beam_left[member] + np.where(beam[member, level][:, None], -table[level], table[level])
+        flip_scores = weighted_gini_of_left(left, total)
+        n_scored += len(moves)
+        if keep_visited:
+            visited_masks.append(moved_masks(beam, member, level))
+            visited_keys.append(keys[moves])
+            visited_scores.append(flip_scores)
+        candidate = allowed(left, flip_scores)
+        if candidate.min() < best_score:
+            best = np.argmin(candidate)
+            best_mask, best_score = moved_masks(beam, member[[best]], level[[best]])[0], candidate[best]
+
+        pool_scores = np.concatenate([beam_scores, flip_scores])
+        order = np.argsort(pool_scores, kind='stable')[:beam_width]
+        kept, moved = order[order < len(beam)], order[order >= len(beam)] - len(beam)
+        beam = np.vstack([beam[kept], moved_masks(beam, member[moved], level[moved])])
+        beam_left = np.vstack([beam_left[kept], left[moved]])
+        beam_keys = np.concatenate([beam_keys[kept], keys[moves[moved]]])
+        beam_scores = np.concatenate([beam_scores[kept], flip_scores[moved]])
+        if pool_scores.min() >= lowest:
+            break
+        lowest = pool_scores.min()
+    if keep_visited:
+        _, first = np.unique(np.concatenate(visited_keys), return_index=True)
+        first = np.sort(first)
+        return canonical_partitions(np.vstack(visited_masks)[first]), np.concatenate(visited_scores)[first], n_scored
+    return canonical_partitions(best_mask[None, :]), np.array([best_score]), n_scored
+
+# Orient partitions so that the left side is the smaller one (ties keep the
+# first level on the left), matching how exhaustive search names them
+def canonical_partitions(masks):
+    masks = np.array(masks, dtype=bool)
+    k = masks.shape[1]
+    sizes = masks.sum(axis=1)
+    flip = (2 * sizes > k) | ((2 * sizes == k) & ~masks[:, 0])
+    masks[flip] = ~masks[flip]
+    return masks
+
+# Score binary partitions of a categorical feature from its level x class count
+# table. Exhaustive search is used up to `max_exhaustive_levels` levels so the
+# result matches enumerating every subset; beyond that two-class targets use
+# the exact sorted ordering and multiclass targets fall back to beam search
+# (see beam_partitions; unless `keep_visited` it returns only its best
+# partition). Partitions leaving fewer than `min_samples_leaf` rows on a side
+# score inf. Also returns the number of partitions scored.
+def categorical_partitions(table, max_exhaustive_levels=12, beam_width=8, beam_rounds=None, min_samples_leaf=1, keep_visited=True):
+    table = np.asarray(table)
+    k = table.shape[0]
+    if k < 2:
+        return np.zeros((0, k), dtype=bool), np.zeros(0), 0
+    if k <= max_exhaustive_levels:
+        masks = exhaustive_partitions(k)
+        scores = weighted_gini_of_partitions(table, masks)
+        n_scored = len(masks)
+    elif np.count_nonzero(table.sum(axis=0)) <= 2:
+        masks = canonical_partitions(sorted_partitions(table))
+        scores = weighted_gini_of_partitions(table, masks)
+        n_scored = len(masks)
+    else:
+        masks, scores, n_scored = beam_partitions(table, beam_width, beam_rounds, min_samples_leaf, keep_visited)
+    if min_samples_leaf > 1:
+        level_counts = table.sum(axis=1)
+        n_left = masks.astype(np.int64) @ level_counts
+        n_right = level_counts.sum() - n_left
+        scores = np.where((n_left >= min_samples_leaf) & (n_right >= min_samples_leaf), scores, np.inf)
+    return masks, scores, n_scored
+
+# Candidate thresholds of a numeric feature and their weighted Gini, from its
+# value x class count table (values in ascending order, as the dataset codes
+# them). All thresholds are scored from one cumulative sweep of the counts.
+# If `binned`, the values are the upper bounds of pre-computed bins (see
+# dataset.bin_bounds) and the thresholds are those bounds rather than
+# midpoints between values.
+# Missing values always fall on the right-hand side of the threshold.
+# Thresholds leaving fewer than `min_samples_leaf` rows on a side score inf.
+def numeric_partitions(values, table, binned=False, min_samples_leaf=1):
+    values = np.asarray(values, dtype=float)
+    missing = np.isnan(values)
+    observed = (table.sum(axis=1) > 0) & ~missing
+    right_extra = table[missing].sum(axis=0)
+    values, table = values[observed], table[observed]
+    cuts = np.arange(len(values) - 1)
+    thresholds = values[cuts] if binned else (values[cuts] + values[cuts + 1]) / 2
+    left = np.cumsum(table, axis=0)[cuts]
+    right = table.sum(axis=0) + right_extra - left
+    n_left = left.sum(axis=1)
+    n_right = right.sum(axis=1)
+    n = n_left + n_right
+    weighted_ginis = (n_left / n) * gini_from_counts(left) + (n_right / n) * gini_from_counts(right)
+    if min_samples_leaf > 1:
+        weighted_ginis = np.where((n_left >= min_samples_leaf) & (n_right >= min_samples_leaf), weighted_ginis, np.inf)
+    return thresholds, weighted_ginis
+
+# Gini binary split function. Scores every binary split of `feature` over the
+# rows perm[lo:hi] of an EncodedDataset; the best split is returned as its two
+# branch labels plus a boolean array telling which of the levels present in
+# the node (NodeStats.levels) go left. The labels
+# of the other candidates are only built when the tracer is enabled.
+# Candidates leaving fewer than `min_samples_leaf` rows on a side are skipped.
+def gini_split(dataset, lo, hi, feature, depth=0, right="", max_exhaustive_levels=12, beam_width=8, beam_rounds=None, tracer=NULL_TRACER,
+               profiler=NULL_PROFILER, stats=None, min_samples_leaf=1):
+    stats = NodeStats(dataset, lo, hi) if stats is None else stats
+    j = dataset.feature_index[feature]
+    total_gini = stats.impurity(gini_from_counts)
+    return split_from_table(feature, dataset.categories[j][stats.levels(j)], dataset.numeric[j], stats.contingency(j), total_gini,
+                            depth, right, max_exhaustive_levels, beam_width, beam_rounds, tracer, dataset.binned[j], profiler,
+                            min_samples_leaf)
+
+# Same as gini_split, from an already accumulated level x class count table
+# and the values of its rows
+def split_from_table(feature, categories, numeric, table, total_gini, depth=0, right="", max_exhaustive_levels=12, beam_width=8, beam_rounds=None,
+                     tracer=NULL_TRACER, binned=False, profiler=NULL_PROFILER, min_samples_leaf=1):
     min_gini = float('inf')
     best_split = None
     split_details = []
 
-    indent = generate_indent_tree_blocks(depth, right)
-    if data[feature].dtype.kind in 'iufc':  # For continuous attributes
-        print("--> WARNING: CONTINUOUS SPLITS HAVE NOT BEEN TESTED <---")
-        vals = sorted(vals)
-        for i in range(1, len(vals)):
-            split_point = (vals[i-1] + vals[i]) / 2
-            D1 = data[data[feature] <= split_point]
-            D2 = data[data[feature] > split_point]
-            gini_D1 = gini_index(D1[target_attribute])[0]
-            gini_D2 = gini_index(D2[target_attribute])[0]
-            weighted_gini = (len(D1) / len(data)) * gini_D1 + (len(D2) / len(data)) * gini_D2
-            split_details.append((f"{feature} <= {split_point}", weighted_gini))
-            print(f"{indent}     ├─ Considering: {feature} <= {split_point}:\t {weighted_gini:0.4f}")
-            if weighted_gini < min_gini:
-                min_gini = weighted_gini
-                best_split = (f"{feature} <= {split_point}", D1, D2)
+    if numeric:  # For continuous attributes
+        thresholds, weighted_ginis = numeric_partitions(categories, table, binned, min_samples_leaf)
+        if tracer.enabled:
+            for split_point, weighted_gini in zip(thresholds, weighted_ginis):
+                if weighted_gini == np.inf:
+                    continue
+                split_details.append((f"{feature} <= {split_point}", weighted_gini))
+                tracer.emit("candidate_scored", criterion="gini", depth=depth, path=right, feature=feature, kind="numeric",
+                            split=f"{feature} <= {split_point}", impurity=total_gini, weighted_impurity=weighted_gini)
+        if len(weighted_ginis):
+            best = np.argmin(weighted_ginis)
+            min_gini = weighted_ginis[best]
+            split_point = thresholds[best]
+            go_left = np.asarray(categories, dtype=float) <= split_point
+            best_split = (BranchLabel(f"{feature} <= {split_point}", feature, "<=", split_point),
+                          BranchLabel(f"{feature} > {split_point}", feature, ">", split_point), go_left)
     else:  # For categorical attributes
-        seen_splits = set()
-        for i in range(1, len(vals)):
-            subsets = list(combinations(vals, i))
-            for subset in subsets:
-                subset1 = frozenset(subset)
+        present = table.sum(axis=1) > 0
+        vals = np.asarray(categories)[present]
+        masks, weighted_ginis, n_scored = categorical_partitions(table[present], max_exhaustive_levels, beam_width, beam_rounds,
+                                                                 min_samples_leaf, tracer.enabled)
+        if tracer.enabled:
+            for mask, weighted_gini in zip(masks, weighted_ginis):
+                if weighted_gini == np.inf:
+                    continue
+                subset1 = frozenset(vals[mask])
                 subset2 = frozenset(vals) - subset1
-                if (subset1, subset2) not in seen_splits and (subset2, subset1) not in seen_splits:
-                    seen_splits.add((subset1, subset2))
-                    D1 = data[data[feature].isin(subset1)]
-                    D2 = data[data[feature].isin(subset2)]
-                    gini_D1 = gini_index(D1[target_attribute])[0]
-                    gini_D2 = gini_index(D2[target_attribute])[0]
-                    weighted_gini = (len(D1) / len(data)) * gini_D1 + (len(D2) / len(data)) * gini_D2
-                    split_details.append((f"{feature} in {set(subset1)} vs. {set(subset2)}", weighted_gini))
-                    lhs_string = f"{indent}│  ├──── {feature} in {set(subset1)} vs. {set(subset2)}"
-                    rhs_string = f": {total_gini:0.4f} - {total_gini-weighted_gini:0.4f} = {weighted_gini:0.4f}"
-                    print(f"{lhs_string:<55}{rhs_string}")
-                    if weighted_gini < min_gini:
-                        min_gini = weighted_gini
-                        best_split = (f"{feature} in {set(subset1)}", f"{feature} in {set(subset2)}", D1, D2)
+                split_details.append((f"{feature} in {set(subset1)} vs. {set(subset2)}", weighted_gini))
+                tracer.emit("candidate_scored", criterion="gini", depth=depth, path=right, feature=feature, kind="categorical",
+                            split=split_details[-1][0], impurity=total_gini, weighted_impurity=weighted_gini)
+        if len(weighted_ginis):
+            best = np.argmin(weighted_ginis)
+            min_gini = weighted_ginis[best]
+            subset1 = frozenset(vals[masks[best]])
+            subset2 = frozenset(vals) - subset1
+            go_left = np.zeros(len(categories), dtype=bool)
+            go_left[np.flatnonzero(present)[masks[best]]] = True
+            best_split = (BranchLabel(f"{feature} in {set(subset1)}".replace("frozenset", ""), feature, "in", subset1),
+                          BranchLabel(f"{feature} in {set(subset2)}".replace("frozenset", ""), feature, "in", subset2), go_left)
 
+    if profiler.enabled:
+        profiler.count_candidates(len(weighted_ginis) if numeric else n_scored)
     reduction_in_impurity = total_gini - min_gini
     
     return reduction_in_impurity, min_gini, best_split, split_details
 
-# Helper function to print split details
-def print_split_details(split_details, feature, depth=0, right=""):
-    indent = generate_indent_tree_blocks(depth, right)
-    count_splits = len(split_details)
-    for i, (split, gini) in enumerate(split_details):
-        if i == count_splits - 1:
-            block = "└───"
-        else:
-            block = "├───"
-        split_str = split.replace("frozenset", "")
-        if i == 0 and count_splits > 1:
-            print(f"{indent}│  {block} {split_str}: {gini:0.4f} <- best split")
-        else:
-            print(f"{indent}│  {block} {split_str}: {gini:0.4f}")
+# Worker task: gini_split with its candidate events recorded for replay and,
+# if profiling, the number of candidates it scored
+def gini_split_task(dataset, lo, hi, feature, depth, right, max_exhaustive_levels, beam_width, beam_rounds, record, profile, class_counts,
+                    min_samples_leaf=1):
+    tracer = RecordingTracer() if record else NULL_TRACER
+    profiler = Profiler() if profile else NULL_PROFILER
+    stats = NodeStats(dataset, lo, hi, class_counts)
+    result = gini_split(dataset, lo, hi, feature, depth, right, max_exhaustive_levels, beam_width, beam_rounds, tracer, profiler, stats,
+                        min_samples_leaf)
+    return result, tracer.events if record else [], profiler.candidates if profile else 0
 
-def find_best_split(data, features, target_attribute, depth=0, right=""):
-    indent = generate_indent_tree_blocks(depth, right)
-    total_gini, elements, counts, gini_components = gini_index(data[target_attribute])
-    
+# Best split of a node over all features, as (feature, split, reduction in
+# impurity); the feature is None when no split reduces the impurity
+def find_best_split(dataset, lo, hi, features, depth=0, right="", max_exhaustive_levels=12, beam_width=8, beam_rounds=None, tracer=NULL_TRACER, pool=None,
+                    profiler=NULL_PROFILER, stats=None, min_samples_leaf=1):
+    stats = NodeStats(dataset, lo, hi) if stats is None else stats
     best_feature = None
     best_split = None
     max_reduction = 0
     best_split_details = []
 
-    print(f"{indent}├──┬─ Calculating reduction in impurity for features with binary splits:")
+    if pool is not None and pool.is_large(hi - lo):
+        results = pool.map(gini_split_task, [(lo, hi, feature, depth, right, max_exhaustive_levels, beam_width, beam_rounds, tracer.enabled,
+                                              profiler.enabled, stats.class_counts, min_samples_leaf) for feature in features])
+    else:
+        results = None
     for i, feature in enumerate(features):
-        reduction, min_gini, split, split_details = gini_split(data, feature, target_attribute, depth, right)
+        if results is not None:
+            (reduction, min_gini, split, split_details), events, candidates = results[i]
+            replay(events, tracer)
+            if profiler.enabled:
+                profiler.count_candidates(candidates)
+        else:
+            reduction, min_gini, split, split_details = gini_split(dataset, lo, hi, feature, depth, right, max_exhaustive_levels, beam_width, beam_rounds,
+                                                                   tracer, profiler, stats, min_samples_leaf)
         if reduction > max_reduction:
             max_reduction = reduction
             best_feature = feature
             best_split = split
             best_split_details = split_details
-        # print(f"{indent}│  ├──── {feature:<15}: {total_gini:0.4f} - {min_gini:0.4f} = {reduction:0.4f}")
 
-    if best_feature:
+    if best_feature and tracer.enabled:
         # find the best (split, gini) in `best_split_details` with a oneliner
         very_best_split = sorted(best_split_details, key=lambda x: x[1])[0]
-        print(f"{indent}│  │ ")
-        print(f"{indent}│  └──── Best feature to split on: {very_best_split[0]}: {very_best_split[1]:0.4f}")
+        tracer.emit("split_chosen", criterion="gini", depth=depth, path=right, feature=best_feature,
+                    split=very_best_split[0], weighted_impurity=very_best_split[1], reduction=max_reduction)
     
-    return best_feature, best_split
+    return best_feature, best_split, max_reduction
 
-def gini_tree(data, original_data, features, target_attribute, parent_node_class=None):
-    gt = gini_tree_(data, original_data, features, target_attribute, parent_node_class)
-    print("\nFinished Gini tree algorithm")
-    return gt
-
-# Define Gini-based decision tree algorithm
-def gini_tree_(data, original_data, features, target_attribute, parent_node_class=None, depth=0, right=""):
-    indent = generate_indent_tree_blocks(depth, right)
-    
-    # If all target values are the same, return the single class
-    if len(np.unique(data[target_attribute])) <= 1:
-        print(f"{indent}└─── Done! Only one value for '{target_attribute}' remains: '{np.unique(data[target_attribute])[0]}'")
-        return np.unique(data[target_attribute])[0]
-    
-    # If the dataset is empty, return the mode target feature value from the original dataset
-    elif len(data) == 0:
+# Gini-based decision tree. Progress is reported to `tracer` (the box-drawing
+# console explanation by default; pass tracing.NULL_TRACER to build silently).
+# With n_jobs > 1 (or -1 for all cores) features of large nodes are scored in
+# parallel and smaller subtrees are built by worker processes; the tree is
+# identical to a serial run. Pass a profiling.Profiler as `profiler` to
+# record per-node timings and a stopping.Limits as `limits` to stop growth
+# early (under a leaf, node or time budget the tree is grown best-first).
+# Categorical features with more than `max_exhaustive_levels` levels and a
+# multiclass target are split by a beam search over `beam_width` partitions
+# for at most `beam_rounds` rounds (default: one per level). With `n_bins`,
+# numeric features with more distinct values than that are split only on
+# the bounds of that many quantile bins, made once when the data is encoded.
+# Nodes with fewer than `parallel_min_rows` rows are built whole by a worker
+# (and a dataset smaller than that is built serially).
+def gini_tree(data, original_data, features, target_attribute, parent_node_class=None, max_exhaustive_levels=12, beam_width=8, beam_rounds=None, n_bins=None, tracer=None, n_jobs=1,
+              profiler=None, limits=None, parallel_min_rows=PARALLEL_MIN_ROWS):
+    tracer = ConsoleTracer() if tracer is None else tracer
+    profiler = NULL_PROFILER if profiler is None else profiler
+    limits = NO_LIMITS if limits is None else limits
+    if len(data) == 0:
         mode_value = np.unique(original_data[target_attribute])[np.argmax(np.unique(original_data[target_attribute], return_counts=True)[1])]
-        print(f"{indent}└─── Dataset is empty, returning mode value: {mode_value}")
+        if tracer.enabled:
+            tracer.emit("leaf_created", criterion="gini", depth=0, path="", target=target_attribute, label=mode_value, reason="empty")
         return mode_value
-    
-    # If the feature space is empty, return the parent node class
-    elif len(features) == 0:
-        print(f"{indent}└─── Feature space is empty, returning parent node class: {parent_node_class}")
-        return parent_node_class
-    
-    # If none of the above conditions are met, grow the tree
+    if profiler.enabled:
+        profiler.start_run("gini")
+        tracer = profiler.wrap_tracer(tracer)
+    dataset = EncodedDataset(data, features, target_attribute, n_bins)
+    if profiler.enabled:
+        profiler.encoded(dataset.n_rows)
+    grow = gini_tree_best_first if limits.best_first else gini_tree_
+    if resolve_n_jobs(n_jobs) > 1 and dataset.n_rows >= parallel_min_rows:
+        with WorkerPool(dataset, n_jobs, parallel_min_rows) as pool:
+            gt = grow(pool.dataset, 0, dataset.n_rows, features, parent_node_class, max_exhaustive_levels=max_exhaustive_levels,
+                      beam_width=beam_width, beam_rounds=beam_rounds, tracer=tracer, pool=pool, profiler=profiler, limits=limits)
     else:
-        parent_node_class = np.unique(data[target_attribute])[np.argmax(np.unique(data[target_attribute], return_counts=True)[1])]
-        parent_gini, elements, counts, gini_components = gini_index(data[target_attribute])
-        block = "├" if depth > 0 else "┌"
-        root_or_parent = "Root" if depth == 0 else "Parent"
-        calc = print_gini_details(elements, counts, gini_components)
-        print(f"{indent}{block}──── {root_or_parent} class Gini: {calc}")
-        print(f"{indent}│")
-        
-        best_feature, best_split = find_best_split(data, features, target_attribute, depth, right)
-        
-        if not best_feature:
-            print(f"{indent}└─── No valid feature found, returning parent node class: {parent_node_class}")
-            return parent_node_class
-        
-        tree = {best_feature: {}}
-        
-        best_split_str, best_split_complement_str, D1, D2 = best_split
-        best_split_str = best_split_str.replace("frozenset", "")
-        best_split_complement_str = best_split_complement_str.replace("frozenset", "")
-        
-        print(f"{indent}│")
-        if len(features) > 0 and len(np.unique(D1[target_attribute])) > 1:
-            print(f"{indent}├──┬─ Left branch: {best_split_str}")
-            subtree_left = gini_tree_(D1, original_data, features, target_attribute, parent_node_class, depth + 1, right + "0")
-        else:
-            print(f"{indent}├──── Left branch: {best_split_str} only has one value for '{target_attribute}': '{np.unique(D1[target_attribute])[0]}'")
-            subtree_left = np.unique(D1[target_attribute])[0]
-        tree[best_feature][best_split_str] = subtree_left
+        gt = grow(dataset, 0, dataset.n_rows, features, parent_node_class, max_exhaustive_levels=max_exhaustive_levels,
+                  beam_width=beam_width, beam_rounds=beam_rounds, tracer=tracer, profiler=profiler, limits=limits)
+    if tracer.enabled:
+        tracer.emit("finished", criterion="gini")
+    if profiler.enabled:
+        profiler.end_run()
+    return gt
+
+# Worker task: build a whole subtree, recording its trace and profile if asked to
+def build_subtree(dataset, lo, hi, features, parent_node_class, depth, right, max_exhaustive_levels, beam_width, beam_rounds, record, profile,
+                  class_counts=None, limits=NO_LIMITS, track_memory=False):
+    recorder = RecordingTracer() if record else NULL_TRACER
+    profiler = Profiler(track_memory) if profile else NULL_PROFILER
+    tracer = profiler.wrap_tracer(recorder) if profile else recorder
+    subtree = gini_tree_(dataset, lo, hi, features, parent_node_class, depth, right, max_exhaustive_levels, beam_width, beam_rounds, tracer,
+                         profiler=profiler, class_counts=class_counts, limits=limits)
+    return subtree, recorder.events if record else [], profiler.nodes if profile else []
+
+def gini_leaf_created(tracer, target_attribute, depth, right, label, reason, classes, class_counts):
+    if not tracer.enabled:
+        return
+    if reason in ("pure", "no_features", "no_gain"):
+        tracer.emit("leaf_created", criterion="gini", depth=depth, path=right, target=target_attribute, label=label, reason=reason)
+    else:
+        tracer.emit("leaf_created", criterion="gini", depth=depth, path=right, target=target_attribute, label=label, reason=reason,
+                    classes=classes, counts=class_counts)
+
+# Score the node perm[lo:hi] and pick its best binary split. Returns
+# (feature, split, reduction in impurity, None), or (None, None, None,
+# reason) when no split reduces the impurity enough.
+def gini_choose(dataset, lo, hi, features, depth, right, max_exhaustive_levels, beam_width, beam_rounds, tracer, pool, profiler, stats, limits):
+    if limits.enabled:
+        features = limits.candidates(features, depth, lo, hi)
+    if tracer.enabled:
+        tracer.emit("node_entered", criterion="gini", depth=depth, path=right, target=dataset.target_attribute, rows=hi - lo,
+                    classes=dataset.classes, counts=stats.class_counts, impurity=stats.impurity(gini_from_counts))
+    best_feature, best_split, reduction = find_best_split(dataset, lo, hi, features, depth, right, max_exhaustive_levels, beam_width, beam_rounds,
+                                                          tracer, pool, profiler, stats, limits.min_samples_leaf)
+    if not best_feature:
+        return None, None, None, "no_gain"
+    if limits.enabled and not limits.worth_splitting(reduction, hi - lo, dataset.n_rows):
+        return None, None, None, "min_impurity_decrease"
+    return best_feature, best_split, reduction, None
+
+# Send the node's rows left or right of the split. Returns the two children's
+# (lo, hi) ranges and class histograms; the node's tables are then released.
+def gini_partition(dataset, lo, hi, stats, feature, go_left):
+    j = dataset.feature_index[feature]
+    table = stats.contingency(j)
+    child_ids = (~go_left[dataset.level_positions(j, lo, hi, stats.levels(j))]).astype(np.intp)
+    children = dataset.partition(lo, hi, child_ids, 2)
+    child_counts = [table[go_left].sum(axis=0), table[~go_left].sum(axis=0)]
+    stats.release()
+    return children, child_counts
+
+# Define Gini-based decision tree algorithm over the rows perm[lo:hi] of an
+# EncodedDataset. With a WorkerPool, large nodes score their features in the
+# pool and children below the pool's size threshold are built there whole.
+# `class_counts` is the node's class histogram if the parent already has it,
+# `tables` its level x class tables by feature index if already known.
+def gini_tree_(dataset, lo, hi, features, parent_node_class=None, depth=0, right="", max_exhaustive_levels=12, beam_width=8, beam_rounds=None, tracer=NULL_TRACER, pool=None,
+               profiler=NULL_PROFILER, class_counts=None, limits=NO_LIMITS, tables=None):
+    target_attribute = dataset.target_attribute
+    classes = dataset.classes
+    if profiler.enabled:
+        profiler.start_node("gini", depth, hi - lo, right)
+    
+    stats = NodeStats(dataset, lo, hi, class_counts)
+    if tables is not None:
+        stats.add_tables(tables)
+    class_counts = stats.class_counts
+
+    # Pure nodes, an empty feature space and the limits make a leaf up front;
+    # otherwise the best split is scored, unless no split is good enough
+    leaf = leaf_before_split(classes, class_counts, features, parent_node_class, depth, limits)
+    if leaf is None:
+        parent_node_class = classes[np.argmax(class_counts)]
+        best_feature, best_split, _, reason = gini_choose(dataset, lo, hi, features, depth, right, max_exhaustive_levels, beam_width, beam_rounds,
+                                                          tracer, pool, profiler, stats, limits)
+        if best_feature is None:
+            leaf = (cut_leaf(classes, class_counts) if limits.enabled else parent_node_class), reason
+    if leaf is not None:
+        label, reason = leaf
+        gini_leaf_created(tracer, target_attribute, depth, right, label, reason, classes, class_counts)
+        if profiler.enabled:
+            profiler.end_node(leaf=reason)
+        return label
         
-        print(f"{indent}│")
-        if len(features) > 0 and len(np.unique(D2[target_attribute])) > 1:
-            print(f"{indent}└──┬─ Right branch: {best_split_complement_str}")
-            subtree_right = gini_tree_(D2, original_data, features, target_attribute, parent_node_class, depth + 1, right + "1")
+    tree = {best_feature: {}}
+    best_split_str, best_split_complement_str, go_left = best_split
+
+    if profiler.enabled:
+        profiler.phase("partition")
+    children, child_counts = gini_partition(dataset, lo, hi, stats, best_feature, go_left)
+    child_paths = [right + "0", right + "1"]
+    child_classes = [np.flatnonzero(counts) for counts in child_counts]
+    pure = [not (len(features) > 0 and len(c) > 1) for c in child_classes]
+    if profiler.enabled:
+        profiler.end_node(feature=best_feature)
+
+    # Hand small impure children to the pool before descending
+    futures = {}
+    if pool is not None:
+        for i, (child_lo, child_hi) in enumerate(children):
+            if not pure[i] and not pool.is_large(child_hi - child_lo):
+                futures[i] = pool.submit(build_subtree, child_lo, child_hi, features, parent_node_class, depth + 1, child_paths[i],
+                                         max_exhaustive_levels, beam_width, beam_rounds, tracer.enabled, profiler.enabled, child_counts[i],
+                                         limits, profiler.track_memory)
+    
+    for i, (side, branch, (child_lo, child_hi)) in enumerate(zip(("left", "right"), (best_split_str, best_split_complement_str), children)):
+        if tracer.enabled:
+            tracer.emit("branch_entered", criterion="gini", depth=depth, path=right, feature=best_feature, branch=branch, side=side, pure=pure[i])
+        if i in futures:
+            subtree, events, nodes = futures[i].result()
+            replay(events, tracer)
+            if profiler.enabled:
+                profiler.merge(nodes)
+        elif not pure[i]:
+            subtree = gini_tree_(dataset, child_lo, child_hi, features, parent_node_class, depth + 1, child_paths[i],
+                                 max_exhaustive_levels, beam_width, beam_rounds, tracer, pool, profiler, child_counts[i], limits)
         else:
-            print(f"{indent}└──── Right branch: {best_split_complement_str} only has one value for '{target_attribute}': '{np.unique(D2[target_attribute])[0]}'")
-            subtree_right = np.unique(D2[target_attribute])[0]
-        tree[best_feature][best_split_complement_str] = subtree_right
-        
+            subtree = classes[child_classes[i][0]]
+            if tracer.enabled:
+                tracer.emit("leaf_created", criterion="gini", depth=depth + 1, path=child_paths[i], target=target_attribute, label=subtree,
+                            reason="pure_branch", branch=branch, side=side)
+        tree[best_feature][branch] = subtree
+    
+    return tree
+
+# Best-first counterpart of gini_tree_, used under a budget (see stopping.py),
+# built the same way as infogain.ID3_best_first: nodes are scored when
+# created, the largest total reduction in Gini impurity is split next and
+# the trace is replayed depth-first at the end.
+def gini_tree_best_first(dataset, lo, hi, features, parent_node_class=None, depth=0, right="", max_exhaustive_levels=12, beam_width=8, beam_rounds=None,
+                         tracer=NULL_TRACER, pool=None, profiler=NULL_PROFILER, limits=NO_LIMITS):
+    target_attribute = dataset.target_attribute
+    classes = dataset.classes
+    frontier = Frontier(limits)
+
+    def evaluate(lo, hi, parent_node_class, depth, right, class_counts=None):
+        recorder = RecordingTracer() if tracer.enabled else NULL_TRACER
+        if profiler.enabled:
+            profiler.start_node("gini", depth, hi - lo, right)
+        stats = NodeStats(dataset, lo, hi, class_counts)
+        node = {"depth": depth, "path": right, "counts": stats.class_counts, "recorder": recorder}
+        leaf = leaf_before_split(classes, stats.class_counts, features, parent_node_class, depth, limits)
+        if leaf is None:
+            feature, split, reduction, reason = gini_choose(dataset, lo, hi, features, depth, right, max_exhaustive_levels, beam_width,
+                                                            beam_rounds, recorder, pool, profiler, stats, limits)
+            if feature is None:
+                leaf = cut_leaf(classes, stats.class_counts), reason
+        if leaf is not None:
+            node["leaf"], reason = leaf
+            gini_leaf_created(recorder, target_attribute, depth, right, node["leaf"], reason, classes, stats.class_counts)
+            if profiler.enabled:
+                profiler.end_node(leaf=reason)
+            return node
+        stats.release(keep=dataset.feature_index[feature])
+        node.update(lo=lo, hi=hi, feature=feature, split=split, stats=stats, parent_node_class=classes[np.argmax(stats.class_counts)])
+        if profiler.enabled:
+            profiler.end_node(feature=feature)
+        frontier.push((hi - lo) * reduction, node)
+        return node
+
+    # A frontier node that is not split after all becomes a leaf
+    def stop(node, reason):
+        node.pop("stats")
+        node["leaf"] = cut_leaf(classes, node["counts"])
+        node["recorder"] = RecordingTracer() if tracer.enabled else NULL_TRACER
+        gini_leaf_created(node["recorder"], target_attribute, node["depth"], node["path"], node["leaf"], reason, classes, node["counts"])
+
+    root = evaluate(lo, hi, parent_node_class, depth, right)
+    while len(frontier) and not frontier.out_of_time():
+        node = frontier.pop()
+        reason = frontier.over_budget(2)
+        if reason:
+            stop(node, reason)
+            continue
+        frontier.split(2)
+        if profiler.enabled:
+            profiler.phase("partition")
+        children, child_counts = gini_partition(dataset, node["lo"], node["hi"], node.pop("stats"), node["feature"], node["split"][2])
+        if profiler.enabled:
+            profiler.phase(None)
+        node["children"] = []
+        for i, ((child_lo, child_hi), counts) in enumerate(zip(children, child_counts)):
+            present = np.flatnonzero(counts)
+            if len(present) <= 1:
+                child = {"leaf": classes[present[0]], "pure_branch": True}
+            else:
+                child = evaluate(child_lo, child_hi, node["parent_node_class"], node["depth"] + 1, node["path"] + str(i), counts)
+            node["children"].append(child)
+    while len(frontier):
+        stop(frontier.pop(), "max_seconds")
+
+    def assemble(node):
+        replay(node["recorder"].events if tracer.enabled else [], tracer)
+        if "children" not in node:
+            return node["leaf"]
+        feature, depth, right = node["feature"], node["depth"], node["path"]
+        tree = {feature: {}}
+        for side, branch, child, child_path in zip(("left", "right"), node["split"][:2], node["children"], (right + "0", right + "1")):
+            pure = "pure_branch" in child
+            if tracer.enabled:
+                tracer.emit("branch_entered", criterion="gini", depth=depth, path=right, feature=feature, branch=branch, side=side, pure=pure)
+            if pure:
+                subtree = child["leaf"]
+                if tracer.enabled:
+                    tracer.emit("leaf_created", criterion="gini", depth=depth + 1, path=child_path, target=target_attribute, label=subtree,
+                                reason="pure_branch", branch=branch, side=side)
+            else:
+                subtree = assemble(child)
+            tree[feature][branch] = subtree
         return tree
+
+    return assemble(root)
@@ -0,0 +1,334 @@
+import numpy as np, pandas as pd
+from dataset import EncodedDataset, NodeStats, bin_bounds, bin_codes
+from infogain import ID3_, id3_choose
+from gini import gini_tree_, gini_choose
+from profiling import NULL_PROFILER
+from stopping import NO_LIMITS, leaf_before_split
+from tracing import NULL_TRACER
+
+# Incremental training in the spirit of Utgoff's ITI: a tree that takes new
+# labelled rows without being retrained from scratch. Next to the tree every
+# node keeps its sufficient statistics -- its class histogram and, for an
+# internal node, the level x class table of every candidate feature -- and
+# every leaf the ids of its training rows. `update` sends the new rows down
+# the tree, adding them to the counts on the way. An internal node re-scores
+# its split from the updated tables: if the choice is unchanged the rows are
+# passed on to its children, otherwise (and for a leaf that may now split)
+# the subtree is rebuilt from its own rows by the usual builder. An update
+# costs the new rows times their depth plus the rows of the rebuilt
+# subtrees, and the tree is always exactly the one ID3 / gini_tree would
+# build from every row seen so far.
+#
+# Limits that only look at the node itself (max_depth, min_samples_split,
+# min_samples_leaf) are supported. min_impurity_decrease (relative to the
+# total row count) and the budgets (of the whole tree) let any new row change
+# any node, and max_features draws its features by the node's place in a
+# full build, so they are refused.
+#
+# With `n_bins` (Gini only) numeric features are binned like EncodedDataset
+# bins them, on quantiles of every row seen so far. Those move as rows
+# arrive, and when any bin bound moves the whole tree is rebuilt.
+#
+# Values and classes are identified internally by ids in the order they were
+# first seen, which never change; their sorted order, which the builders
+# use, is recomputed from the vocabularies when new values arrive.
+
+# Tree node with its statistics. `branches` and `key` locate its subtree in
+# its parent's branch dict (None at the root).
+class Node:
+    def __init__(self, depth, features, branches, key):
+        self.depth = depth
+        self.features = features
+        self.branches = branches
+        self.key = key
+        self.subtree = None
+        self.n_rows = 0
+        self.counts = None
+        self.rows = []
+        self.feature = None
+        self.choice = None
+        self.tables = {}
+        self.children = {}
+        self.left = None
+
+# Distinct values of `column` appended to the `known` ones, first seen first
+def distinct(known, column):
+    column = column.drop_duplicates()
+    if known is None:
+        return column.reset_index(drop=True)
+    return pd.concat([known, column], ignore_index=True).drop_duplicates(ignore_index=True)
+
+# Pad a count array with zeros up to `shape`
+def grow(counts, shape):
+    if counts.shape == shape:
+        return counts
+    return np.pad(counts, [(0, size - current) for size, current in zip(shape, counts.shape)])
+
+# Whether two lists of bin bounds (None for unbinned features) are the same
+def same_bins(bins, other):
+    return all((a is None and b is None) or (a is not None and b is not None and np.array_equal(a, b, equal_nan=True))
+               for a, b in zip(bins, other))
+
+# Rows grouped by id, as {id: rows}
+def group_rows(rows, ids):
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(ids)) + 1])
+    return {int(ids[start]): group for start, group in zip(starts, np.split(rows[order], starts[1:]))}
+
+class IncrementalTree:
+    def __init__(self, data, features, target_attribute, criterion="entropy", parent_node_class=None, max_exhaustive_levels=12,
+                 beam_width=8, beam_rounds=None, n_bins=None, limits=None):
+        limits = NO_LIMITS if limits is None else limits
+        if criterion not in ("entropy", "gini"):
+            raise ValueError(f"Unknown criterion {criterion!r}; use 'entropy' or 'gini'")
+        if limits.best_first or limits.min_impurity_decrease > 0 or limits.max_features is not None:
+            raise ValueError("Incremental trees only support the max_depth, min_samples_split and min_samples_leaf limits")
+        if len(data) == 0:
+            raise ValueError("No rows to train on")
+        self.features = list(features)
+        self.feature_index = {feature: j for j, feature in enumerate(self.features)}
+        self.target_attribute = target_attribute
+        self.criterion = criterion
+        self.parent_node_class = parent_node_class
+        self.max_exhaustive_levels = max_exhaustive_levels
+        self.beam_width = beam_width
+        self.beam_rounds = beam_rounds
+        self.n_bins = n_bins if criterion == "gini" else None
+        self.limits = limits
+
+        self.values = [None] * len(self.features)
+        self.labels = None
+        self.ranks = [None] * len(self.features)
+        self.numbers = [None] * len(self.features)
+        self.categories = [None] * len(self.features)
+        self.value_counts = [np.zeros(0, dtype=np.int64) for _ in self.features]
+        self.binned = np.zeros(len(self.features), dtype=bool)
+        self.codes = np.empty((len(self.features), 0), dtype=np.int32)
+        self.y = np.empty(0, dtype=np.int32)
+        self.n_rows = 0
+        self.tree = None
+        rows = self.append(data)
+        self.root = self.build(rows, 0, self.features, parent_node_class, None, None)
+
+    # Add labelled rows (a DataFrame with the feature and target columns) and
+    # return the updated tree
+    def update(self, data):
+        if len(data) == 0:
+            return self.tree
+        dtypes, bins = self.dtypes(), self.bins()
+        rows = self.append(data)
+        if self.dtypes() != dtypes or not same_bins(self.bins(), bins):
+            # A column changed type (say ints joined by floats) and with it
+            # the branch keys and labels, or its bins moved, so the whole
+            # tree is rebuilt
+            self.root = self.build(np.arange(self.n_rows, dtype=np.intp), 0, self.features, self.parent_node_class, None, None)
+        else:
+            self.root = self.descend(self.root, rows, self.parent_node_class)
+        return self.tree
+
+    def dtypes(self):
+        return [values.dtype for values in self.values] + [self.labels.dtype]
+
+    # Bin bounds of every binned feature (None for the others)
+    def bins(self):
+        return [categories if binned else None for categories, binned in zip(self.categories, self.binned)]
+
+    # Store the rows' value and class ids and return their row ids
+    def append(self, data):
+        start, stop = self.n_rows, self.n_rows + len(data)
+        if stop > len(self.y):
+            size = max(stop, 2 * len(self.y))
+            codes = np.empty((len(self.features), size), dtype=np.int32)
+            codes[:, :start] = self.codes[:, :start]
+            y = np.empty(size, dtype=np.int32)
+            y[:start] = self.y[:start]
+            self.codes, self.y = codes, y
+        for j, feature in enumerate(self.features):
+            known = self.values[j]
+            self.values[j] = distinct(known, data[feature])
+            self.codes[j, start:stop] = pd.Index(self.values[j]).get_indexer(data[feature])
+            numeric = self.values[j].dtype.kind in 'iufc'
+            if self.n_bins and numeric:
+                self.value_counts[j] = grow(self.value_counts[j], (len(self.values[j]),)) + \
+                    np.bincount(self.codes[j, start:stop], minlength=len(self.values[j]))
+            if known is None or len(known) != len(self.values[j]) or known.dtype != self.values[j].dtype or (self.n_bins and numeric):
+                self.encode(j)
+        self.labels = distinct(self.labels, data[self.target_attribute])
+        self.y[start:stop] = pd.Index(self.labels).get_indexer(data[self.target_attribute])
+        self.n_rows = stop
+
+        # The sorted vocabularies, as EncodedDataset would have them, for
+        # scoring nodes from their tables (which are all cached, so no codes)
+        classes, self.class_rank = np.unique(self.labels.to_numpy(), return_inverse=True)
+        numeric = np.array([values.dtype.kind in 'iufc' for values in self.values], dtype=bool)
+        self.view = EncodedDataset.from_arrays(self.features, self.target_attribute, classes, self.categories, numeric, None,
+                                               self.y[:self.n_rows], None, self.binned)
+        return np.arange(start, stop, dtype=np.intp)
+
+    # Sorted position of every value id of feature `j` and its sorted values
+    # or, for a binned feature, the bin of every value id and the bin bounds
+    def encode(self, j):
+        values = self.values[j].to_numpy()
+        self.ranks[j], self.categories[j] = pd.factorize(values, sort=True, use_na_sentinel=False)
+        if values.dtype.kind in 'iufc':
+            self.numbers[j] = np.asarray(values, dtype=float)
+        categories = self.categories[j]
+        self.binned[j] = bool(self.n_bins) and values.dtype.kind in 'iufc' and np.count_nonzero(~np.isnan(categories)) > self.n_bins
+        if self.binned[j]:
+            counts = np.zeros(len(categories), dtype=np.int64)
+            counts[self.ranks[j]] = self.value_counts[j]
+            bounds = bin_bounds(categories, counts, self.n_bins)
+            self.ranks[j], self.categories[j] = bin_codes(bounds, categories)[self.ranks[j]], bounds
+
+    # Level x class table of feature `j` over `rows`, in value and class ids
+    def table(self, j, rows):
+        n_classes = len(self.labels)
+        flat = self.codes[j, rows].astype(np.intp) * n_classes + self.y[rows]
+        return np.bincount(flat, minlength=len(self.values[j]) * n_classes).reshape(len(self.values[j]), n_classes)
+
+    # Statistics of a node in sorted order, as the builders compute them
+    def stats(self, node):
+        class_counts = np.zeros(len(self.labels), dtype=node.counts.dtype)
+        class_counts[self.class_rank] = node.counts
+        stats = NodeStats(self.view, 0, node.n_rows, class_counts)
+        tables = {}
+        for j, table in node.tables.items():
+            tables[j] = np.zeros((len(self.categories[j]), table.shape[1]), dtype=table.dtype)
+            np.add.at(tables[j], (self.ranks[j][:, None], self.class_rank[None, :]), table)
+        stats.add_tables(tables)
+        return stats
+
+    # The split a node would get now: its feature (and, for Gini, its branch labels)
+    def choose(self, node, stats):
+        if self.criterion == "entropy":
+            feature, _, _ = id3_choose(self.view, 0, node.n_rows, node.features, node.depth, NULL_TRACER, None, NULL_PROFILER,
+                                       stats, self.limits)
+            return feature
+        feature, split, _, _ = gini_choose(self.view, 0, node.n_rows, node.features, node.depth, "", self.max_exhaustive_levels,
+                                           self.beam_width, self.beam_rounds, NULL_TRACER, None, NULL_PROFILER, stats, self.limits)
+        return None if feature is None else (feature, str(split[0]), str(split[1]))
+
+    # Grow the subtree for `rows` with the builder and put it in its place
+    def build(self, rows, depth, features, parent_node_class, branches, key):
+        codes = np.empty((len(self.features), len(rows)), dtype=np.int32)
+        for j in range(len(self.features)):
+            codes[j] = self.ranks[j][self.codes[j, rows]]
+        y = self.class_rank[self.y[rows]].astype(np.int32)
+        dataset = EncodedDataset.from_arrays(self.features, self.target_attribute, self.view.classes, self.categories, self.view.numeric,
+                                             codes, y, np.arange(len(rows), dtype=np.intp), self.binned)
+        if self.criterion == "entropy":
+            subtree = ID3_(dataset, 0, len(rows), features, parent_node_class, depth, limits=self.limits)
+        else:
+            subtree = gini_tree_(dataset, 0, len(rows), features, parent_node_class, depth, "", self.max_exhaustive_levels, self.beam_width,
+                                 self.beam_rounds, limits=self.limits)
+        node = self.attach(subtree, rows, depth, features, branches, key)
+        self.place(node, subtree)
+        return node
+
+    # Nodes (with statistics) for a freshly built subtree over `rows`
+    def attach(self, subtree, rows, depth, features, branches, key):
+        node = Node(depth, features, branches, key)
+        node.subtree = subtree
+        node.n_rows = len(rows)
+        node.counts = np.bincount(self.y[rows], minlength=len(self.labels))
+        if not isinstance(subtree, dict):
+            node.rows = [rows]
+            return node
+        name = next(iter(subtree))
+        j = node.feature = self.feature_index[name]
+        node.tables = {self.feature_index[feature]: self.table(self.feature_index[feature], rows) for feature in features}
+        child_branches = subtree[name]
+        if self.criterion == "entropy":
+            node.choice = name
+            child_features = [feature for feature in features if feature != name]
+            groups = group_rows(rows, self.codes[j, rows])
+            levels = pd.Index(self.values[j]).get_indexer(list(child_branches))
+            for (value, child), level in zip(child_branches.items(), levels):
+                node.children[level] = self.attach(child, groups[level], depth + 1, child_features, child_branches, value)
+        else:
+            left, right = child_branches
+            node.choice = (name, str(left), str(right))
+            node.left = left.operand if left.op == "<=" else pd.Index(self.values[j]).get_indexer(list(left.operand))
+            goes_left = self.goes_left(node, rows)
+            node.children[0] = self.attach(child_branches[left], rows[goes_left], depth + 1, features, child_branches, left)
+            node.children[1] = self.attach(child_branches[right], rows[~goes_left], depth + 1, features, child_branches, right)
+        return node
+
+    def place(self, node, subtree):
+        node.subtree = subtree
+        if node.branches is None:
+            self.tree = subtree
+        else:
+            node.branches[node.key] = subtree
+
+    # Which of `rows` take the left branch of a Gini node (missing numbers go right)
+    def goes_left(self, node, rows):
+        ids = self.codes[node.feature, rows]
+        if self.view.numeric[node.feature]:
+            return self.numbers[node.feature][ids] <= node.left
+        return np.isin(ids, node.left)
+
+    # Add the new `rows` to the subtree of `node` and return its (possibly rebuilt) node
+    def descend(self, node, rows, parent_node_class):
+        node.counts = grow(node.counts, (len(self.labels),)) + np.bincount(self.y[rows], minlength=len(self.labels))
+        node.n_rows += len(rows)
+        if node.feature is None:
+            node.rows.append(rows)
+            return self.update_leaf(node, parent_node_class)
+        for j in node.tables:
+            node.tables[j] = grow(node.tables[j], (len(self.values[j]), len(self.labels))) + self.table(j, rows)
+        stats = self.stats(node)
+        if self.choose(node, stats) != node.choice:
+            return self.rebuild(node, parent_node_class, rows)
+
+        majority = self.view.classes[np.argmax(stats.class_counts)]
+        j = node.feature
+        if self.criterion == "gini":
+            goes_left = self.goes_left(node, rows)
+            for side, child_rows in enumerate((rows[goes_left], rows[~goes_left])):
+                if len(child_rows):
+                    node.children[side] = self.descend(node.children[side], child_rows, majority)
+            return node
+
+        child_features = [feature for feature in node.features if feature != node.choice]
+        groups = group_rows(rows, self.codes[j, rows])
+        branches = node.subtree[node.choice]
+        for level, child_rows in groups.items():
+            if level in node.children:
+                node.children[level] = self.descend(node.children[level], child_rows, majority)
+            else:
+                value = self.categories[j][self.ranks[j][level]]
+                node.children[level] = self.build(child_rows, node.depth + 1, child_features, majority, branches, value)
+        if not child_features:
+            # Leaves with no features left take this node's majority class
+            for level, child in node.children.items():
+                if level not in groups:
+                    self.update_leaf(child, majority)
+        # Keep the branches in sorted order when a new value got one
+        levels = sorted(node.children, key=lambda level: self.ranks[j][level])
+        if list(branches) != [node.children[level].key for level in levels]:
+            items = [(node.children[level].key, node.children[level].subtree) for level in levels]
+            branches.clear()
+            branches.update(items)
+        return node
+
+    # Relabel a leaf from its updated counts, or rebuild it if it may now split
+    def update_leaf(self, node, parent_node_class):
+        class_counts = np.zeros(len(self.labels), dtype=node.counts.dtype)
+        class_counts[self.class_rank] = node.counts
+        leaf = leaf_before_split(self.view.classes, class_counts, node.features, parent_node_class, node.depth, self.limits)
+        if leaf is None:
+            return self.rebuild(node, parent_node_class)
+        self.place(node, leaf[0])
+        return node
+
+    # Build the subtree of `node` again from the rows of its leaves and the
+    # `new` rows that have not reached a leaf yet
+    def rebuild(self, node, parent_node_class, new=()):
+        rows, stack = [new], [node]
+        while stack:
+            current = stack.pop()
+            rows += current.rows
+            stack += current.children.values()
+        return self.build(np.concatenate(rows).astype(np.intp), node.depth, node.features, parent_node_class, node.branches, node.key)
@@ -1,5 +1,9 @@
 import pandas as pd, numpy as np
-from graphviz import Digraph
+from dataset import EncodedDataset, NodeStats
+from tracing import ConsoleTracer, RecordingTracer, NULL_TRACER, replay
+from parallel import WorkerPool, PARALLEL_MIN_ROWS, resolve_n_jobs
+from profiling import Profiler, NULL_PROFILER
+from stopping import NO_LIMITS, Frontier, cut_leaf, leaf_before_split
 
 # Entropy function
 def entropy(target_col):
@@ -9,20 +13,13 @@ def entropy(target_col):
     total_entropy = np.sum(entropy_components)
     return total_entropy, elements, counts, entropy_components
 
-# Helper function to print entropy calculation details
-def print_entropy_details(elements, counts, entropy_components, depth=0):
-    tree_block = "│" if depth > 0 else " "
-    indent = f"{tree_block}  " * depth
-    total_elements = np.sum(counts)
-    details = []
-    for i in range(len(elements)):
-        proportion = counts[i] / total_elements
-        entropy_component = entropy_components[i]
-        details.append(f"-{counts[i]}/{total_elements} log2({counts[i]}/{total_elements})")
-    joined_details = " + ".join(details)
-    entropy_values = " + ".join([f"{component:.3f}" for component in entropy_components])
-    total_entropy = np.sum(entropy_components)
-    print(f"{indent}│  └─── {joined_details} = {entropy_values} = {total_entropy:.3f}")
+# Entropy of every row of a count table (last axis = classes)
+def entropy_from_counts(counts):
+    counts = np.asarray(counts)
+    totals = counts.sum(axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        components = np.where(counts > 0, (-counts / totals) * np.log2(counts / totals), 0.0)
+    return np.sum(components, axis=-1)
 
 # Information gain function
 def info_gain(data, split_attribute, target_attribute):
@@ -33,113 +30,327 @@ def info_gain(data, split_attribute, target_attribute):
     information_gain = total_entropy - weighted_entropy
     return information_gain, total_entropy, weighted_entropy
 
-# Helper function to print information gain details showing the math for the
-# specific attribute (not the net result)
-def print_info_gain_details(data, split_attribute, target_attribute, depth=0, last=False):
-    tree_block = "│" if depth > 0 else " "
-    indent = f"{tree_block}  " * depth
-    total_entropy, _, _, _ = entropy(data[target_attribute])
-    vals, counts = np.unique(data[split_attribute], return_counts=True)
-    details = []
-    for i in range(len(vals)):
-        entropy_val = entropy(data[data[split_attribute] == vals[i]][target_attribute])[0]
-        proportion = counts[i] / np.sum(counts)
-        details.append(f"{proportion:.3f} * {entropy_val:.3f}")
-    joined_details = " + ".join(details)
-    weighted_entropy = np.sum([(counts[i]/np.sum(counts)) * entropy(data[data[split_attribute] == vals[i]][target_attribute])[0] for i in range(len(vals))])
-    block = "├" if not last else "└"
-    print(f"{indent}│  {block}─── {split_attribute:16}: {joined_details} = {weighted_entropy:.3f}")
-
-
-# ID3 algorithm
-def ID3(data, original_data, features, target_attribute, parent_node_class=None, depth=0):
-    t = ID3_(data, original_data, features, target_attribute, parent_node_class, depth)
-    print("│\n└──── Finished ID3 algorithm")
-    return t
+# Information gain from a level x class count table (levels absent from the
+# node must already be dropped). Also returns the per-level proportions and
+# entropies so the explanation can be printed without recomputing them.
+# `total_entropy` can be passed in when the node's entropy is already known.
+def info_gain_from_table(table, total_entropy=None):
+    level_counts = table.sum(axis=1)
+    if total_entropy is None:
+        total_entropy = entropy_from_counts(table.sum(axis=0))
+    proportions = level_counts / np.sum(level_counts)
+    level_entropies = entropy_from_counts(table)
+    weighted_entropy = np.sum(proportions * level_entropies)
+    information_gain = total_entropy - weighted_entropy
+    return information_gain, total_entropy, weighted_entropy, proportions, level_entropies
 
-def ID3_(data, original_data, features, target_attribute, parent_node_class=None, depth=0):
-    # Print the current depth of the tree
-    tree_block = "│" if depth > 0 else " "
-    indent = f"{tree_block}  " * depth
-    
-    # If all target values are the same, return the single class
-    if len(np.unique(data[target_attribute])) <= 1:
-        print(f"{indent}└─── Done! Only one '{target_attribute}' remains: '{np.unique(data[target_attribute])[0]}'")
-        return np.unique(data[target_attribute])[0]
-    
-    # If the dataset is empty, return the mode target feature value from the original dataset
-    elif len(data) == 0:
+# ID3 algorithm. Progress is reported to `tracer` (the box-drawing console
+# explanation by default; pass tracing.NULL_TRACER to build silently). With
+# n_jobs > 1 (or -1 for all cores) features of large nodes are scored in
+# parallel and smaller subtrees are built by worker processes; the tree is
+# identical to a serial run. Pass a profiling.Profiler as `profiler` to
+# record per-node timings and a stopping.Limits as `limits` to stop growth
+# early (under a leaf, node or time budget the tree is grown best-first).
+# Nodes with fewer than `parallel_min_rows` rows are built whole by a worker
+# (and a dataset smaller than that is built serially).
+def ID3(data, original_data, features, target_attribute, parent_node_class=None, depth=0, tracer=None, n_jobs=1, profiler=None,
+        limits=None, parallel_min_rows=PARALLEL_MIN_ROWS):
+    tracer = ConsoleTracer() if tracer is None else tracer
+    profiler = NULL_PROFILER if profiler is None else profiler
+    limits = NO_LIMITS if limits is None else limits
+    if len(data) == 0:
         mode_value = np.unique(original_data[target_attribute])[np.argmax(np.unique(original_data[target_attribute], return_counts=True)[1])]
-        print(f"{indent}└─── Dataset is empty, returning mode value: {mode_value}")
+        if tracer.enabled:
+            tracer.emit("leaf_created", criterion="entropy", depth=depth, target=target_attribute, label=mode_value, reason="empty")
         return mode_value
-    
-    # If the feature space is empty, return the parent node class
-    elif len(features) == 0:
-        print(f"{indent}└─── Feature space is empty, returning parent node class: {parent_node_class}")
-        return parent_node_class
-    
-    # If none of the above conditions are met, grow the tree
+    if profiler.enabled:
+        profiler.start_run("entropy")
+        tracer = profiler.wrap_tracer(tracer)
+    dataset = EncodedDataset(data, features, target_attribute)
+    if profiler.enabled:
+        profiler.encoded(dataset.n_rows)
+    grow = ID3_best_first if limits.best_first else ID3_
+    if resolve_n_jobs(n_jobs) > 1 and dataset.n_rows >= parallel_min_rows:
+        with WorkerPool(dataset, n_jobs, parallel_min_rows) as pool:
+            t = grow(pool.dataset, 0, dataset.n_rows, features, parent_node_class, depth, tracer, pool, profiler, limits=limits)
+    else:
+        t = grow(dataset, 0, dataset.n_rows, features, parent_node_class, depth, tracer, profiler=profiler, limits=limits)
+    if tracer.enabled:
+        tracer.emit("finished", criterion="entropy")
+    if profiler.enabled:
+        profiler.end_run()
+    return t
+
+# Information gain of one feature from its table over a node
+def score_table(table, total_entropy=None):
+    return info_gain_from_table(table[table.sum(axis=1) > 0], total_entropy)
+
+# Information gain of one feature over the rows perm[lo:hi] (worker task)
+def score_feature(dataset, lo, hi, feature, total_entropy=None):
+    return score_table(dataset.node_contingency(dataset.feature_index[feature], lo, hi)[1], total_entropy)
+
+# Worker task: build a whole subtree, recording its trace and profile if asked to
+def build_subtree(dataset, lo, hi, features, parent_node_class, depth, record, profile, class_counts=None, limits=NO_LIMITS,
+                  track_memory=False):
+    recorder = RecordingTracer() if record else NULL_TRACER
+    profiler = Profiler(track_memory) if profile else NULL_PROFILER
+    tracer = profiler.wrap_tracer(recorder) if profile else recorder
+    subtree = ID3_(dataset, lo, hi, features, parent_node_class, depth, tracer, profiler=profiler, class_counts=class_counts, limits=limits)
+    return subtree, recorder.events if record else [], profiler.nodes if profile else []
+
+def id3_leaf_created(tracer, target_attribute, depth, label, reason, classes, class_counts):
+    if not tracer.enabled:
+        return
+    if reason in ("pure", "no_features"):
+        tracer.emit("leaf_created", criterion="entropy", depth=depth, target=target_attribute, label=label, reason=reason)
+    else:
+        tracer.emit("leaf_created", criterion="entropy", depth=depth, target=target_attribute, label=label, reason=reason,
+                    classes=classes, counts=class_counts)
+
+# Score every feature of the node perm[lo:hi] and pick the one with the
+# highest information gain. Returns (feature, gain, None), or (None, None,
+# reason) when `limits` rule out every split. With `max_children`, features
+# whose split would make more children than that are skipped too (reason
+# "max_children" when that leaves none).
+def id3_choose(dataset, lo, hi, features, depth, tracer, pool, profiler, stats, limits, max_children=None):
+    target_attribute = dataset.target_attribute
+    if limits.enabled:
+        features = limits.candidates(features, depth, lo, hi)
+    impurity = stats.impurity(entropy_from_counts)
+    if tracer.enabled:
+        tracer.emit("node_entered", criterion="entropy", depth=depth, target=target_attribute, rows=hi - lo,
+                    classes=dataset.classes, counts=stats.class_counts, impurity=impurity)
+
+    if pool is not None and pool.is_large(hi - lo):
+        scores = pool.map(score_feature, [(lo, hi, feature, impurity) for feature in features])
+    else:
+        scores = [score_table(stats.contingency(dataset.feature_index[feature]), impurity) for feature in features]
+    if profiler.enabled:
+        profiler.count_candidates(len(features))
+    info_gains = []
+    for e, feature in enumerate(features):
+        gain, _, weighted_entropy, proportions, level_entropies = scores[e]
+        info_gains.append(gain)
+        if tracer.enabled:
+            tracer.emit("candidate_scored", criterion="entropy", depth=depth, feature=feature, index=e, total=len(features),
+                        gain=gain, weighted_impurity=weighted_entropy, proportions=proportions, level_entropies=level_entropies)
+    allowed = None
+    if limits.enabled and limits.min_samples_leaf > 1:
+        # Smallest child of every candidate, from its level proportions
+        allowed = [np.rint(score[3].min() * (hi - lo)) >= limits.min_samples_leaf for score in scores]
+        if not any(allowed):
+            return None, None, "min_samples_leaf"
+    if max_children is not None:
+        # One child per level present in the node
+        fits = [len(score[3]) <= max_children for score in scores]
+        allowed = fits if allowed is None else [a and f for a, f in zip(allowed, fits)]
+        if not any(allowed):
+            return None, None, "max_children"
+    if allowed is not None:
+        best_feature_index = np.argmax(np.where(allowed, info_gains, -np.inf))
     else:
-        parent_node_class = np.unique(data[target_attribute])[np.argmax(np.unique(data[target_attribute], return_counts=True)[1])]
-        parent_entropy, elements, counts, entropy_components = entropy(data[target_attribute])
-        block = "├" if depth > 0 else "┌"
-        print(f"{indent}{block}──┬─ Parent class entropy: {parent_entropy:.3f}")
-        print_entropy_details(elements, counts, entropy_components, depth)
-        
-        item_values = [info_gain(data, feature, target_attribute) for feature in features]
-        print(f"{indent}│")
-        print(f"{indent}├──┬─ Calculating entropy for features:")
-        for e, feature in enumerate(features):
-            if e == len(features) - 1:
-                block = "└"
-                last = True
-            else:
-                block = "├"
-                last = False
-            print_info_gain_details(data, feature, target_attribute, depth, last)
-        info_gains = [item[0] for item in item_values]
-        info_gain_dict = dict(zip(features, info_gains))
         best_feature_index = np.argmax(info_gains)
-        best_feature = features[best_feature_index]
-        
-        count_features = len(info_gain_dict.keys())
-        if count_features == 1:
-            feature, gain = list(info_gain_dict.items())[0]
-            tree = {feature: {}}
+    best_feature = features[best_feature_index]
+    if tracer.enabled:
+        tracer.emit("split_chosen", criterion="entropy", depth=depth, feature=best_feature,
+                    impurity=impurity, gains=dict(zip(features, info_gains)))
+    if limits.enabled and not limits.worth_splitting(info_gains[best_feature_index], hi - lo, dataset.n_rows):
+        return None, None, "min_impurity_decrease"
+    return best_feature, info_gains[best_feature_index], None
+
+# Partition the node's rows by the value of `feature`; only the values present
+# in the node get a child, in sorted order. Returns each child's value, (lo,
+# hi) range and class histogram (its row of the table); after that the
+# node's tables are no longer needed and are released.
+def id3_partition(dataset, lo, hi, stats, feature):
+    j = dataset.feature_index[feature]
+    child_counts = stats.contingency(j)
+    levels = stats.levels(j)
+    children = dataset.partition(lo, hi, dataset.level_positions(j, lo, hi, levels), len(levels))
+    stats.release()
+    return [dataset.categories[j][level] for level in levels], children, child_counts
+
+# Grow the subtree for the rows perm[lo:hi] of an EncodedDataset. With a
+# WorkerPool, large nodes score their features in the pool and children
+# below the pool's size threshold are built there as whole subtrees.
+# `class_counts` is the node's class histogram if the parent already has it,
+# `tables` its level x class tables by feature index if already known.
+def ID3_(dataset, lo, hi, features, parent_node_class=None, depth=0, tracer=NULL_TRACER, pool=None, profiler=NULL_PROFILER,
+         class_counts=None, limits=NO_LIMITS, tables=None):
+    target_attribute = dataset.target_attribute
+    classes = dataset.classes
+    if profiler.enabled:
+        profiler.start_node("entropy", depth, hi - lo)
+    
+    stats = NodeStats(dataset, lo, hi, class_counts)
+    if tables is not None:
+        stats.add_tables(tables)
+    class_counts = stats.class_counts
+
+    # Pure nodes, an empty feature space and the limits make a leaf up front;
+    # otherwise the best split is scored, unless the limits rule it out
+    leaf = leaf_before_split(classes, class_counts, features, parent_node_class, depth, limits)
+    if leaf is None:
+        parent_node_class = classes[np.argmax(class_counts)]
+        best_feature, _, reason = id3_choose(dataset, lo, hi, features, depth, tracer, pool, profiler, stats, limits)
+        if best_feature is None:
+            leaf = cut_leaf(classes, class_counts), reason
+    if leaf is not None:
+        label, reason = leaf
+        id3_leaf_created(tracer, target_attribute, depth, label, reason, classes, class_counts)
+        if profiler.enabled:
+            profiler.end_node(leaf=reason)
+        return label
+
+    tree = {best_feature: {}}
+    features = [i for i in features if i != best_feature]
+    if profiler.enabled:
+        profiler.phase("partition")
+    values, children, child_counts = id3_partition(dataset, lo, hi, stats, best_feature)
+    child_classes = [np.flatnonzero(counts) for counts in child_counts]
+
+    # Hand the small impure children to the pool up front so they are
+    # built while this process works through the large ones
+    if profiler.enabled:
+        profiler.end_node(feature=best_feature)
+    futures = {}
+    if pool is not None:
+        for i, (child_lo, child_hi) in enumerate(children):
+            if len(child_classes[i]) > 1 and not pool.is_large(child_hi - child_lo):
+                futures[i] = pool.submit(build_subtree, child_lo, child_hi, features, parent_node_class, depth + 1,
+                                         tracer.enabled, profiler.enabled, child_counts[i], limits, profiler.track_memory)
+
+    count_trees = len(values)
+    for i, (value, (child_lo, child_hi)) in enumerate(zip(values, children)):
+        last = i == count_trees - 1
+        pure = len(child_classes[i]) <= 1
+        if tracer.enabled:
+            tracer.emit("branch_entered", criterion="entropy", depth=depth, feature=best_feature, branch=value, last=last, pure=pure)
+        if i in futures:
+            subtree, events, nodes = futures[i].result()
+            replay(events, tracer)
+            if profiler.enabled:
+                profiler.merge(nodes)
+        elif not pure:
+            subtree = ID3_(dataset, child_lo, child_hi, features, parent_node_class, depth + 1, tracer, pool, profiler, child_counts[i],
+                           limits)
         else:
-            print(f"{indent}├──┬─ Calculating Information Gain for:")
-            for e, (feature, gain) in enumerate(info_gain_dict.items()):
-                if e == count_features - 1:
-                    block = "└────"
-                else:
-                    block = "├────"
-                if feature == best_feature:
-                    print(f"{indent}│  {block} {feature:<15}: {parent_entropy:.3f}-{parent_entropy-gain:.3f}= {gain:.3f} <- best feature")
-                else:
-                    print(f"{indent}│  {block} {feature:<15}: {parent_entropy:.3f}-{parent_entropy-gain:.3f}= {gain:.3f}")
-            
-            tree = {best_feature: {}}
-        
-        features = [i for i in features if i != best_feature]
-        
-        count_trees = len(np.unique(data[best_feature]))
-        for i, value in enumerate(np.unique(data[best_feature])):
-            if i == count_trees - 1:
-                block = "└"
-                done_block = " "
+            subtree = classes[child_classes[i][0]]
+            if tracer.enabled:
+                tracer.emit("leaf_created", criterion="entropy", depth=depth + 1, target=target_attribute, label=subtree,
+                            reason="pure_branch", branch=value, last=last)
+        tree[best_feature][value] = subtree
+    
+    return tree
+
+# Best-first counterpart of ID3_, used under a budget (see stopping.py). Each
+# node is scored as soon as it is created and waits on the frontier; the one
+# whose split lowers the total entropy the most is split next, until the
+# budget runs out and the rest become leaves. A node whose best split has
+# more children than the budget has left is scored again among the features
+# that fit and goes back on the frontier; it is only made a leaf when none
+# does. The trace of every node is
+# recorded and replayed depth-first once the tree is done, so it reads like
+# the trace of a depth-first build. Work is shared with a WorkerPool only by
+# scoring the features of large nodes.
+def ID3_best_first(dataset, lo, hi, features, parent_node_class=None, depth=0, tracer=NULL_TRACER, pool=None, profiler=NULL_PROFILER,
+                   limits=NO_LIMITS):
+    target_attribute = dataset.target_attribute
+    classes = dataset.classes
+    frontier = Frontier(limits)
+
+    def evaluate(lo, hi, features, parent_node_class, depth, class_counts=None):
+        recorder = RecordingTracer() if tracer.enabled else NULL_TRACER
+        if profiler.enabled:
+            profiler.start_node("entropy", depth, hi - lo)
+        stats = NodeStats(dataset, lo, hi, class_counts)
+        node = {"depth": depth, "counts": stats.class_counts, "recorder": recorder}
+        leaf = leaf_before_split(classes, stats.class_counts, features, parent_node_class, depth, limits)
+        if leaf is None:
+            feature, gain, reason = id3_choose(dataset, lo, hi, features, depth, recorder, pool, profiler, stats, limits)
+            if feature is None:
+                leaf = cut_leaf(classes, stats.class_counts), reason
+        if leaf is not None:
+            node["leaf"], reason = leaf
+            id3_leaf_created(recorder, target_attribute, depth, node["leaf"], reason, classes, stats.class_counts)
+            if profiler.enabled:
+                profiler.end_node(leaf=reason)
+            return node
+        stats.release(keep=dataset.feature_index[feature])
+        node.update(lo=lo, hi=hi, features=features, feature=feature, stats=stats,
+                    parent_node_class=classes[np.argmax(stats.class_counts)])
+        if profiler.enabled:
+            profiler.end_node(feature=feature)
+        frontier.push((hi - lo) * gain, node)
+        return node
+
+    # A frontier node that is not split after all becomes a leaf
+    def stop(node, reason):
+        node.pop("stats")
+        node["leaf"] = cut_leaf(classes, node["counts"])
+        node["recorder"] = RecordingTracer() if tracer.enabled else NULL_TRACER
+        id3_leaf_created(node["recorder"], target_attribute, node["depth"], node["leaf"], reason, classes, node["counts"])
+
+    # A frontier node whose best split does not fit the budget (`reason`)
+    # chooses among the splits that do, with a fresh trace, and waits again
+    def rechoose(node, reason):
+        lo, hi, stats = node["lo"], node["hi"], node["stats"]
+        recorder = RecordingTracer() if tracer.enabled else NULL_TRACER
+        feature, gain, why = id3_choose(dataset, lo, hi, node["features"], node["depth"], recorder, pool, profiler, stats, limits,
+                                        frontier.max_children())
+        if feature is None:
+            stop(node, reason if why == "max_children" else why)
+            return
+        stats.release(keep=dataset.feature_index[feature])
+        node.update(feature=feature, recorder=recorder)
+        frontier.push((hi - lo) * gain, node)
+
+    root = evaluate(lo, hi, features, parent_node_class, depth)
+    while len(frontier) and not frontier.out_of_time():
+        node = frontier.pop()
+        j = dataset.feature_index[node["feature"]]
+        n_children = len(node["stats"].levels(j))
+        reason = frontier.over_budget(n_children)
+        if reason:
+            rechoose(node, reason)
+            continue
+        frontier.split(n_children)
+        if profiler.enabled:
+            profiler.phase("partition")
+        values, children, child_counts = id3_partition(dataset, node["lo"], node["hi"], node.pop("stats"), node["feature"])
+        if profiler.enabled:
+            profiler.phase(None)
+        features = [i for i in node["features"] if i != node["feature"]]
+        node["children"] = []
+        for value, (child_lo, child_hi), counts in zip(values, children, child_counts):
+            present = np.flatnonzero(counts)
+            if len(present) <= 1:
+                child = {"leaf": classes[present[0]], "pure_branch": True}
             else:
-                block = "├"
-                done_block = "│"
-            sub_data = data.where(data[best_feature] == value).dropna()
-            if len(np.unique(sub_data[target_attribute])) > 1:
-                print(f"{indent}│")
-                print(f"{indent}├──┬─ Creating subtree for {best_feature}='{value}'")
-                subtree = ID3_(sub_data, original_data, features, target_attribute, parent_node_class, depth + 1)
-                tree[best_feature][value] = subtree
+                child = evaluate(child_lo, child_hi, features, node["parent_node_class"], node["depth"] + 1, counts)
+            node["children"].append((value, child))
+    while len(frontier):
+        stop(frontier.pop(), "max_seconds")
+
+    def assemble(node):
+        replay(node["recorder"].events if tracer.enabled else [], tracer)
+        if "children" not in node:
+            return node["leaf"]
+        feature, depth = node["feature"], node["depth"]
+        tree = {feature: {}}
+        for i, (value, child) in enumerate(node["children"]):
+            last = i == len(node["children"]) - 1
+            pure = "pure_branch" in child
+            if tracer.enabled:
+                tracer.emit("branch_entered", criterion="entropy", depth=depth, feature=feature, branch=value, last=last, pure=pure)
+            if pure:
+                subtree = child["leaf"]
+                if tracer.enabled:
+                    tracer.emit("leaf_created", criterion="entropy", depth=depth + 1, target=target_attribute, label=subtree,
+                                reason="pure_branch", branch=value, last=last)
             else:
-                print(f"{indent}{block}──┬─ Creating subtree for {best_feature}='{value}'")
-                print(f"{indent}{done_block}  └──── Done! Only one possible value remains for '{target_attribute}': '{np.unique(sub_data[target_attribute])[0]}'")
-                subtree = np.unique(sub_data[target_attribute])[0]
-                tree[best_feature][value] = subtree
-        
+                subtree = assemble(child)
+            tree[feature][value] = subtree
         return tree
+
+    return assemble(root)
@@ -0,0 +1,400 @@
+import ast
+import json
+import re
+import struct
+from collections import deque
+import numpy as np
+
+LEAF, CATEGORICAL, NUMERIC = 0, 1, 2
+
+# Branch key of a Gini tree. It prints exactly like the display string the
+# tree has always used ("Age in {'<=30'}", "Income <= 2.5") but also keeps
+# the split it stands for, so the tree can be compiled without parsing.
+class BranchLabel(str):
+    def __new__(cls, text, feature, op, operand):
+        label = super().__new__(cls, text)
+        label.feature = feature
+        label.op = op
+        label.operand = operand
+        return label
+
+    def __reduce__(self):
+        return (BranchLabel, (str(self), self.feature, self.op, self.operand))
+
+# Recover (op, operand) from a branch key. Keys built by gini_tree carry them;
+# plain strings (e.g. a tree typed back in from its printed form) are parsed.
+def parse_branch(feature, key):
+    if isinstance(key, BranchLabel):
+        return key.op, key.operand
+    if isinstance(key, str):
+        match = re.fullmatch(rf"{re.escape(feature)} (in|<=|>) (.*)", key)
+        if match and match.group(1) == "in":
+            return "in", frozenset(ast.literal_eval(match.group(2)))
+        if match:
+            return match.group(1), float(match.group(2))
+    return "==", key
+
+# Hashable stand-in for NaN so missing values can be vocabulary entries
+NAN_KEY = ("nan",)
+
+def value_key(value):
+    if isinstance(value, float) and value != value:
+        return NAN_KEY
+    return value
+
+# A decision tree compiled into flat struct-of-arrays form. Node 0 is the root
+# and nodes are numbered breadth first. For every node:
+#
+#   kind          LEAF, CATEGORICAL (child looked up by category code) or
+#                 NUMERIC (left if value <= threshold, right otherwise)
+#   feature       index into `features` (-1 for leaves)
+#   threshold     split point of NUMERIC nodes
+#   left, right   children of NUMERIC nodes
+#   child_offset  start of the node's slice of `category_child`, which maps
+#                 each category code of the feature to a child (-1 = no child)
+#   value         class code predicted at the node: the leaf class, or for
+#                 internal nodes the fallback used for unseen categories
+#   counts        training class counts per node, when data was supplied
+#
+# `metadata` holds free-form facts about the model (target name, criterion)
+# that are saved with it.
+class FlatTree:
+    def __init__(self, features, categories, numeric, classes, kind, feature, threshold,
+                 left, right, child_offset, category_child, value, depth, counts=None):
+        self.features = list(features)
+        self.categories = categories
+        self.numeric = np.asarray(numeric, dtype=bool)
+        self.classes = np.asarray(classes)
+        self.kind = kind
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.child_offset = child_offset
+        self.category_child = category_child
+        self.value = value
+        self.depth = depth
+        self.counts = counts
+        self.metadata = {}
+        self.category_index = [{value_key(v): i for i, v in enumerate(values)} for values in categories]
+
+    @property
+    def n_nodes(self):
+        return len(self.kind)
+
+    # Encode a DataFrame, a mapping of columns or a 2-D array (columns in
+    # `features` order) into category codes (-1 = unseen) and numeric values
+    def encode(self, X):
+        columns = self.columns(X)
+        n = len(columns[0]) if columns else 0
+        codes = np.full((len(self.features), n), -1, dtype=np.int32)
+        values = np.full((len(self.features), n), np.nan)
+        for j, column in enumerate(columns):
+            if column is None:
+                continue
+            if self.numeric[j]:
+                values[j] = np.asarray(column, dtype=float)
+            else:
+                codes[j] = encode_column(column, self.category_index[j])
+        return codes, values
+
+    def columns(self, X):
+        if isinstance(X, np.ndarray):
+            return [X[:, j] for j in range(len(self.features))]
+        if hasattr(X, "columns") or isinstance(X, dict):
+            present = set(X.keys()) if isinstance(X, dict) else set(X.columns)
+            return [np.asarray(X[f]) if f in present else None for f in self.features]
+        raise TypeError(f"Cannot predict from {type(X).__name__}")
+
+    # Send every row down the tree one level at a time and return the node
+    # each row stops at, plus a mask of rows that stopped at an internal node
+    # because their category was never seen there during training
+    def route(self, codes, values, visit=None):
+        n = codes.shape[1]
+        node = np.zeros(n, dtype=np.int32)
+        stuck = np.zeros(n, dtype=bool)
+        active = np.arange(n)
+        while len(active):
+            if visit is not None:
+                visit(active, node[active])
+            current = node[active]
+            internal = self.kind[current] != LEAF
+            active, current = active[internal], current[internal]
+            if not len(active):
+                break
+            f = self.feature[current]
+            child = np.empty(len(active), dtype=np.int32)
+
+            categorical = self.kind[current] == CATEGORICAL
+            code = codes[f[categorical], active[categorical]]
+            seen = code >= 0
+            lookup = self.child_offset[current[categorical]] + np.where(seen, code, 0)
+            child[categorical] = np.where(seen, self.category_child[lookup], -1)
+
+            numeric = ~categorical
+            x = values[f[numeric], active[numeric]]
+            at = current[numeric]
+            child[numeric] = np.where(x <= self.threshold[at], self.left[at], self.right[at])
+
+            lost = child < 0
+            stuck[active[lost]] = True
+            node[active[~lost]] = child[~lost]
+            active = active[~lost]
+        return node, stuck
+
+    # Predict class labels for a whole batch. Rows with a category the tree has
+    # no branch for get the class of the node they stopped at when
+    # `unseen="fallback"`, or raise a ValueError when `unseen="error"`.
+    def predict(self, X, unseen="fallback"):
+        node, stuck = self.route(*self.encode(X))
+        if unseen == "error" and stuck.any():
+            rows = np.flatnonzero(stuck)
+            raise ValueError(f"{len(rows)} rows have categories never seen during training (first row: {rows[0]})")
+        return self.classes[self.value[node]]
+
+    # Class proportions of the node each row ends in (needs training counts)
+    def predict_proba(self, X):
+        if self.counts is None:
+            raise ValueError("Model has no class counts; compile it with training data")
+        node, _ = self.route(*self.encode(X))
+        counts = self.counts[node].astype(float)
+        return counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    # Count the training rows of every class reaching each node, and use them
+    # to pick the fallback class of internal nodes
+    def fit_counts(self, X, y):
+        class_index = {value_key(c): i for i, c in enumerate(self.classes)}
+        return self.fit_encoded_counts(*self.encode(X), encode_column(np.asarray(y), class_index))
+
+    # Same for rows already encoded like `encode` does, with class codes (-1 = unknown)
+    def fit_encoded_counts(self, codes, values, y):
+        counts = np.zeros((self.n_nodes, len(self.classes)), dtype=np.int64)
+        known = y >= 0
+
+        def visit(rows, nodes):
+            rows_known = known[rows]
+            flat = nodes[rows_known].astype(np.int64) * len(self.classes) + y[rows][rows_known]
+            counts.ravel()[:] += np.bincount(flat, minlength=counts.size)
+
+        self.route(codes, values, visit=visit)
+        self.counts = counts
+        internal = (self.kind != LEAF) & (counts.sum(axis=1) > 0)
+        self.value[internal] = np.argmax(counts[internal], axis=1)
+        return self
+
+# Map a column to vocabulary codes (-1 for values not in the vocabulary) with
+# one hash-table lookup of the whole column against the vocabulary's values.
+# pandas is imported here rather than up front so that loading a model for
+# prediction does not need it.
+def encode_column(column, index):
+    import pandas as pd
+    if not index:
+        return np.full(len(column), -1, dtype=np.int32)
+    values = pd.Index([np.nan if key == NAN_KEY else key for key in index])
+    positions = values.get_indexer(np.asarray(column))
+    codes = np.fromiter(index.values(), dtype=np.int32, count=len(index))
+    return np.where(positions >= 0, codes[positions], -1).astype(np.int32)
+
+# Compile a nested-dict tree from ID3 or gini_tree into a FlatTree. `features`
+# fixes the column order for array input (default: order of first use in the
+# tree); `classes` fixes the class codes (default: sorted leaf labels). If
+# `data` and `target_attribute` are given, per-node training class counts are
+# recorded and used as the fallback for unseen categories; otherwise internal
+# nodes fall back to their most common leaf label. `vocabulary`, as
+# (categories, numeric) per feature in `features` order, replaces the
+# vocabularies read off the tree, e.g. so all trees of a forest encode rows
+# the same way.
+def compile_tree(tree, features=None, classes=None, data=None, target_attribute=None, vocabulary=None):
+    nodes = []
+    queue = deque([(tree, 0)])
+    while queue:
+        subtree, depth = queue.popleft()
+        node = {"depth": depth, "children": []}
+        nodes.append(node)
+        if isinstance(subtree, dict):
+            node["feature"] = next(iter(subtree))
+            for key, child in subtree[node["feature"]].items():
+                node["children"].append((parse_branch(node["feature"], key), len(nodes) + len(queue)))
+                queue.append((child, depth + 1))
+        else:
+            node["label"] = subtree
+
+    if features is None:
+        features = list(dict.fromkeys(node["feature"] for node in nodes if "feature" in node))
+    feature_index = {feature: j for j, feature in enumerate(features)}
+    leaf_labels = [node["label"] for node in nodes if "feature" not in node]
+    if classes is None:
+        classes = np.unique(np.asarray(data[target_attribute]) if data is not None else np.array(leaf_labels))
+    class_index = {value_key(c): i for i, c in enumerate(classes)}
+
+    # Vocabulary of every categorical feature and which features are numeric
+    if vocabulary is not None:
+        categories, numeric = list(vocabulary[0]), np.asarray(vocabulary[1], dtype=bool)
+        category_index = [{value_key(value): i for i, value in enumerate(values)} for values in categories]
+    else:
+        numeric = np.zeros(len(features), dtype=bool)
+        vocabulary = [dict() for _ in features]
+        for node in nodes:
+            if "feature" not in node:
+                continue
+            j = feature_index[node["feature"]]
+            for (op, operand), _ in node["children"]:
+                if op in ("<=", ">"):
+                    numeric[j] = True
+                else:
+                    for value in (operand if op == "in" else [operand]):
+                        vocabulary[j].setdefault(value_key(value), value)
+        categories = [np.array(list(v.values()), dtype=object) for v in vocabulary]
+        category_index = [{key: i for i, key in enumerate(v)} for v in vocabulary]
+
+    n = len(nodes)
+    kind = np.zeros(n, dtype=np.int8)
+    feature = np.full(n, -1, dtype=np.int32)
+    threshold = np.full(n, np.nan)
+    left = np.full(n, -1, dtype=np.int32)
+    right = np.full(n, -1, dtype=np.int32)
+    child_offset = np.zeros(n, dtype=np.int64)
+    value = np.zeros(n, dtype=np.int32)
+    depth = np.array([node["depth"] for node in nodes], dtype=np.int32)
+    category_child = []
+    for i, node in enumerate(nodes):
+        if "feature" not in node:
+            value[i] = class_index[value_key(node["label"])]
+            continue
+        j = feature_index[node["feature"]]
+        feature[i] = j
+        if numeric[j]:
+            kind[i] = NUMERIC
+            for (op, operand), child in node["children"]:
+                threshold[i] = operand
+                if op == "<=":
+                    left[i] = child
+                else:
+                    right[i] = child
+        else:
+            kind[i] = CATEGORICAL
+            child_offset[i] = len(category_child)
+            slots = [-1] * len(categories[j])
+            for (op, operand), child in node["children"]:
+                for v in (operand if op == "in" else [operand]):
+                    slots[category_index[j][value_key(v)]] = child
+            category_child.extend(slots)
+
+    # Without data, internal nodes fall back to their most common leaf label
+    for i in reversed(range(n)):
+        if kind[i] != LEAF:
+            votes = np.zeros(len(classes), dtype=np.int64)
+            for _, child in nodes[i]["children"]:
+                votes += nodes[child].setdefault("votes", np.bincount([value[child]], minlength=len(classes)))
+            nodes[i]["votes"] = votes
+            value[i] = np.argmax(votes)
+
+    model = FlatTree(features, categories, numeric, classes, kind, feature, threshold, left, right,
+                     child_offset, np.array(category_child, dtype=np.int32), value, depth)
+    if data is not None and target_attribute is not None:
+        model.fit_counts(data, data[target_attribute])
+    return model
+
+# Features of an EncodedDataset that a tree built on it routes by threshold,
+# for compile_tree's `vocabulary`: ID3 branches on every value of numeric
+# features, so only Gini trees split them on thresholds
+def threshold_features(dataset, gini):
+    return dataset.numeric if gini else np.zeros(len(dataset.features), dtype=bool)
+
+# Category codes and numeric values of rows of an EncodedDataset, as
+# FlatTree.encode gives them for trees compiled on the dataset's vocabulary
+def encoded_rows(dataset, numeric, rows):
+    codes = dataset.codes[:, rows]
+    values = np.full(codes.shape, np.nan)
+    for j in np.flatnonzero(numeric):
+        values[j] = np.asarray(dataset.categories[j], dtype=float)[codes[j]]
+    return codes, values
+
+# On-disk model format. One file: the magic bytes, a little-endian u16
+# format version and u32 header length, a JSON header (features, classes,
+# vocabularies, metadata and where each node array lives), then every node
+# array stored raw and 64-byte aligned. Loading parses only the header; the
+# arrays are memory-mapped in place, so a model is ready to predict as soon
+# as it is opened and is paged in only as far as prediction touches it.
+MODEL_MAGIC = b"DTREE\0"
+MODEL_VERSION = 1
+MODEL_ARRAYS = ("kind", "feature", "threshold", "left", "right", "child_offset", "category_child", "value", "depth", "counts")
+ALIGNMENT = 64
+
+# Vocabulary values keep their Python type through JSON
+def to_header_value(value):
+    if isinstance(value, (bool, np.bool_)):
+        return ["b", bool(value)]
+    if isinstance(value, (int, np.integer)):
+        return ["i", int(value)]
+    if isinstance(value, (float, np.floating)):
+        return ["f", None if value != value else float(value)]
+    return ["s", str(value)]
+
+def from_header_value(item):
+    kind, value = item
+    if kind == "f":
+        return float("nan") if value is None else value
+    return value
+
+def save_model(model, path, metadata=None):
+    arrays = {name: np.ascontiguousarray(getattr(model, name)) for name in MODEL_ARRAYS if getattr(model, name) is not None}
+    header = {
+        "features": model.features,
+        "numeric": [bool(n) for n in model.numeric],
+        "classes": [to_header_value(c) for c in model.classes],
+        "categories": [[to_header_value(v) for v in values] for values in model.categories],
+        "metadata": {**model.metadata, **(metadata or {})},
+        "arrays": {},
+    }
+    # Array offsets depend on the header length, which depends on the
+    # offsets: grow the space reserved for the header until it fits
+    preamble = len(MODEL_MAGIC) + struct.calcsize("<HI")
+    start = 0
+    while True:
+        header["arrays"] = array_layout(arrays, start)
+        encoded = json.dumps(header).encode()
+        if preamble + len(encoded) <= start:
+            break
+        start = aligned(preamble + len(encoded))
+    with open(path, "wb") as f:
+        f.write(MODEL_MAGIC + struct.pack("<HI", MODEL_VERSION, len(encoded)) + encoded)
+        for name, array in arrays.items():
+            f.write(b"\0" * (header["arrays"][name]["offset"] - f.tell()))
+            f.write(array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes())
+
+def array_layout(arrays, start):
+    layout = {}
+    offset = start
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.newbyteorder("<").str, "shape": list(array.shape), "offset": offset}
+        offset += aligned(array.nbytes)
+    return layout
+
+def aligned(n):
+    return -(-n // ALIGNMENT) * ALIGNMENT
+
+# Open a saved model. With `mmap` the node arrays are read-only views of the
+# file; without it they are read into memory.
+def load_model(path, mmap=True):
+    with open(path, "rb") as f:
+        if f.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+            raise ValueError(f"{path} is not a decision tree model file")
+        version, header_length = struct.unpack("<HI", f.read(struct.calcsize("<HI")))
+        if version > MODEL_VERSION:
+            raise ValueError(f"{path} uses model format version {version}; this version reads up to {MODEL_VERSION}")
+        header = json.loads(f.read(header_length))
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+        if mmap and np.prod(shape) > 0:
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=spec["offset"]).reshape(shape)
+    classes = [from_header_value(c) for c in header["classes"]]
+    categories = [np.array([from_header_value(v) for v in values], dtype=object) for values in header["categories"]]
+    model = FlatTree(header["features"], categories, header["numeric"],
+                     np.array(classes, dtype=object) if any(c[0] == "s" for c in header["classes"]) else np.array(classes),
+                     **{name: arrays.get(name) for name in MODEL_ARRAYS})
+    model.metadata = header["metadata"]
+    return model
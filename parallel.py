@@ -0,0 +1,82 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from dataset import EncodedDataset
+
+# Nodes with at least this many rows are split in the main process with their
+# features scored in parallel; smaller subtrees are built whole by a worker
+PARALLEL_MIN_ROWS = 20_000
+
+def resolve_n_jobs(n_jobs):
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    return (os.cpu_count() or 1) if n_jobs < 0 else n_jobs
+
+# Process pool over one EncodedDataset kept in shared memory. The code
+# matrix, the class codes and the row permutation are copied into shared
+# blocks once; workers attach to them when they start, so tasks only pickle
+# (lo, hi) ranges and small results. Nodes and subtrees handed to different
+# workers cover disjoint ranges of the permutation, so workers partition
+# their own range in place without stepping on each other.
+#
+# Tasks are plain module-level functions called as func(dataset, *args) with
+# the worker's view of the dataset.
+class WorkerPool:
+    def __init__(self, dataset, n_jobs, min_rows=PARALLEL_MIN_ROWS):
+        self.min_rows = min_rows
+        self.blocks = {}
+        arrays = {}
+        for name in ("codes", "y", "perm"):
+            array = getattr(dataset, name)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            shared = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            shared[...] = array
+            self.blocks[name] = block
+            arrays[name] = (block.name, array.shape, array.dtype.str)
+        self.handle = (arrays, dataset.features, dataset.target_attribute, dataset.classes,
+                       dataset.categories, dataset.numeric, dataset.binned)
+        self.dataset = EncodedDataset.from_arrays(
+            dataset.features, dataset.target_attribute, dataset.classes, dataset.categories, dataset.numeric,
+            binned=dataset.binned, **{name: np.ndarray(shape, dtype=dtype, buffer=self.blocks[name].buf)
+                                      for name, (_, shape, dtype) in arrays.items()})
+        self.executor = ProcessPoolExecutor(max_workers=resolve_n_jobs(n_jobs), initializer=attach, initargs=(self.handle,))
+
+    # Whether a node is big enough to stay in the main process
+    def is_large(self, n_rows):
+        return n_rows >= self.min_rows
+
+    def submit(self, func, *args):
+        return self.executor.submit(run, func, args)
+
+    def map(self, func, args_list):
+        return [future.result() for future in [self.submit(func, *args) for args in args_list]]
+
+    def close(self):
+        self.executor.shutdown()
+        self.dataset = None
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+worker_dataset = None
+worker_blocks = []
+
+def attach(handle):
+    global worker_dataset
+    arrays, features, target_attribute, classes, categories, numeric, binned = handle
+    views = {}
+    for name, (block_name, shape, dtype) in arrays.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        worker_blocks.append(block)
+        views[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    worker_dataset = EncodedDataset.from_arrays(features, target_attribute, classes, categories, numeric, binned=binned, **views)
+
+def run(func, args):
+    return func(worker_dataset, *args)
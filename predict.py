@@ -0,0 +1,83 @@
+import argparse
+import csv
+import sys
+import numpy as np
+from model import load_model
+
+# Batch prediction from a saved model (see model.save_model). Only NumPy and
+# the standard library are imported up front (pandas only once categorical
+# columns are encoded), so starting up costs little more than memory-mapping
+# the model; this is what `trees.py predict` runs.
+
+# Read the model's feature columns from a CSV file. Numeric features, and
+# categorical ones whose training values were numbers, are parsed as floats
+# (empty = NaN) so they compare and look up like the values seen in training.
+# Text that is not a number in such a column raises ValueError.
+def read_columns(model, path):
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        rows = list(reader)
+    position = {name: i for i, name in enumerate(header)}
+    missing = [feature for feature in model.features if feature not in position]
+    if missing:
+        raise ValueError(f"Input is missing feature columns: {', '.join(missing)}")
+    columns = {}
+    for j, feature in enumerate(model.features):
+        values = [row[position[feature]] for row in rows]
+        as_numbers = model.numeric[j] or (len(model.categories[j]) and
+                                          all(isinstance(v, (int, float)) for v in model.categories[j]))
+        if as_numbers:
+            try:
+                columns[feature] = np.array([float(v) if v != "" else np.nan for v in values])
+            except ValueError:
+                row, value = next((i, v) for i, v in enumerate(values, 1) if v != "" and not is_number(v))
+                raise ValueError(f"Column '{feature}' expects numbers but row {row} has '{value}'") from None
+        else:
+            columns[feature] = np.array([v if v != "" else np.nan for v in values], dtype=object)
+    return columns, len(rows)
+
+def is_number(text):
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='trees.py predict', description='Predict with a saved decision tree model')
+    parser.add_argument('model', type=str, help='Model file written by train --save')
+    parser.add_argument('input', type=str, help='Input CSV file path')
+    parser.add_argument('--output', type=str, help='Write predictions to this CSV file instead of stdout')
+    parser.add_argument('--proba', action='store_true', help='Also write the class proportions of each leaf')
+    parser.add_argument('--unseen', choices=['fallback', 'error'], default='fallback',
+                        help='What to do with categories never seen in training (default: fallback)')
+    args = parser.parse_args(argv)
+
+    # Bad input (a model without class counts for --proba, unseen categories
+    # with --unseen error, text in a numeric column) is reported as a usage
+    # error rather than a traceback
+    try:
+        model = load_model(args.model)
+        columns, _ = read_columns(model, args.input)
+        predictions = model.predict(columns, unseen=args.unseen)
+        target = model.metadata.get("target", "prediction")
+        header = [target]
+        table = [predictions]
+        if args.proba:
+            header += [f"P({c})" for c in model.classes]
+            table += list(model.predict_proba(columns).T)
+    except ValueError as e:
+        parser.error(str(e))
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        writer.writerow(header)
+        writer.writerows(zip(*table))
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
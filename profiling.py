@@ -0,0 +1,171 @@
+import json
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from tracing import Tracer
+
+# Opt-in per-node instrumentation of the tree builders. For every node the
+# builders record the rows it holds, the candidate splits they scored, the
+# time spent scoring (impurity math), partitioning rows into children and
+# reporting trace events, the node's own wall time (children excluded) and,
+# with `track_memory`, the peak bytes allocated by its own work. Per run the
+# time spent encoding the DataFrame is recorded too. Memory tracking is off
+# by default: tracemalloc hooks every allocation, which slows the builders
+# down and skews the very timings being attributed, so reports made with it
+# say so.
+#
+# Time is attributed to one phase at a time: builders switch phases with
+# `phase()`, and a tracer wrapped by `wrap_tracer` switches to "trace" for
+# the duration of every event, so phases never overlap.
+#
+# Builders only call a profiler when `profiler.enabled` is true (the
+# `enabled` convention of tracing.py).
+PHASES = ("impurity", "partition", "trace")
+
+class NullProfiler:
+    enabled = False
+    track_memory = False
+
+NULL_PROFILER = NullProfiler()
+
+class Profiler:
+    enabled = True
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.started_tracemalloc = False
+        self.runs = []
+        self.nodes = []
+        self.candidates = 0
+        self.outside = defaultdict(float)
+        self.current = None
+        self.phase_name = None
+        self.phase_start = time.perf_counter()
+
+    # -- runs ---------------------------------------------------------------
+
+    def start_run(self, criterion):
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        self.runs.append({"criterion": criterion, "rows": 0, "encode_s": 0.0, "wall_s": 0.0, "start": time.perf_counter()})
+
+    def encoded(self, rows):
+        run = self.runs[-1]
+        run["rows"] = rows
+        run["encode_s"] = time.perf_counter() - run["start"]
+
+    def end_run(self):
+        run = self.runs[-1]
+        run["wall_s"] = time.perf_counter() - run.pop("start")
+        run["nodes"] = sum(1 for node in self.nodes if node["run"] == len(self.runs) - 1)
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    # -- nodes --------------------------------------------------------------
+
+    def start_node(self, criterion, depth, rows, path=None):
+        self.phase(None)
+        self.current = {"run": len(self.runs) - 1, "criterion": criterion, "depth": depth, "path": path, "rows": int(rows),
+                        "feature": None, "leaf": None, "candidates": 0, "wall_s": 0.0, "bytes": 0,
+                        **{f"{phase}_s": 0.0 for phase in PHASES}}
+        self.node_start = time.perf_counter()
+        self.node_candidates = self.candidates
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self.node_memory = tracemalloc.get_traced_memory()[0]
+        self.phase("impurity")
+
+    def end_node(self, feature=None, leaf=None):
+        self.phase(None)
+        node = self.current
+        node["feature"] = feature
+        node["leaf"] = leaf
+        node["candidates"] = self.candidates - self.node_candidates
+        node["wall_s"] = time.perf_counter() - self.node_start
+        if self.track_memory and tracemalloc.is_tracing():
+            node["bytes"] = tracemalloc.get_traced_memory()[1] - self.node_memory
+        self.nodes.append(node)
+        self.current = None
+
+    # Switch the running phase and return the previous one
+    def phase(self, name):
+        now = time.perf_counter()
+        if self.phase_name is not None:
+            if self.current is not None:
+                self.current[f"{self.phase_name}_s"] += now - self.phase_start
+            else:
+                self.outside[f"{self.phase_name}_s"] += now - self.phase_start
+        previous = self.phase_name
+        self.phase_name = name
+        self.phase_start = now
+        return previous
+
+    def count_candidates(self, n):
+        self.candidates += int(n)
+
+    # Add the nodes profiled by a worker process to the current run
+    def merge(self, nodes):
+        for node in nodes:
+            self.nodes.append({**node, "run": len(self.runs) - 1, "worker": True})
+
+    def wrap_tracer(self, tracer):
+        return ProfilingTracer(tracer, self)
+
+    # -- reports ------------------------------------------------------------
+
+    def rollup(self, key):
+        groups = {}
+        for node in self.nodes:
+            group_key = (node["run"], key(node))
+            group = groups.setdefault(group_key, {"run": node["run"], "criterion": node["criterion"], "key": group_key[1], "nodes": 0,
+                                                  "rows": 0, "candidates": 0, "wall_s": 0.0, "bytes": 0,
+                                                  **{f"{phase}_s": 0.0 for phase in PHASES}})
+            group["nodes"] += 1
+            for field in ("rows", "candidates", "wall_s", "bytes") + tuple(f"{phase}_s" for phase in PHASES):
+                group[field] += node[field]
+        return sorted(groups.values(), key=lambda group: (group["run"], group["key"]))
+
+    def report(self):
+        return {
+            "track_memory": self.track_memory,
+            "runs": self.runs,
+            "by_depth": self.rollup(lambda node: node["depth"]),
+            "by_feature": self.rollup(lambda node: node["feature"] if node["feature"] is not None else f"(leaf: {node['leaf']})"),
+            "outside_nodes": dict(self.outside),
+            "nodes": self.nodes,
+        }
+
+    def to_json(self, file):
+        json.dump(self.report(), file, indent=2, default=str)
+
+    def print_summary(self, file=None):
+        file = sys.stdout if file is None else file
+        for i, run in enumerate(self.runs):
+            nodes = [node for node in self.nodes if node["run"] == i]
+            totals = {field: sum(node[field] for node in nodes) for field in ("wall_s", "candidates", "bytes", "impurity_s", "partition_s", "trace_s")}
+            print(f"{run['criterion']}: {run['rows']} rows, {len(nodes)} nodes, {totals['candidates']} candidates, "
+                  f"{run['wall_s']:.4f}s total (encode {run['encode_s']:.4f}s, impurity {totals['impurity_s']:.4f}s, "
+                  f"partition {totals['partition_s']:.4f}s, trace {totals['trace_s']:.4f}s)", file=file)
+        print(f"{'criterion':<9} {'depth':>5} {'nodes':>6} {'rows':>9} {'cands':>7} {'wall s':>8} {'impur s':>8} {'part s':>8} {'trace s':>8} {'alloc KB':>8}", file=file)
+        for group in self.rollup(lambda node: node["depth"]):
+            allocated = f"{group['bytes'] / 1024:>8.1f}" if self.track_memory else f"{'-':>8}"
+            print(f"{group['criterion']:<9} {group['key']:>5} {group['nodes']:>6} {group['rows']:>9} {group['candidates']:>7} "
+                  f"{group['wall_s']:>8.4f} {group['impurity_s']:>8.4f} {group['partition_s']:>8.4f} {group['trace_s']:>8.4f} "
+                  f"{allocated}", file=file)
+        if self.track_memory:
+            print("(timings measured with allocation tracing on)", file=file)
+
+# Forwards events to another tracer, charging the time to the "trace" phase
+class ProfilingTracer(Tracer):
+    def __init__(self, tracer, profiler):
+        self.tracer = tracer
+        self.profiler = profiler
+        self.enabled = tracer.enabled
+
+    def emit(self, event, **fields):
+        previous = self.profiler.phase("trace")
+        self.tracer.emit(event, **fields)
+        self.profiler.phase(previous)
@@ -0,0 +1,106 @@
+import os
+from collections import deque
+
+# From Plotly's "Set3" color scale which is nice and pastel
+COLORS = ['#8dd3c7', '#ffffb3', '#bebada', '#fb8072',
+          '#80b1d3', '#fdb462', '#b3de69', '#fccde5',
+          '#d9d9d9', '#bc80bd', '#ccebc5', '#ffed6f']
+
+# Leaf fill color of every target class, keyed by the class as a string
+def class_colors(target_classes):
+    if len(target_classes) == 2:
+        return {
+            str(target_classes[0]): 'lightcoral',
+            str(target_classes[1]): 'palegreen'
+        }
+    return {str(class_val): color for class_val, color in zip(target_classes, COLORS)}
+
+def quote(text):
+    return '"' + str(text).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+
+def attributes(**attrs):
+    return " [" + " ".join(f"{name}={quote(value)}" for name, value in attrs.items()) + "]"
+
+def edge_label(value):
+    value = str(value)
+    if "{" in value:
+        value = value.split("{")[1].split("}")[0]
+    return value
+
+# Write a nested-dict tree as DOT text to `file`, one line per node and edge
+# as the tree is walked, so nothing proportional to the tree is held besides
+# the walk queue. Colors are computed once from `target_classes`.
+#
+# Nodes deeper than `max_depth`, and every node once `max_nodes` have been
+# drawn, are collapsed: each collapsed subtree becomes one dashed "… N more
+# nodes" box listing the class counts of the training rows reaching it
+# (from `model`, a FlatTree compiled from the same tree with training data)
+# or, without counts, how many of its leaves predict each class. A subtree
+# that is a single leaf is drawn as that leaf instead. Nodes are visited
+# breadth first, in the same order compile_tree numbers them.
+def write_dot(tree, target_classes, file, max_depth=None, max_nodes=None, model=None):
+    color_map = class_colors(target_classes)
+    counts = model.counts if model is not None else None
+    file.write("digraph {\n")
+    file.write("\tgraph [nodesep=1.0 ranksep=1.0 splines=false]\n")
+    file.write("\tnode [fontname=Helvetica]\n")
+    file.write("\tedge [fontname=Helvetica]\n")
+
+    drawn = 0
+    summaries = {}
+    # (subtree, depth, parent node id, branch value, collapsed root index)
+    queue = deque([(tree, 0, None, None, None)])
+    index = 0
+    while queue:
+        subtree, depth, parent, value, collapsed = queue.popleft()
+        is_leaf = not isinstance(subtree, dict)
+        if collapsed is None and not is_leaf and ((max_depth is not None and depth > max_depth) or
+                                                  (max_nodes is not None and drawn >= max_nodes)):
+            collapsed = index
+            summaries[index] = {"nodes": 0, "leaves": {}}
+            if parent is not None:
+                file.write(f"\t{quote(parent)} -> {quote(f's{index}')}{attributes(label=edge_label(value))}\n")
+        if collapsed is not None:
+            summary = summaries[collapsed]
+            summary["nodes"] += 1
+            if is_leaf:
+                summary["leaves"][str(subtree)] = summary["leaves"].get(str(subtree), 0) + 1
+        else:
+            drawn += 1
+            if is_leaf:
+                color = color_map.get(str(subtree))
+                style = {'fillcolor': color} if color else {}
+                file.write(f"\t{quote(index)}{attributes(label=subtree, **style, shape='box', style='filled')}\n")
+            else:
+                file.write(f"\t{quote(index)}{attributes(label=next(iter(subtree)))}\n")
+            if parent is not None:
+                label = "xlabel" if is_leaf else "label"
+                file.write(f"\t{quote(parent)} -> {quote(index)}{attributes(**{label: edge_label(value)})}\n")
+        if not is_leaf:
+            for child_value, child in subtree[next(iter(subtree))].items():
+                queue.append((child, depth + 1, index, child_value, collapsed))
+        index += 1
+
+    for root, summary in summaries.items():
+        n = summary["nodes"]
+        if counts is not None:
+            detail = ", ".join(f"{c}: {k}" for c, k in zip(model.classes, counts[root]))
+        else:
+            detail = "leaves: " + ", ".join(f"{c} {k}" for c, k in summary["leaves"].items())
+        label = f"… {n} more node{'s' if n != 1 else ''}\n{detail}"
+        file.write(f"\t{quote(f's{root}')}{attributes(label=label, shape='box', style='dashed')}\n")
+    file.write("}\n")
+
+# Write `name`.gv and, if `render`, lay it out into `name`.svg with the
+# Graphviz `dot` program (the .gv is removed afterwards). Returns the path of
+# the file produced. graphviz is only imported when rendering.
+def render_tree(tree, target_classes, name, max_depth=None, max_nodes=None, model=None, render=True):
+    path = f"{name}.gv"
+    with open(path, "w") as f:
+        write_dot(tree, target_classes, f, max_depth, max_nodes, model)
+    if not render:
+        return path
+    import graphviz
+    graphviz.render('dot', 'svg', path, outfile=f"{name}.svg")
+    os.remove(path)
+    return f"{name}.svg"
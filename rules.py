@@ -0,0 +1,156 @@
+from model import LEAF, NUMERIC, parse_branch
+
+# Classification rules and the two executable forms of a tree:
+#
+#   extract_rules   readable "IF ... AND ... THEN ..." rules of a nested-dict tree
+#   numpy_source    Python source of a function scoring a whole DataFrame (or
+#                   mapping of columns) with NumPy row-index masks
+#   sql_case        a SQL CASE WHEN expression to score rows inside a database
+#
+# Both executable forms are generated from a FlatTree (see model.compile_tree)
+# and give exactly the same predictions as FlatTree.predict: missing numeric
+# values (NaN / NULL) take the "greater than" branch, and a row whose category
+# has no branch gets the fallback class of the node it stops at.
+
+# Readable condition of one branch: `feature='value'` for ID3 branches, the
+# branch label itself (`Age in {'<=30'}`, `Income <= 2.5`) for Gini ones
+def condition_text(feature, key):
+    op, _ = parse_branch(feature, key)
+    if op == "==":
+        return f"{feature}='{key}'"
+    return str(key)
+
+def extract_rules(tree, target_var):
+    rules = []
+    stack = [(tree, [])]
+    while stack:
+        subtree, conditions = stack.pop()
+        if not isinstance(subtree, dict):
+            rules.append(f"IF {' AND '.join(conditions)} THEN {target_var}='{subtree}'")
+            continue
+        root = next(iter(subtree))
+        for key, child in reversed(list(subtree[root].items())):
+            stack.append((child, conditions + [condition_text(root, key)]))
+    return rules
+
+# Children of an internal FlatTree node as (values or threshold test, child)
+def branches(model, i):
+    j = model.feature[i]
+    if model.kind[i] == NUMERIC:
+        return [("<=", model.threshold[i], model.left[i]), (">", model.threshold[i], model.right[i])]
+    slots = model.category_child[model.child_offset[i]:model.child_offset[i] + len(model.categories[j])]
+    children = {}
+    for code, child in enumerate(slots):
+        if child >= 0:
+            children.setdefault(int(child), []).append(model.categories[j][code])
+    return [("in", values, child) for child, values in children.items()]
+
+def is_nan(value):
+    return isinstance(value, float) and value != value
+
+def py_literal(value):
+    value = value.item() if hasattr(value, "item") else value
+    if isinstance(value, float) and (value != value or value in (float("inf"), float("-inf"))):
+        return f"float('{value}')"
+    return repr(value)
+
+# Source of a standalone function `name(X)` predicting every row of X. Rows
+# are sent down the tree as index arrays, one node at a time in breadth-first
+# order, so the work is proportional to rows x depth and only the current
+# frontier of index arrays is alive; each node writes its class (the leaf
+# class, or the fallback of internal nodes) over the rows reaching it.
+def numpy_source(model, name="predict"):
+    used = sorted({int(j) for j in model.feature[model.kind != LEAF]})
+    lines = ["import numpy as np", "",
+             f"CLASSES = np.array([{', '.join(py_literal(c) for c in model.classes)}], dtype=object)", "",
+             f"def {name}(X):"]
+    for j in used:
+        dtype = "float" if model.numeric[j] else "object"
+        lines.append(f"    x{j} = np.asarray(X[{py_literal(model.features[j])}], dtype={dtype})")
+    lines.append(f"    rows0 = np.arange(len(x{used[0]}))" if used else "    rows0 = np.arange(len(X[next(iter(X.keys()))]))")
+    lines.append(f"    out = np.full(len(rows0), {int(model.value[0])})")
+
+    written = {0: int(model.value[0])}
+    for i in range(model.n_nodes):
+        if model.kind[i] == LEAF:
+            continue
+        j = model.feature[i]
+        if model.kind[i] == NUMERIC:
+            lines.append(f"    v = x{j}[rows{i}] <= {py_literal(model.threshold[i])}")
+        else:
+            lines.append(f"    v = x{j}[rows{i}]")
+        for op, operand, child in branches(model, i):
+            if op == "in":
+                mask = " | ".join("(v != v)" if is_nan(value) else f"(v == {py_literal(value)})" for value in operand)
+            else:
+                mask = "v" if op == "<=" else "~v"
+            lines.append(f"    rows{child} = rows{i}[{mask}]")
+            # Rows already hold the class written by the nearest ancestor
+            written[child] = int(model.value[child])
+            if written[child] != written[i]:
+                lines.append(f"    out[rows{child}] = {written[child]}")
+            if model.kind[child] == LEAF:
+                lines.append(f"    del rows{child}")
+        lines.append(f"    del rows{i}")
+    lines.append("    return CLASSES[out]")
+    return "\n".join(lines) + "\n"
+
+# Compile `numpy_source` and return the scoring function
+def compile_numpy(model, name="predict"):
+    namespace = {}
+    exec(compile(numpy_source(model, name), f"<{name}>", "exec"), namespace)
+    return namespace[name]
+
+def sql_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+def sql_literal(value):
+    value = value.item() if hasattr(value, "item") else value
+    if value is None or is_nan(value):
+        return "NULL"
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+# SQL expression predicting the class of a row from its columns: one flat
+# CASE with a WHEN per leaf, whose condition ANDs the tests along its path.
+# (Nesting a CASE per node would be shorter, but databases limit how deeply
+# expressions nest and SQLite's parser overflows on moderately deep trees.) After
+# the leaves come the categorical nodes whose fallback class differs from
+# that of the nearest such ancestor, deepest first, for rows stopped there by
+# an unseen category. `column` maps a feature name to the SQL text of its
+# column (default: the quoted name).
+def sql_case(model, column=sql_identifier):
+    paths = {0: []}
+    fallback = {0: model.value[0]}
+    leaves, stops = [], []
+    for i in range(model.n_nodes):
+        path = paths.pop(i)
+        if model.kind[i] == LEAF:
+            leaves.append((path, model.value[i]))
+            continue
+        col = column(model.features[model.feature[i]])
+        if model.kind[i] != NUMERIC and i > 0 and model.value[i] != fallback[i]:
+            stops.append((path, model.value[i]))
+        for op, operand, child in branches(model, i):
+            if op == "<=":
+                test = f"{col} <= {sql_literal(operand)}"
+            elif op == ">":
+                # NULL <= t is not true either, so missing values go right
+                test = f"({col} > {sql_literal(operand)} OR {col} IS NULL)"
+            else:
+                values = [value for value in operand if not is_nan(value)]
+                test = f"{col} IN ({', '.join(sql_literal(value) for value in values)})" if values else None
+                if len(values) < len(operand):
+                    test = f"({test} OR {col} IS NULL)" if test else f"{col} IS NULL"
+            paths[child] = path + [test]
+            fallback[child] = fallback[i] if model.kind[i] == NUMERIC else model.value[i]
+    whens = [f"WHEN {' AND '.join(path) or '1 = 1'} THEN {sql_literal(model.classes[value])}"
+             for path, value in leaves + stops[::-1]]
+    return "\n".join(["CASE"] + ["  " + when for when in whens] + [f"  ELSE {sql_literal(model.classes[model.value[0]])}", "END"])
+
+# A query scoring every row of `table`
+def sql_query(model, table, target="prediction"):
+    return f"SELECT *, {sql_case(model)} AS {sql_identifier(target)}\nFROM {sql_identifier(table)}"
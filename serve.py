@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import deque
+import numpy as np
+from model import load_model
+
+# Resident scoring service for a saved model (see model.save_model); this is
+# what `trees.py serve` runs. The model is loaded once and rows arrive as
+# JSON lines on stdin, a Unix socket or a TCP port. Every line is one request:
+#
+#   {"Age": "<=30", "Income": "High", ...}              a row of feature values
+#   {"id": 7, "row": {"Age": "<=30", ...}}              the same, with an id echoed back
+#   {"stats": true}                                     latency and throughput counters
+#
+# and gets one response line, in request order per connection:
+#
+#   {"id": 7, "prediction": "No", "proba": {"No": 0.75, "Yes": 0.25}}
+#
+# ("proba" only with --proba). Requests from all connections go through one
+# MicroBatcher, which collects them into batches of up to `max_batch` rows,
+# waiting at most `max_wait` seconds after the first one, and scores each
+# batch with a single vectorized predict call. Like predict.py, this imports
+# only NumPy and the standard library.
+
+class ServiceStats:
+    def __init__(self, window=100_000):
+        self.started = time.perf_counter()
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+
+    def record_batch(self, latencies):
+        self.batches += 1
+        self.requests += len(latencies)
+        self.latencies.extend(latencies)
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch": self.requests / self.batches if self.batches else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else None,
+            "throughput_rps": self.requests / elapsed if elapsed > 0 else 0.0,
+            "uptime_s": elapsed,
+        }
+
+class MicroBatcher:
+    def __init__(self, model, max_batch=256, max_wait=0.002, proba=False):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.proba = proba and model.counts is not None
+        self.stats = ServiceStats()
+        self.queue = asyncio.Queue()
+        # Vocabularies that were numbers in training, so JSON numbers and
+        # strings alike are looked up as numbers
+        self.as_numbers = [bool(numeric) or (len(categories) > 0 and all(isinstance(v, (int, float)) for v in categories))
+                           for numeric, categories in zip(model.numeric, model.categories)]
+
+    async def submit(self, row):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((row, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self.score(batch)
+
+    def score(self, batch):
+        try:
+            results = self.predict([row for row, _, _ in batch])
+        except Exception as error:
+            # Score the rows one by one so one bad row fails only itself
+            if len(batch) > 1:
+                for item in batch:
+                    self.score([item])
+                return
+            self.stats.errors += 1
+            results = [{"error": str(error)}]
+        done = time.perf_counter()
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        self.stats.record_batch([done - start for _, _, start in batch])
+
+    def predict(self, rows):
+        columns = {}
+        for j, feature in enumerate(self.model.features):
+            values = [row.get(feature) for row in rows]
+            if self.as_numbers[j]:
+                columns[feature] = np.array([np.nan if v is None or v == "" else float(v) for v in values])
+            else:
+                columns[feature] = np.array([np.nan if v is None else v for v in values], dtype=object)
+        labels = [to_json(label) for label in self.model.predict(columns)]
+        if not self.proba:
+            return [{"prediction": label} for label in labels]
+        classes = [str(c) for c in self.model.classes]
+        probabilities = self.model.predict_proba(columns)
+        return [{"prediction": label, "proba": dict(zip(classes, map(float, p)))} for label, p in zip(labels, probabilities)]
+
+def to_json(value):
+    return value.item() if hasattr(value, "item") else value
+
+# Answer one request line (always returns a response object)
+async def handle_line(batcher, line):
+    try:
+        request = json.loads(line)
+    except json.JSONDecodeError as error:
+        return {"error": f"invalid JSON: {error}"}
+    if not isinstance(request, dict):
+        return {"error": "request must be a JSON object"}
+    if request.get("stats") is True and "stats" not in batcher.model.features:
+        return {"stats": batcher.stats.snapshot()}
+    if "row" in request:
+        if not isinstance(request["row"], dict):
+            return {"id": request.get("id"), "error": "row must be a JSON object"}
+        return {"id": request.get("id"), **await batcher.submit(request["row"])}
+    return await batcher.submit(request)
+
+# Serve one stream of request lines: every line is answered by its own task
+# (so many are in flight at once and can share batches) and the answers are
+# written back in request order
+async def serve_stream(batcher, read_line, write_line):
+    pending = asyncio.Queue()
+
+    async def writer():
+        while True:
+            task = await pending.get()
+            if task is None:
+                return
+            await write_line(json.dumps(await task) + "\n")
+
+    writing = asyncio.create_task(writer())
+    while True:
+        line = await read_line()
+        if not line:
+            break
+        if line.strip():
+            pending.put_nowait(asyncio.create_task(handle_line(batcher, line)))
+    pending.put_nowait(None)
+    await writing
+
+async def serve_stdio(batcher):
+    loop = asyncio.get_running_loop()
+
+    async def read_line():
+        return await loop.run_in_executor(None, sys.stdin.readline)
+
+    async def write_line(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    await serve_stream(batcher, read_line, write_line)
+
+async def serve_connection(batcher, reader, writer):
+    async def write_line(text):
+        writer.write(text.encode())
+        await writer.drain()
+
+    try:
+        await serve_stream(batcher, reader.readline, write_line)
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+def report(batcher):
+    print(json.dumps({"stats": batcher.stats.snapshot()}), file=sys.stderr, flush=True)
+
+async def report_every(batcher, interval):
+    while True:
+        await asyncio.sleep(interval)
+        report(batcher)
+
+async def serve(model, unix=None, host="127.0.0.1", port=None, max_batch=256, max_wait=0.002, proba=False, stats_interval=0):
+    batcher = MicroBatcher(model, max_batch, max_wait, proba)
+    background = [asyncio.create_task(batcher.run())]
+    if stats_interval:
+        background.append(asyncio.create_task(report_every(batcher, stats_interval)))
+    try:
+        if unix is None and port is None:
+            await serve_stdio(batcher)
+        else:
+            handler = lambda reader, writer: serve_connection(batcher, reader, writer)
+            if unix is not None:
+                server = await asyncio.start_unix_server(handler, path=unix)
+            else:
+                server = await asyncio.start_server(handler, host=host, port=port)
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.add_signal_handler(signum, stop.set)
+            print(f"Serving on {unix if unix is not None else f'{host}:{port}'}", file=sys.stderr, flush=True)
+            async with server:
+                await stop.wait()
+            if unix is not None and os.path.exists(unix):
+                os.unlink(unix)
+    finally:
+        for task in background:
+            task.cancel()
+        report(batcher)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='trees.py serve', description='Serve predictions of a saved decision tree model')
+    parser.add_argument('model', type=str, help='Model file written by train --save')
+    parser.add_argument('--unix', type=str, metavar='PATH', help='Listen on this Unix socket instead of reading stdin')
+    parser.add_argument('--port', type=int, help='Listen on this TCP port instead of reading stdin')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='Address to bind with --port (default: 127.0.0.1)')
+    parser.add_argument('--max-batch', type=int, default=256, help='Most rows scored in one batch (default: 256)')
+    parser.add_argument('--max-wait-ms', type=float, default=2.0,
+                        help='Longest a request waits for its batch to fill, in milliseconds (default: 2)')
+    parser.add_argument('--proba', action='store_true', help='Include the class proportions of the leaf in every response')
+    parser.add_argument('--stats-interval', type=float, default=0,
+                        help='Print latency and throughput counters to stderr every this many seconds (always printed on exit)')
+    args = parser.parse_args(argv)
+
+    model = load_model(args.model)
+    try:
+        asyncio.run(serve(model, args.unix, args.host, args.port, args.max_batch, args.max_wait_ms / 1000, args.proba,
+                          args.stats_interval))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
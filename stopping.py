@@ -0,0 +1,151 @@
+import heapq
+import itertools
+import time
+import numpy as np
+
+# Stopping controls shared by the ID3 and Gini builders. A node becomes a
+# leaf, labelled with its majority class, when
+#
+#   max_depth              it is this deep (the root has depth 0)
+#   min_samples_split      it holds fewer rows than this
+#   min_samples_leaf       every candidate split leaves a child with fewer rows
+#                          than this (such candidates are skipped)
+#   min_impurity_decrease  the best split lowers the impurity, weighted by the
+#                          node's share of all rows, by less than this
+#
+# and the tree as a whole can be held to a budget of `max_leaf_nodes`
+# leaves, `max_nodes` nodes or `max_seconds` of wall-clock time. Under a
+# budget the tree is grown best-first: every node on the frontier is scored
+# and the one whose split lowers the total impurity (rows x impurity
+# decrease) the most is split next, so the budget goes to the most useful
+# splits. Without one, trees grow depth-first exactly as before.
+#
+# Limits also carry the per-node feature sampling of random forests (see
+# forest.py): with `max_features` set, each node scores only that many of its
+# features, drawn at random from a generator seeded by `seed` and the node
+# itself, so a serial and a parallel build draw the same.
+#
+# Builders only consult limits when `limits.enabled` is true (the `enabled`
+# convention of tracing.py).
+class Limits:
+    def __init__(self, max_depth=None, min_samples_split=2, min_samples_leaf=1, min_impurity_decrease=0.0,
+                 max_leaf_nodes=None, max_nodes=None, max_seconds=None, max_features=None, seed=0):
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_samples_leaf = min_samples_leaf
+        self.min_impurity_decrease = min_impurity_decrease
+        self.max_leaf_nodes = max_leaf_nodes
+        self.max_nodes = max_nodes
+        self.max_seconds = max_seconds
+        self.max_features = max_features
+        self.seed = seed
+        self.best_first = max_leaf_nodes is not None or max_nodes is not None or max_seconds is not None
+        self.enabled = (self.best_first or max_depth is not None or min_samples_split > 2 or min_samples_leaf > 1
+                        or min_impurity_decrease > 0 or max_features is not None)
+
+    # Why a node with `rows` rows at `depth` must be a leaf before any split is scored
+    def leaf_reason(self, depth, rows):
+        if self.max_depth is not None and depth >= self.max_depth:
+            return "max_depth"
+        if rows < self.min_samples_split:
+            return "min_samples_split"
+        return None
+
+    # Whether the best split's impurity decrease is large enough to make (any
+    # split is without a minimum, even one rounding makes slightly negative)
+    def worth_splitting(self, decrease, rows, total_rows):
+        return self.min_impurity_decrease <= 0 or rows / total_rows * decrease >= self.min_impurity_decrease
+
+    # The features scored at the node perm[lo:hi] at `depth`: all of them, or
+    # a random `max_features` of them in their original order
+    def candidates(self, features, depth, lo, hi):
+        if self.max_features is None or len(features) <= self.max_features:
+            return features
+        rng = np.random.default_rng([self.seed, depth, lo, hi])
+        return [features[i] for i in np.sort(rng.choice(len(features), self.max_features, replace=False))]
+
+NO_LIMITS = Limits()
+
+# Leaf of a tree cut short by a limit. It is its class label (it prints,
+# compares and hashes exactly like it) but also carries the class
+# distribution of the training rows that reached it, as {class: count}.
+class StrLeaf(str):
+    pass
+
+class IntLeaf(int):
+    pass
+
+class FloatLeaf(float):
+    pass
+
+LEAF_TYPES = {str: StrLeaf, int: IntLeaf, float: FloatLeaf}
+
+def cut_leaf(classes, class_counts):
+    label = classes[np.argmax(class_counts)]
+    label = label.item() if isinstance(label, np.generic) else label
+    leaf_type = LEAF_TYPES.get(type(label))
+    if leaf_type is None:
+        return label
+    leaf = leaf_type(label)
+    leaf.distribution = {c.item() if isinstance(c, np.generic) else c: int(n) for c, n in zip(classes, class_counts)}
+    return leaf
+
+# The leaf a node must become before any split is scored, as (label,
+# reason), or None if it may be split: pure nodes keep their class, nodes
+# with no features left take their parent's class and nodes stopped by a
+# limit their own majority class, with its distribution
+def leaf_before_split(classes, class_counts, features, parent_node_class, depth, limits):
+    present_classes = np.flatnonzero(class_counts)
+    if len(present_classes) <= 1:
+        return classes[present_classes[0]], "pure"
+    if len(features) == 0:
+        return parent_node_class, "no_features"
+    if limits.enabled:
+        reason = limits.leaf_reason(depth, int(np.sum(class_counts)))
+        if reason:
+            return cut_leaf(classes, class_counts), reason
+    return None
+
+# Frontier of a best-first build: nodes waiting to be split, most valuable
+# first (ties go to the node scored first), and the budget they draw on
+class Frontier:
+    def __init__(self, limits):
+        self.limits = limits
+        self.heap = []
+        self.order = itertools.count()
+        self.leaves = 1
+        self.nodes = 1
+        self.deadline = None if limits.max_seconds is None else time.perf_counter() + limits.max_seconds
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, priority, node):
+        heapq.heappush(self.heap, (-priority, next(self.order), node))
+
+    def pop(self):
+        return heapq.heappop(self.heap)[2]
+
+    def out_of_time(self):
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    # Why splitting a node into `n_children` would break the budget, if it would
+    def over_budget(self, n_children):
+        if self.limits.max_leaf_nodes is not None and self.leaves + n_children - 1 > self.limits.max_leaf_nodes:
+            return "max_leaf_nodes"
+        if self.limits.max_nodes is not None and self.nodes + n_children > self.limits.max_nodes:
+            return "max_nodes"
+        return None
+
+    # Most children a split can make within the budget (None without a limit)
+    def max_children(self):
+        room = []
+        if self.limits.max_leaf_nodes is not None:
+            room.append(self.limits.max_leaf_nodes - self.leaves + 1)
+        if self.limits.max_nodes is not None:
+            room.append(self.limits.max_nodes - self.nodes)
+        return min(room) if room else None
+
+    def split(self, n_children):
+        self.leaves += n_children - 1
+        self.nodes += n_children
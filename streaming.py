@@ -0,0 +1,266 @@
+import pandas as pd, numpy as np
+from infogain import info_gain_from_table
+from gini import gini_from_counts, split_from_table
+from model import encode_column, value_key
+from dataset import bin_bounds, bin_codes
+
+# Out-of-core training from a CSV file that does not fit in memory. The tree
+# is grown breadth first: every level takes one pass over the file in chunks,
+# routing each row to the open ("frontier") node it currently falls in and
+# adding it to that node's level x class count table for every feature.
+# Those tables are all that ID3 information gain and Gini splits need, so
+# memory depends on frontier size x feature cardinality, never on row count.
+# On the same data the trees are identical to ID3 and gini_tree.
+
+def read_chunks(path, columns, chunksize, dtype=None):
+    return pd.read_csv(path, usecols=columns, chunksize=chunksize, dtype=dtype)
+
+# First pass: the sorted vocabulary of every feature and of the target, in
+# the same order EncodedDataset would factorize them. With `n_bins`, numeric
+# features with more distinct values than that are bucketed on global
+# quantiles for Gini splits, the same bins EncodedDataset makes, so their
+# tables stay n_bins rows tall.
+#
+# pandas infers dtypes per chunk, so a column can parse as numbers in some
+# chunks and as text in others, where reading the whole file would give text
+# throughout. Such columns are counted again read as text (one more pass,
+# only when it happens), and `dtype` keeps every later pass reading them so.
+class StreamVocabulary:
+    def __init__(self, path, features, target_attribute, chunksize, n_bins=None):
+        self.features = list(features)
+        self.target_attribute = target_attribute
+        self.dtype = None
+        columns = self.features + [target_attribute]
+        numeric, value_counts, class_values, mixed = self.count(path, chunksize)
+        if mixed:
+            self.dtype = {column: str for column, is_mixed in zip(columns, mixed) if is_mixed}
+            numeric, value_counts, class_values, _ = self.count(path, chunksize)
+
+        self.classes = np.unique(np.concatenate(class_values)) if class_values else np.array([])
+        self.class_index = {value_key(c): i for i, c in enumerate(self.classes)}
+        self.numeric = numeric
+        self.binned = np.zeros(len(self.features), dtype=bool)
+        self.categories = []
+        self.category_index = []
+        for j in range(len(self.features)):
+            values = [value for value, _ in value_counts[j].values()]
+            values = np.array(values) if numeric[j] else np.array(values, dtype=object)
+            order, categories = pd.factorize(values, sort=True, use_na_sentinel=False)
+            counts = np.zeros(len(categories), dtype=np.int64)
+            counts[order] = [count for _, count in value_counts[j].values()]
+            if numeric[j] and n_bins and np.count_nonzero(~np.isnan(categories)) > n_bins:
+                categories = bin_bounds(categories, counts, n_bins)
+                self.binned[j] = True
+            self.categories.append(categories)
+            self.category_index.append({value_key(v): i for i, v in enumerate(categories)})
+
+    # One pass counting every feature value and collecting the class values.
+    # `mixed` flags the columns (features, then the target) that parsed as
+    # numbers in some chunks and as anything else in others.
+    def count(self, path, chunksize):
+        columns = self.features + [self.target_attribute]
+        value_counts = [dict() for _ in self.features]
+        class_values = []
+        numeric = np.ones(len(columns), dtype=bool)
+        has_numbers = np.zeros(len(columns), dtype=bool)
+        for chunk in read_chunks(path, columns, chunksize, self.dtype):
+            for j, column in enumerate(columns):
+                is_numeric = chunk[column].dtype.kind in 'iufc'
+                numeric[j] &= is_numeric
+                has_numbers[j] |= is_numeric and chunk[column].notna().any()
+            for j, feature in enumerate(self.features):
+                for value, count in chunk[feature].value_counts(dropna=False, sort=False).items():
+                    key = value_key(value)
+                    previous = value_counts[j].get(key, (value, 0))
+                    value_counts[j][key] = (previous[0], previous[1] + count)
+            class_values.append(chunk[self.target_attribute].unique())
+        mixed = has_numbers & ~numeric
+        return numeric[:-1], value_counts, class_values, list(mixed) if mixed.any() else None
+
+    # Integer codes (features x rows) and class codes of one chunk
+    def encode(self, chunk):
+        codes = np.empty((len(self.features), len(chunk)), dtype=np.int32)
+        for j, feature in enumerate(self.features):
+            column = chunk[feature].to_numpy()
+            if self.numeric[j]:
+                codes[j] = bin_codes(self.categories[j], column)
+            else:
+                codes[j] = encode_column(column, self.category_index[j])
+        return codes, encode_column(chunk[self.target_attribute].to_numpy(), self.class_index)
+
+# An open node waiting for its counts: where its subtree goes in the result
+# and the state the recursive builders would have passed down to it
+class FrontierNode:
+    def __init__(self, node_id, features, parent_node_class, container, key):
+        self.node_id = node_id
+        self.features = features
+        self.parent_node_class = parent_node_class
+        self.container = container
+        self.key = key
+
+# The partial tree as flat arrays, so chunks can be routed with NumPy: for
+# each node the feature it splits on (-1 if it is a leaf or still open) and
+# the start of its slice of `child_table` (level code -> child node id)
+class PartialTree:
+    def __init__(self):
+        self.feature = [-1]
+        self.offset = [0]
+        self.child_table = []
+
+    def add_node(self):
+        self.feature.append(-1)
+        self.offset.append(0)
+        return len(self.feature) - 1
+
+    def split(self, node_id, j, children_by_level):
+        self.feature[node_id] = j
+        self.offset[node_id] = len(self.child_table)
+        self.child_table.extend(children_by_level)
+
+    # Node every row of a chunk currently falls in
+    def route(self, codes):
+        feature = np.array(self.feature)
+        offset = np.array(self.offset)
+        child_table = np.array(self.child_table, dtype=np.int64)
+        node = np.zeros(codes.shape[1], dtype=np.int64)
+        active = np.arange(codes.shape[1])
+        while len(active):
+            current = node[active]
+            internal = feature[current] >= 0
+            active, current = active[internal], current[internal]
+            if not len(active):
+                break
+            node[active] = child_table[offset[current] + codes[feature[current], active]]
+        return node
+
+# Grow an ID3 ("entropy") or Gini ("gini") tree from a CSV file, reading it
+# `chunksize` rows at a time. Gini options are the same as gini_tree's.
+def stream_tree(path, target_attribute, criterion="entropy", features=None, chunksize=100_000,
+                max_exhaustive_levels=12, beam_width=8, beam_rounds=None, n_bins=None):
+    if features is None:
+        features = [column for column in pd.read_csv(path, nrows=0).columns if column != target_attribute]
+    vocabulary = StreamVocabulary(path, features, target_attribute, chunksize, n_bins if criterion == "gini" else None)
+    if len(vocabulary.classes) == 0:
+        raise ValueError(f"No rows to train on in {path}")
+    classes = vocabulary.classes
+    n_classes = len(classes)
+    sizes = [len(categories) for categories in vocabulary.categories]
+
+    partial = PartialTree()
+    result = {}
+    frontier = [FrontierNode(0, list(features), None, result, "tree")]
+    while frontier:
+        # One pass: accumulate the count tables of every frontier node
+        slot_of_node = {node.node_id: slot for slot, node in enumerate(frontier)}
+        slot_lookup = np.full(len(partial.feature), -1)
+        slot_lookup[list(slot_of_node)] = list(slot_of_node.values())
+        class_tables = np.zeros((len(frontier), n_classes), dtype=np.int64)
+        tables = [np.zeros((len(frontier), size, n_classes), dtype=np.int64) for size in sizes]
+        for chunk in read_chunks(path, list(features) + [target_attribute], chunksize, vocabulary.dtype):
+            codes, y = vocabulary.encode(chunk)
+            slot = slot_lookup[partial.route(codes)]
+            keep = slot >= 0
+            slot, codes, y = slot[keep], codes[:, keep], y[keep]
+            class_tables += np.bincount(slot * n_classes + y, minlength=class_tables.size).reshape(class_tables.shape)
+            for j, size in enumerate(sizes):
+                flat = (slot * size + codes[j]) * n_classes + y
+                tables[j] += np.bincount(flat, minlength=tables[j].size).reshape(tables[j].shape)
+
+        # Decide every frontier node from its counts; impure children form
+        # the next level's frontier
+        next_frontier = []
+        for slot, node in enumerate(frontier):
+            node_tables = [table[slot] for table in tables]
+            grow = grow_entropy if criterion == "entropy" else grow_gini
+            next_frontier += grow(partial, vocabulary, node, class_tables[slot], node_tables,
+                                  max_exhaustive_levels=max_exhaustive_levels, beam_width=beam_width, beam_rounds=beam_rounds)
+        frontier = next_frontier
+    return result.get("tree")
+
+def close(node, label):
+    node.container[node.key] = label
+
+def open_child(partial, features, parent_node_class, container, key):
+    container[key] = None
+    return FrontierNode(partial.add_node(), features, parent_node_class, container, key)
+
+def grow_entropy(partial, vocabulary, node, class_counts, tables, **options):
+    classes = vocabulary.classes
+    present_classes = np.flatnonzero(class_counts)
+    if len(present_classes) <= 1:
+        close(node, classes[present_classes[0]])
+        return []
+    if len(node.features) == 0:
+        close(node, node.parent_node_class)
+        return []
+
+    parent_node_class = classes[np.argmax(class_counts)]
+    feature_tables = [tables[vocabulary.features.index(feature)] for feature in node.features]
+    info_gains = [info_gain_from_table(table[table.sum(axis=1) > 0])[0] for table in feature_tables]
+    best_feature = node.features[np.argmax(info_gains)]
+    features = [f for f in node.features if f != best_feature]
+    tree = {best_feature: {}}
+    close(node, tree)
+
+    j = vocabulary.features.index(best_feature)
+    table = tables[j]
+    children_by_level = [-1] * len(table)
+    opened = []
+    for level in np.flatnonzero(table.sum(axis=1)):
+        value = vocabulary.categories[j][level]
+        child_classes = np.flatnonzero(table[level])
+        if len(child_classes) > 1 and features:
+            child = open_child(partial, features, parent_node_class, tree[best_feature], value)
+            opened.append(child)
+            children_by_level[level] = child.node_id
+        else:
+            tree[best_feature][value] = classes[child_classes[0]] if len(child_classes) == 1 else parent_node_class
+            children_by_level[level] = partial.add_node()
+    partial.split(node.node_id, j, children_by_level)
+    return opened
+
+def grow_gini(partial, vocabulary, node, class_counts, tables, max_exhaustive_levels=12, beam_width=8, beam_rounds=None):
+    classes = vocabulary.classes
+    present_classes = np.flatnonzero(class_counts)
+    if len(present_classes) <= 1:
+        close(node, classes[present_classes[0]])
+        return []
+    if len(node.features) == 0:
+        close(node, node.parent_node_class)
+        return []
+
+    parent_node_class = classes[np.argmax(class_counts)]
+    total_gini = gini_from_counts(class_counts)
+    best_feature, best_split, max_reduction = None, None, 0
+    for feature in node.features:
+        j = vocabulary.features.index(feature)
+        reduction, _, split, _ = split_from_table(feature, vocabulary.categories[j], vocabulary.numeric[j], tables[j], total_gini,
+                                                  max_exhaustive_levels=max_exhaustive_levels, beam_width=beam_width, beam_rounds=beam_rounds,
+                                                  binned=vocabulary.binned[j])
+        if reduction > max_reduction:
+            best_feature, best_split, max_reduction = feature, split, reduction
+    if not best_feature:
+        close(node, parent_node_class)
+        return []
+
+    tree = {best_feature: {}}
+    close(node, tree)
+    j = vocabulary.features.index(best_feature)
+    left_label, right_label, go_left = best_split
+    table = tables[j]
+    children_by_level = [-1] * len(table)
+    opened = []
+    for label, side in ((left_label, go_left), (right_label, ~go_left)):
+        child_counts = table[side].sum(axis=0)
+        child_classes = np.flatnonzero(child_counts)
+        if len(child_classes) > 1:
+            child = open_child(partial, node.features, parent_node_class, tree[best_feature], label)
+            opened.append(child)
+            child_id = child.node_id
+        else:
+            tree[best_feature][label] = classes[child_classes[0]]
+            child_id = partial.add_node()
+        for level in np.flatnonzero(side):
+            children_by_level[level] = child_id
+    partial.split(node.node_id, j, children_by_level)
+    return opened
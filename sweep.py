@@ -0,0 +1,173 @@
+import argparse
+import json
+import time
+import numpy as np, pandas as pd
+from dataset import EncodedDataset
+from infogain import ID3_, ID3_best_first
+from gini import gini_tree_, gini_tree_best_first
+from model import LEAF, compile_tree, encoded_rows, threshold_features
+from parallel import WorkerPool, resolve_n_jobs
+from stopping import NO_LIMITS, Limits
+
+# Cross-validation sweeps: every target x criterion x fold of one CSV file
+# in a single run. The file is read and encoded once, with every column
+# (targets included) factorized into one code matrix; a target's class codes
+# are just its row of that matrix, and its trees use every column that is
+# not a target of the sweep as features. Rows are dealt into `folds` folds
+# at random (from `seed`) and each job trains on all folds but one and
+# scores the one left out.
+#
+# The root of a job's tree needs the class counts and level x class tables
+# of its training rows. They are computed once per target over all rows and
+# each job subtracts the counts of its held-out fold, so only the fold
+# (1/k of the rows) is scanned per job. Jobs are independent; with n_jobs > 1
+# they run on a WorkerPool sharing the code matrix.
+
+# Criteria use the names of forest.py and incremental.py; "id3" is also
+# accepted for "entropy"
+CRITERIA = ["entropy", "gini"]
+CRITERION_ALIASES = {"id3": "entropy"}
+
+def resolve_criterion(criterion):
+    criterion = CRITERION_ALIASES.get(criterion, criterion)
+    if criterion not in CRITERIA:
+        raise ValueError(f"Unknown criterion {criterion!r}; use 'entropy' or 'gini'")
+    return criterion
+
+# The encoded dataset of one target: the shared codes, with the target's
+# codes as classes and `perm` ordering the rows of one job
+def target_view(dataset, target, perm):
+    t = dataset.feature_index[target]
+    return EncodedDataset.from_arrays(dataset.features, target, dataset.categories[t], dataset.categories, dataset.numeric,
+                                      dataset.codes, dataset.codes[t], perm)
+
+# Class histogram and level x class table of every feature over perm[lo:hi]
+def root_counts(view, features, lo, hi):
+    return view.class_counts(lo, hi), {view.feature_index[f]: view.contingency(view.feature_index[f], lo, hi) for f in features}
+
+# Root counts of a job's training rows, perm[:n_train] of `view`: the
+# target's `totals` minus the counts of the held-out rows after them
+def training_counts(view, features, totals, n_train):
+    fold_counts, fold_tables = root_counts(view, features, n_train, len(view.perm))
+    return totals[0] - fold_counts, {j: totals[1][j] - fold_tables[j] for j in fold_tables}
+
+# Fold of every row, the same for every job of a sweep
+def fold_assignment(n_rows, folds, seed):
+    fold_of = np.empty(n_rows, dtype=np.int32)
+    fold_of[np.random.default_rng(seed).permutation(n_rows)] = np.arange(n_rows) % folds
+    return fold_of
+
+# Worker task: train on every fold but `fold` and score that one. The root
+# counts of the training rows are the target's totals minus the fold's.
+def run_job(dataset, target, features, criterion, fold, folds, seed, totals, limits):
+    start = time.perf_counter()
+    fold_of = fold_assignment(dataset.n_rows, folds, seed)
+    held_out = np.flatnonzero(fold_of == fold)
+    train = np.flatnonzero(fold_of != fold)
+    view = target_view(dataset, target, np.concatenate([train, held_out]))
+    class_counts, tables = training_counts(view, features, totals, len(train))
+
+    if criterion == "entropy":
+        if limits.best_first:
+            tree = ID3_best_first(view, 0, len(train), features, limits=limits)
+        else:
+            tree = ID3_(view, 0, len(train), features, class_counts=class_counts, limits=limits, tables=tables)
+    else:
+        if limits.best_first:
+            tree = gini_tree_best_first(view, 0, len(train), features, limits=limits)
+        else:
+            tree = gini_tree_(view, 0, len(train), features, class_counts=class_counts, limits=limits, tables=tables)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    numeric = threshold_features(view, criterion == "gini")
+    model = compile_tree(tree, features=view.features, classes=view.classes, vocabulary=(view.categories, numeric))
+    # Training counts give rows with a value a node never saw its majority class
+    model.fit_encoded_counts(*encoded_rows(view, numeric, train), view.y[train])
+    node, _ = model.route(*encoded_rows(view, numeric, held_out))
+    accuracy = float(np.mean(model.value[node] == view.y[held_out])) if len(held_out) else None
+    score_seconds = time.perf_counter() - start
+    return {"target": target, "criterion": criterion, "fold": fold, "train_rows": len(train), "test_rows": len(held_out),
+            "accuracy": accuracy, "nodes": int(model.n_nodes), "leaves": int(np.sum(model.kind == LEAF)),
+            "depth": int(model.depth.max()), "fit_seconds": fit_seconds, "score_seconds": score_seconds}
+
+# Run every target x criterion x fold job on `data` and return one record per job
+def cross_validate(data, targets, criteria=CRITERIA, folds=5, seed=0, n_jobs=1, limits=None):
+    if folds < 2:
+        raise ValueError("Cross-validation needs at least 2 folds")
+    missing = [target for target in targets if target not in data.columns]
+    if missing:
+        raise ValueError(f"Target columns not found: {', '.join(missing)}")
+    criteria = [resolve_criterion(criterion) for criterion in criteria]
+    limits = NO_LIMITS if limits is None else limits
+    features = [column for column in data.columns if column not in targets]
+    dataset = EncodedDataset(data, list(data.columns), targets[0])
+    everything = np.arange(dataset.n_rows, dtype=np.intp)
+    jobs = []
+    for target in targets:
+        totals = root_counts(target_view(dataset, target, everything), features, 0, dataset.n_rows)
+        for criterion in criteria:
+            for fold in range(folds):
+                jobs.append((target, features, criterion, fold, folds, seed, totals, limits))
+
+    if resolve_n_jobs(n_jobs) > 1 and len(jobs) > 1:
+        with WorkerPool(dataset, n_jobs) as pool:
+            return pool.map(run_job, jobs)
+    return [run_job(dataset, *job) for job in jobs]
+
+def print_results(records):
+    print(f"{'target':>16} {'crit':>7} {'fold':>4} {'train':>8} {'test':>7} {'accuracy':>8} {'nodes':>6} {'depth':>5} {'fit s':>8} {'score s':>8}")
+    groups = {}
+    for record in records:
+        groups.setdefault((record["target"], record["criterion"]), []).append(record)
+    for (target, criterion), group in groups.items():
+        for r in group:
+            accuracy = f"{r['accuracy']:>8.4f}" if r["accuracy"] is not None else f"{'-':>8}"
+            print(f"{target:>16} {criterion:>7} {r['fold']:>4} {r['train_rows']:>8} {r['test_rows']:>7} {accuracy} {r['nodes']:>6} "
+                  f"{r['depth']:>5} {r['fit_seconds']:>8.4f} {r['score_seconds']:>8.4f}")
+        accuracies = [r["accuracy"] for r in group if r["accuracy"] is not None]
+        mean = f"{np.mean(accuracies):>8.4f}" if accuracies else f"{'-':>8}"
+        print(f"{target:>16} {criterion:>7} {'mean':>4} {'':>8} {'':>7} {mean} {np.mean([r['nodes'] for r in group]):>6.0f} "
+              f"{'':>5} {np.mean([r['fit_seconds'] for r in group]):>8.4f} {np.mean([r['score_seconds'] for r in group]):>8.4f}")
+
+# `trees.py sweep INPUT --targets T [T ...] [options]`
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='trees.py sweep',
+                                     description='Cross-validate decision trees for several targets and criteria in one run')
+    parser.add_argument('input', type=str, help='Input CSV file path')
+    parser.add_argument('--targets', nargs='+', required=True, help='Target columns (none of them is used as a feature)')
+    parser.add_argument('--criteria', nargs='+', default=CRITERIA, choices=CRITERIA + list(CRITERION_ALIASES),
+                        help='Builders to run, "entropy" (ID3, also "id3") and/or "gini" (default: both)')
+    parser.add_argument('--folds', type=int, default=5, help='Number of cross-validation folds (default: 5)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the fold assignment')
+    parser.add_argument('--n-jobs', type=int, default=1, help='Worker processes running the jobs (-1 for all cores)')
+    parser.add_argument('--max-depth', type=int, help='Make every node at this depth a leaf (the root has depth 0)')
+    parser.add_argument('--min-samples-leaf', type=int, default=1,
+                        help='Only consider splits leaving at least this many rows in every child (default: 1)')
+    parser.add_argument('--output', type=str, help='Also write the per-fold results as JSON to this file')
+    args = parser.parse_args(argv)
+    if args.folds < 2:
+        parser.error('--folds must be at least 2')
+
+    try:
+        data = pd.read_csv(args.input)
+    except FileNotFoundError:
+        print(f"Error: Could not find input file '{args.input}'")
+        return
+    missing = [target for target in args.targets if target not in data.columns]
+    if missing:
+        print(f"Error: Target variable(s) {', '.join(missing)} not found in dataset")
+        print(f"Available columns: {', '.join(data.columns)}")
+        return
+
+    limits = Limits(max_depth=args.max_depth, min_samples_leaf=args.min_samples_leaf)
+    start = time.perf_counter()
+    records = cross_validate(data, args.targets, args.criteria, args.folds, args.seed, args.n_jobs, limits)
+    print_results(records)
+    print(f"{len(records)} jobs in {time.perf_counter() - start:.2f}s")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(records, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import numpy as np, pandas as pd
+from model import BranchLabel, compile_tree
+
+# Synthetic classification data with a known answer. A random binary tree of
+# depth `depth` is planted over the features (subset splits on categorical
+# features, threshold splits on numeric ones, in the same form gini_tree
+# produces) and every row is labelled by it, then a fraction `noise` of the
+# labels is flipped to another class. With no noise a learner that recovers
+# the planted tree labels every row correctly.
+#
+# Columns are f0, f1, ... and "target". Categorical features take values
+# "v0".."v{cardinality-1}"; numeric ones are uniform on [0, 1) rounded to
+# `decimals` places (which bounds their distinct values, and so the width of
+# ID3 splits on them). The first round(n_features * numeric_fraction)
+# features are numeric.
+def make_dataset(n_rows, n_features=8, cardinality=4, numeric_fraction=0.25, n_classes=2, noise=0.0,
+                 depth=4, decimals=2, seed=0, planted=None):
+    rng = np.random.default_rng(seed)
+    features = [f"f{j}" for j in range(n_features)]
+    n_numeric = int(round(n_features * numeric_fraction))
+    numeric = np.arange(n_features) < n_numeric
+    levels = np.array([f"v{k}" for k in range(cardinality)], dtype=object)
+    classes = np.array([f"c{k}" for k in range(n_classes)], dtype=object)
+
+    columns = {}
+    for j, feature in enumerate(features):
+        if numeric[j]:
+            columns[feature] = rng.random(n_rows).round(decimals)
+        else:
+            columns[feature] = levels[rng.integers(cardinality, size=n_rows)]
+    df = pd.DataFrame(columns)
+
+    if planted is None:
+        planted = plant_tree(rng, features, numeric, levels, n_classes, depth, classes)
+    model = compile_tree(planted, features=features, classes=classes)
+    y = model.value[model.route(*model.encode(df))[0]]
+    flip = rng.random(n_rows) < noise
+    if n_classes > 1:
+        y[flip] = (y[flip] + rng.integers(1, n_classes, size=flip.sum())) % n_classes
+    df["target"] = classes[y]
+    return df, planted
+
+# Random tree whose two children always end up with different classes at the
+# bottom level. Splits only use the levels and the range of values that can
+# still reach the node, so every planted split matters.
+def plant_tree(rng, features, numeric, levels, n_classes, depth, classes, label=0, reachable=None):
+    if reachable is None:
+        reachable = {feature: (0.0, 1.0) if numeric[j] else levels for j, feature in enumerate(features)}
+    candidates = [j for j, feature in enumerate(features) if numeric[j] or len(reachable[feature]) > 1]
+    if depth == 0 or not candidates:
+        return classes[label]
+    j = int(rng.choice(candidates))
+    feature = features[j]
+    if numeric[j]:
+        lo, hi = reachable[feature]
+        threshold = round(float(rng.uniform(lo + 0.2 * (hi - lo), hi - 0.2 * (hi - lo))), 3)
+        left = BranchLabel(f"{feature} <= {threshold}", feature, "<=", threshold)
+        right = BranchLabel(f"{feature} > {threshold}", feature, ">", threshold)
+        left_reach, right_reach = (lo, threshold), (threshold, hi)
+    else:
+        values = reachable[feature]
+        order = rng.permutation(len(values))
+        k = int(rng.integers(1, len(values)))
+        left_reach, right_reach = values[np.sort(order[:k])], values[np.sort(order[k:])]
+        left = BranchLabel(f"{feature} in {set(left_reach)}", feature, "in", frozenset(left_reach))
+        right = BranchLabel(f"{feature} in {set(right_reach)}", feature, "in", frozenset(right_reach))
+    other = (label + int(rng.integers(1, n_classes))) % n_classes if n_classes > 1 else label
+    return {feature: {left: plant_tree(rng, features, numeric, levels, n_classes, depth - 1, classes, label,
+                                       {**reachable, feature: left_reach}),
+                      right: plant_tree(rng, features, numeric, levels, n_classes, depth - 1, classes, other,
+                                        {**reachable, feature: right_reach})}}
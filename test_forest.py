@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+from forest import random_forest
+
+# A forest depends only on its seed, its out-of-bag votes come only from the
+# trees that did not draw a row, and its predictions agree with its votes
+
+N_TREES = 8
+CRITERIA = ["entropy", "gini"]
+
+def forest_frame(n_rows=400, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "A": rng.choice(list("abcd"), n_rows),
+        "B": rng.choice(list("xyz"), n_rows),
+        "N": rng.integers(0, 10, n_rows).astype(float),
+        "Z": rng.normal(size=n_rows).round(2),
+    })
+    df.loc[rng.random(n_rows) < 0.05, "N"] = np.nan
+    df["T"] = np.where((df["A"] < "c") ^ (df["Z"] > 0) ^ (rng.random(n_rows) < 0.15), "p",
+                       np.where(df["N"] > 4, "q", "r"))
+    return df, ["A", "B", "N", "Z"]
+
+# The bootstrap sample of every tree, drawn as random_forest draws it
+def bootstrap_samples(seed, n_rows):
+    return [np.random.default_rng(int(tree_seed)).integers(0, n_rows, n_rows)
+            for tree_seed in np.random.SeedSequence(seed).generate_state(N_TREES)]
+
+@pytest.mark.parametrize("criterion", CRITERIA)
+def test_same_forest_for_any_n_jobs(criterion):
+    df, features = forest_frame()
+    serial = random_forest(df, features, "T", N_TREES, criterion, seed=3, n_jobs=1)
+    parallel = random_forest(df, features, "T", N_TREES, criterion, seed=3, n_jobs=2)
+    assert [repr(tree) for tree in parallel.trees] == [repr(tree) for tree in serial.trees]
+    assert parallel.oob_error == serial.oob_error
+    assert (parallel.oob_votes == serial.oob_votes).all()
+
+@pytest.mark.parametrize("criterion", CRITERIA)
+def test_oob_votes_come_from_trees_that_left_the_row_out(criterion):
+    df, features = forest_frame()
+    forest = random_forest(df, features, "T", N_TREES, criterion, seed=3)
+    expected = np.zeros((len(df), len(forest.classes)), dtype=np.int64)
+    for model, sample in zip(forest.models, bootstrap_samples(3, len(df))):
+        out_of_bag = np.setdiff1d(np.arange(len(df)), sample)
+        predicted = np.searchsorted(forest.classes, model.predict(df.iloc[out_of_bag]))
+        np.add.at(expected, (out_of_bag, predicted), 1)
+    assert (forest.oob_votes == expected).all()
+    voted = expected.sum(axis=1) > 0
+    truth = np.searchsorted(forest.classes, df["T"].to_numpy())
+    assert forest.oob_error == pytest.approx(np.mean(np.argmax(expected[voted], axis=1) != truth[voted]))
+
+@pytest.mark.parametrize("criterion", CRITERIA)
+def test_predictions_agree_with_votes(criterion):
+    df, features = forest_frame()
+    forest = random_forest(df, features, "T", N_TREES, criterion, seed=3)
+    X = forest_frame(seed=1)[0]
+    votes = forest.votes(X)
+    assert (votes.sum(axis=1) == N_TREES).all()
+    for model in forest.models:
+        votes[np.arange(len(X)), np.searchsorted(forest.classes, model.predict(X))] -= 1
+    assert (votes == 0).all()
+    assert (forest.predict(X) == forest.classes[np.argmax(forest.votes(X), axis=1)]).all()
+    proba = forest.predict_proba(X)
+    assert proba.shape == (len(X), len(forest.classes))
+    assert np.allclose(proba.sum(axis=1), 1)
@@ -0,0 +1,88 @@
+from itertools import combinations
+import numpy as np
+import pandas as pd
+import pytest
+from gini import gini_tree, categorical_partitions, ordered_partitions, weighted_gini_of_partitions
+from dataset import EncodedDataset
+from model import compile_tree, NUMERIC
+from tracing import NULL_TRACER
+
+# Binning with `n_bins` happens once, when the data is encoded: a numeric
+# column with at most n_bins distinct values is left exact, and a column
+# with more is split only on the bounds of its bins.
+
+N_BINS = 8
+
+def numeric_frame(n_distinct, n_rows=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, n_distinct, n_rows) / 4
+    df = pd.DataFrame({"x": x, "z": rng.normal(size=n_rows).round(1), "c": rng.choice(list("abc"), n_rows)})
+    df.loc[rng.random(n_rows) < 0.05, "x"] = np.nan
+    df["T"] = np.where((df["x"] > n_distinct / 8) ^ (df["c"] == "a") ^ (rng.random(n_rows) < 0.1), "p", "q")
+    return df
+
+@pytest.mark.parametrize("seed", range(3))
+def test_few_values_are_not_binned(seed):
+    df = numeric_frame(N_BINS, seed=seed)
+    features = ["x", "c"]
+    assert not EncodedDataset(df, features, "T", n_bins=N_BINS).binned.any()
+    exact = gini_tree(df, df, features, "T", tracer=NULL_TRACER)
+    binned = gini_tree(df, df, features, "T", tracer=NULL_TRACER, n_bins=N_BINS)
+    assert repr(binned) == repr(exact)
+
+def test_many_values_split_on_bin_bounds():
+    df = numeric_frame(200)
+    features = ["x", "z", "c"]
+    dataset = EncodedDataset(df, features, "T", n_bins=N_BINS)
+    assert list(dataset.binned) == [True, True, False]
+    for j in (0, 1):
+        assert len(dataset.categories[j]) <= N_BINS + 1
+    tree = gini_tree(df, df, features, "T", tracer=NULL_TRACER, n_bins=N_BINS)
+    model = compile_tree(tree, features=features)
+    for node in np.flatnonzero(model.kind == NUMERIC):
+        assert model.threshold[node] in dataset.categories[model.feature[node]]
+
+# Categorical splits: up to max_exhaustive_levels levels the search is
+# exhaustive, and for two classes the Breiman ordering (levels sorted by the
+# proportion of one class) is exact at any size. For more classes the beam
+# search is a heuristic that can miss the optimum, so it is only required to
+# do at least as well as the class-proportion orderings it starts from.
+
+def random_table(seed, n_levels, n_classes):
+    rng = np.random.default_rng(seed)
+    table = rng.integers(0, 30, (n_levels, n_classes)) * (rng.random((n_levels, n_classes)) < 0.8)
+    table[table.sum(axis=1) == 0, 0] = 1
+    return table
+
+def gini(counts):
+    return 1 - np.sum((counts / counts.sum()) ** 2)
+
+# Lowest weighted Gini over every subset of levels sent left
+def brute_force(table):
+    n, best = table.sum(), np.inf
+    for size in range(1, len(table)):
+        for subset in combinations(range(len(table)), size):
+            left = table[list(subset)].sum(axis=0)
+            right = table.sum(axis=0) - left
+            best = min(best, left.sum() / n * gini(left) + right.sum() / n * gini(right))
+    return best
+
+@pytest.mark.parametrize("seed", range(20))
+def test_exhaustive_search_matches_brute_force(seed):
+    table = random_table(seed, 2 + seed % 7, 2 + seed % 3)
+    _, scores, _ = categorical_partitions(table, max_exhaustive_levels=12)
+    assert scores.min() == pytest.approx(brute_force(table))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_two_class_ordering_matches_brute_force(seed):
+    table = random_table(seed, 6 + seed % 6, 2)
+    _, scores, _ = categorical_partitions(table, max_exhaustive_levels=2)
+    assert scores.min() == pytest.approx(brute_force(table))
+
+@pytest.mark.parametrize("seed", range(20))
+def test_beam_is_no_worse_than_class_orderings(seed):
+    table = random_table(seed, 14 + seed % 10, 3 + seed % 3)
+    _, scores, _ = categorical_partitions(table, max_exhaustive_levels=12)
+    proportions = table / table.sum(axis=1, keepdims=True)
+    orderings = [ordered_partitions(np.argsort(proportions[:, c], kind="stable")) for c in range(table.shape[1])]
+    assert scores.min() <= min(weighted_gini_of_partitions(table, masks).min() for masks in orderings) + 1e-12
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+from synthetic import make_dataset
+from infogain import ID3
+from gini import gini_tree
+from incremental import IncrementalTree
+from stopping import Limits
+from tracing import NULL_TRACER
+
+# After every update an IncrementalTree must be exactly the tree the usual
+# builder makes from all the rows seen so far, including rows with missing
+# values, categories and classes that only show up in later batches, and an
+# integer column that later turns into floats.
+
+BUILDERS = {"entropy": ID3, "gini": gini_tree}
+
+def batches(seed):
+    rng = np.random.default_rng(100 + seed)
+    df, _ = make_dataset(800, n_features=5, cardinality=4, numeric_fraction=0.4, n_classes=3, noise=0.2, seed=seed, depth=4,
+                         decimals=1)
+    features = [column for column in df.columns if column != "target"]
+    numeric = [column for column in features if df[column].dtype.kind == "f"]
+    categorical = [column for column in features if column not in numeric]
+    df.loc[rng.random(len(df)) < 0.05, numeric[0]] = np.nan
+    late = np.arange(len(df)) > 500
+    df.loc[late & (rng.random(len(df)) < 0.2), categorical[0]] = "late"
+    df.loc[late & (rng.random(len(df)) < 0.1), "target"] = "c9"
+    df["k"] = rng.integers(0, 4, len(df))
+    frames = [df.iloc[rows].copy() for rows in np.split(np.arange(len(df)), [100, 300, 500, 600, 700])]
+    frames[-1]["k"] = frames[-1]["k"] + 0.5
+    return frames, features + ["k"]
+
+@pytest.mark.parametrize("criterion, options", [("entropy", {}), ("gini", {}), ("gini", {"n_bins": 4})])
+@pytest.mark.parametrize("limits", [None, Limits(max_depth=3, min_samples_leaf=3)], ids=["no_limits", "limits"])
+@pytest.mark.parametrize("seed", range(3))
+def test_updates_match_full_retrain(criterion, options, limits, seed):
+    frames, features = batches(seed)
+    model = IncrementalTree(frames[0], features, "target", criterion=criterion, limits=limits, **options)
+    for k in range(1, len(frames) + 1):
+        if k > 1:
+            model.update(frames[k - 1])
+        seen = pd.concat(frames[:k])
+        expected = BUILDERS[criterion](seen, seen, features, "target", tracer=NULL_TRACER, limits=limits, **options)
+        assert repr(model.tree) == repr(expected)
+
+@pytest.mark.parametrize("limits", [Limits(max_leaf_nodes=10), Limits(min_impurity_decrease=0.01), Limits(max_features=2)])
+def test_whole_tree_limits_are_refused(limits):
+    frames, features = batches(0)
+    with pytest.raises(ValueError):
+        IncrementalTree(frames[0], features, "target", limits=limits)
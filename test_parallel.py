@@ -0,0 +1,46 @@
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from infogain import ID3
+from gini import gini_tree
+from stopping import Limits
+from tracing import ConsoleTracer, JsonlTracer
+
+# With n_jobs > 1 large nodes are split in the main process with their
+# features scored by the pool and small subtrees are built whole by workers,
+# which replay their trace into the main tracer. The tree and the trace must
+# be exactly those of a serial build. `parallel_min_rows` is lowered so both
+# paths run on a small dataset.
+PARALLEL_MIN_ROWS = 200
+
+def noisy_frame(n_rows=1500, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "A": rng.choice(list("abcdef"), n_rows),
+        "B": rng.choice(list("xyz"), n_rows),
+        "N": rng.integers(0, 12, n_rows),
+        "Z": rng.normal(size=n_rows).round(1),
+    })
+    df["T"] = np.where((df["A"] < "d") ^ (df["N"] > 5) ^ (rng.random(n_rows) < 0.2), "p",
+                       np.where(df["B"] == "x", "q", "r"))
+    return df, ["A", "B", "N", "Z"]
+
+def build(builder, df, features, n_jobs, limits, tracer_class):
+    out = io.StringIO()
+    tree = builder(df, df, features, "T", tracer=tracer_class(out), n_jobs=n_jobs, limits=limits,
+                   parallel_min_rows=PARALLEL_MIN_ROWS)
+    return repr(tree), out.getvalue()
+
+@pytest.mark.parametrize("builder", [ID3, gini_tree])
+@pytest.mark.parametrize("limits", [None, Limits(max_depth=4, min_samples_leaf=3), Limits(max_leaf_nodes=30),
+                                    Limits(max_features=2, seed=1)],
+                         ids=["unlimited", "depth", "best-first", "max-features"])
+@pytest.mark.parametrize("tracer_class", [ConsoleTracer, JsonlTracer], ids=["console", "jsonl"])
+def test_parallel_matches_serial(builder, limits, tracer_class):
+    df, features = noisy_frame()
+    serial_tree, serial_trace = build(builder, df, features, 1, limits, tracer_class)
+    parallel_tree, parallel_trace = build(builder, df, features, 2, limits, tracer_class)
+    assert parallel_tree == serial_tree
+    assert parallel_trace == serial_trace
+    assert serial_trace
@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+import predict
+from infogain import ID3
+from model import compile_tree, save_model
+from tracing import NULL_TRACER
+
+# The prediction CLI reports bad input as a usage error, not a traceback
+
+def saved_model(tmp_path, with_counts=True):
+    df = pd.DataFrame({"A": list("abababab"), "N": [1, 1, 2, 2, 3, 3, 4, 4], "T": list("pqpqqpqp")})
+    tree = ID3(df, df, ["A", "N"], "T", tracer=NULL_TRACER)
+    if with_counts:
+        model = compile_tree(tree, features=["A", "N"], data=df, target_attribute="T")
+    else:
+        model = compile_tree(tree, features=["A", "N"], classes=["p", "q"])
+    path = tmp_path / "model.dt"
+    save_model(model, path, metadata={"target": "T"})
+    return str(path)
+
+def write_input(tmp_path, text):
+    path = tmp_path / "input.csv"
+    path.write_text(text)
+    return str(path)
+
+def test_predicts(tmp_path, capsys):
+    predict.main([saved_model(tmp_path), write_input(tmp_path, "A,N\na,1\nb,4\n"), "--proba"])
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "T,P(p),P(q)"
+    assert len(lines) == 3
+
+@pytest.mark.parametrize("with_counts, text, options, message", [
+    (False, "A,N\na,1\n", ["--proba"], "no class counts"),
+    (True, "A,N\nz,1\n", ["--unseen", "error"], "never seen during training"),
+    (True, "A,N\na,1\nb,four\n", [], "row 2 has 'four'"),
+    (True, "A\na\n", [], "missing feature columns: N"),
+])
+def test_bad_input_is_a_usage_error(tmp_path, capsys, with_counts, text, options, message):
+    with pytest.raises(SystemExit) as exit_info:
+        predict.main([saved_model(tmp_path, with_counts), write_input(tmp_path, text)] + options)
+    assert exit_info.value.code == 2
+    err = capsys.readouterr().err
+    assert message in err
+    assert "Traceback" not in err
@@ -0,0 +1,58 @@
+import io
+import re
+import numpy as np
+import pandas as pd
+import pytest
+from gini import gini_tree
+from model import compile_tree
+from render import write_dot
+from tracing import NULL_TRACER
+
+# Truncated DOT output: every node of the tree is either drawn or counted in
+# exactly one "… N more nodes" box, and every edge joins two nodes that exist
+
+def noisy_tree():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"A": rng.choice(list("abcd"), 300), "N": rng.integers(0, 20, 300)})
+    df["T"] = np.where((df["N"] > 9) ^ (df["A"] == "a") ^ (rng.random(300) < 0.2), "p", "q")
+    tree = gini_tree(df, df, ["A", "N"], "T", tracer=NULL_TRACER)
+    return tree, compile_tree(tree, features=["A", "N"], data=df, target_attribute="T")
+
+def parse_dot(text):
+    nodes, boxes, edges = {}, {}, []
+    for line in text.splitlines():
+        edge = re.match(r'\t"([^"]*)" -> "([^"]*)"', line)
+        node = re.match(r'\t"([^"]*)" \[label="([^"]*)"(.*)\]', line)
+        if edge:
+            edges.append(edge.groups())
+        elif node and "dashed" in node.group(3):
+            boxes[node.group(1)] = int(re.match(r"… (\d+) more node", node.group(2)).group(1))
+        elif node:
+            nodes[node.group(1)] = node.group(2)
+    return nodes, boxes, edges
+
+@pytest.mark.parametrize("max_nodes", [0, 1, 2, 5, 20, 10_000])
+def test_max_nodes_truncation(max_nodes):
+    tree, model = noisy_tree()
+    out = io.StringIO()
+    write_dot(tree, ["p", "q"], out, max_nodes=max_nodes, model=model)
+    nodes, boxes, edges = parse_dot(out.getvalue())
+    assert len(nodes) + sum(boxes.values()) == model.n_nodes
+    assert all(n > 1 for n in boxes.values())
+    assert set(a for a, _ in edges) <= set(nodes)
+    assert set(b for _, b in edges) == (set(nodes) | set(boxes)) - {"0", "s0"}
+    internal = [i for i, label in nodes.items() if label in ("A", "N")]
+    assert len(internal) <= max_nodes
+    if boxes:
+        assert len(nodes) >= max_nodes
+    if max_nodes == 0:
+        assert nodes == {} and list(boxes) == ["s0"] and edges == []
+
+def test_single_leaf_is_drawn_as_leaf():
+    tree = {"A": {"a": "p", "b": {"N": {"N <= 1": "q", "N > 1": "p"}}}}
+    out = io.StringIO()
+    write_dot(tree, ["p", "q"], out, max_nodes=1)
+    nodes, boxes, edges = parse_dot(out.getvalue())
+    assert nodes == {"0": "A", "1": "p"}
+    assert boxes == {"s2": 3}
+    assert sorted(edges) == [("0", "1"), ("0", "s2")]
@@ -0,0 +1,51 @@
+import sqlite3
+import numpy as np
+import pytest
+from synthetic import make_dataset
+from infogain import ID3
+from gini import gini_tree
+from tracing import NULL_TRACER
+from model import compile_tree
+from rules import compile_numpy, sql_query
+
+# The NumPy and SQL forms of a tree must predict exactly what its FlatTree
+# does, on the training rows and on fresh rows with missing values and
+# categories the tree never saw.
+
+BUILDERS = {"entropy": ID3, "gini": gini_tree}
+
+# Fresh rows from the planted tree of `seed`, with some values missing and
+# some categories replaced by an unseen one
+def scoring_rows(planted, seed, n_classes):
+    X, _ = make_dataset(1000, n_classes=n_classes, numeric_fraction=0.4, depth=5, seed=seed + 100, planted=planted)
+    rng = np.random.default_rng(seed)
+    X = X.drop(columns="target").astype(object)
+    for column in X.columns:
+        X.loc[rng.random(len(X)) < 0.05, column] = np.nan
+        if isinstance(X[column].dropna().iloc[0], str):
+            X.loc[rng.random(len(X)) < 0.03, column] = "unseen"
+        else:
+            X[column] = X[column].astype(float)
+    return X
+
+def sql_predictions(model, X):
+    database = sqlite3.connect(":memory:")
+    try:
+        X.to_sql("rows", database, index=False)
+        return np.array([row[-1] for row in database.execute(sql_query(model, "rows"))], dtype=object)
+    finally:
+        database.close()
+
+@pytest.mark.parametrize("criterion", BUILDERS)
+@pytest.mark.parametrize("seed", range(3))
+def test_numpy_and_sql_agree_with_tree(criterion, seed):
+    n_classes = 2 + seed
+    df, planted = make_dataset(1500, n_classes=n_classes, noise=0.2, numeric_fraction=0.4, depth=5, seed=seed)
+    features = [column for column in df.columns if column != "target"]
+    tree = BUILDERS[criterion](df, df, features, "target", tracer=NULL_TRACER)
+    model = compile_tree(tree, features=features, data=df, target_attribute="target")
+    score = compile_numpy(model)
+    for X in (df.drop(columns="target"), scoring_rows(planted, seed, n_classes)):
+        expected = model.predict(X)
+        assert (score(X) == expected).all()
+        assert (sql_predictions(model, X) == expected).all()
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+from infogain import ID3
+from gini import gini_tree
+from stopping import Limits
+from tracing import NULL_TRACER
+from model import LEAF, compile_tree
+
+# Budgeted (best-first) growth must spend the budget on splits that fit it:
+# when the best split has too many children for what is left, a smaller
+# split is used instead of giving up on the node.
+
+# The best root feature is a numeric column with 100 distinct values, which
+# ID3 splits into 100 children; the 4-level categorical columns fit small
+# budgets
+def wide_best_split(n_rows=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    number = rng.integers(0, 100, n_rows)
+    df = pd.DataFrame({"N": number, "A": rng.choice(list("abcd"), n_rows), "B": rng.choice(list("wxyz"), n_rows)})
+    df["T"] = np.where((number < 50) ^ (df["A"] == "a"), "p", "q")
+    return df, ["N", "A", "B"]
+
+def tree_size(tree, features):
+    model = compile_tree(tree, features=features)
+    return int(np.sum(model.kind == LEAF)), int(model.n_nodes)
+
+@pytest.mark.parametrize("builder", [ID3, gini_tree])
+@pytest.mark.parametrize("max_leaf_nodes", [5, 20, 200])
+def test_leaf_budget_is_used_when_a_split_fits(builder, max_leaf_nodes):
+    df, features = wide_best_split()
+    tree = builder(df, df, features, "T", tracer=NULL_TRACER, limits=Limits(max_leaf_nodes=max_leaf_nodes))
+    leaves, _ = tree_size(tree, features)
+    assert 1 < leaves <= max_leaf_nodes
+
+@pytest.mark.parametrize("builder", [ID3, gini_tree])
+@pytest.mark.parametrize("max_nodes", [5, 20, 200])
+def test_node_budget_is_used_when_a_split_fits(builder, max_nodes):
+    df, features = wide_best_split()
+    tree = builder(df, df, features, "T", tracer=NULL_TRACER, limits=Limits(max_nodes=max_nodes))
+    leaves, nodes = tree_size(tree, features)
+    assert leaves > 1 and nodes <= max_nodes
+
+# With room for only two leaves no ID3 split fits (every feature has at
+# least four levels), so the root stays a leaf
+def test_no_split_fits():
+    df, features = wide_best_split()
+    tree = ID3(df, df, features, "T", tracer=NULL_TRACER, limits=Limits(max_leaf_nodes=2))
+    assert tree_size(tree, features) == (1, 1)
+
+# Tracing a build whose nodes are chosen again does not change the tree
+def test_traced_tree_matches_silent_tree(capsys):
+    df, features = wide_best_split()
+    limits = Limits(max_leaf_nodes=20)
+    assert ID3(df, df, features, "T", limits=limits) == ID3(df, df, features, "T", tracer=NULL_TRACER, limits=limits)
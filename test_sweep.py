@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from synthetic import make_dataset
+from infogain import ID3
+from gini import gini_tree
+from dataset import EncodedDataset
+from model import LEAF, compile_tree
+from stopping import Limits
+from tracing import NULL_TRACER
+import sweep
+
+# A sweep job's root counts are the target's totals minus its held-out fold,
+# so its tree and score must be exactly those of training on the fold's
+# training rows directly.
+
+BUILDERS = {"entropy": ID3, "gini": gini_tree}
+TARGETS = ["target", "t2"]
+FOLDS = 4
+SEED = 3
+
+def sweep_data():
+    df, _ = make_dataset(1200, n_features=6, cardinality=4, numeric_fraction=0.3, n_classes=3, noise=0.1, seed=2, depth=4,
+                         decimals=1)
+    rng = np.random.default_rng(2)
+    df.loc[rng.random(len(df)) < 0.05, "f0"] = np.nan
+    df["t2"] = np.where((df["f2"] == "v1") | (df["f1"] > 0.5), "a", "b")
+    return df
+
+def without_timings(records):
+    return [{key: value for key, value in record.items() if not key.endswith("_seconds")} for record in records]
+
+@pytest.mark.parametrize("limits", [None, Limits(max_depth=3, min_samples_leaf=5)], ids=["no_limits", "limits"])
+def test_jobs_match_training_on_each_fold(limits):
+    df = sweep_data()
+    features = [column for column in df.columns if column not in TARGETS]
+    fold_of = sweep.fold_assignment(len(df), FOLDS, SEED)
+    records = sweep.cross_validate(df, TARGETS, folds=FOLDS, seed=SEED, limits=limits)
+    assert len(records) == len(TARGETS) * len(BUILDERS) * FOLDS
+    for record in records:
+        train, test = df[fold_of != record["fold"]], df[fold_of == record["fold"]]
+        tree = BUILDERS[record["criterion"]](train, train, features, record["target"], tracer=NULL_TRACER, limits=limits)
+        model = compile_tree(tree, features=features, data=train, target_attribute=record["target"])
+        assert record["train_rows"] == len(train) and record["test_rows"] == len(test)
+        assert record["nodes"] == model.n_nodes
+        assert record["leaves"] == np.sum(model.kind == LEAF)
+        assert record["depth"] == model.depth.max()
+        assert record["accuracy"] == np.mean(model.predict(test) == test[record["target"]].to_numpy())
+
+def test_root_counts_of_training_rows():
+    df = sweep_data()
+    features = [column for column in df.columns if column not in TARGETS]
+    dataset = EncodedDataset(df, list(df.columns), TARGETS[0])
+    fold_of = sweep.fold_assignment(len(df), FOLDS, SEED)
+    for target in TARGETS:
+        totals = sweep.root_counts(sweep.target_view(dataset, target, np.arange(len(df))), features, 0, len(df))
+        for fold in range(FOLDS):
+            train, held_out = np.flatnonzero(fold_of != fold), np.flatnonzero(fold_of == fold)
+            view = sweep.target_view(dataset, target, np.concatenate([train, held_out]))
+            class_counts, tables = sweep.training_counts(view, features, totals, len(train))
+            expected_counts, expected_tables = sweep.root_counts(view, features, 0, len(train))
+            assert (class_counts == expected_counts).all()
+            assert tables.keys() == expected_tables.keys()
+            for j, table in expected_tables.items():
+                assert (tables[j] == table).all()
+
+def test_parallel_matches_serial():
+    df = sweep_data()
+    serial = sweep.cross_validate(df, TARGETS, folds=FOLDS, seed=SEED)
+    parallel = sweep.cross_validate(df, TARGETS, folds=FOLDS, seed=SEED, n_jobs=2)
+    assert without_timings(parallel) == without_timings(serial)
+
+def test_criterion_names():
+    df = sweep_data()
+    records = sweep.cross_validate(df, ["target"], criteria=["id3", "entropy", "gini"], folds=2, seed=SEED)
+    assert [record["criterion"] for record in records] == ["entropy"] * 4 + ["gini"] * 2
+    assert without_timings(records[:2]) == without_timings(records[2:4])
+    with pytest.raises(ValueError, match="Unknown criterion 'cart'"):
+        sweep.cross_validate(df, ["target"], criteria=["cart"], folds=2)
@@ -0,0 +1,239 @@
+import json
+import sys
+import numpy as np
+
+# Tree builders report what they are doing as structured events sent to a
+# tracer instead of printing directly. Every event carries the criterion
+# ("entropy" for ID3, "gini" for the Gini tree), the node depth and, for
+# binary trees, the branch path ("0" = left, "1" = right) from the root:
+#
+#   node_entered     a node is about to be split (class histogram, impurity)
+#   candidate_scored one candidate split was evaluated
+#   split_chosen     the best split of a node was selected
+#   branch_entered   a child branch of a split node is being built
+#   leaf_created     a leaf was emitted, with the reason why (leaves cut short
+#                    by a stopping limit also carry their class counts)
+#   finished         the whole tree is done
+#
+# Builders only build event payloads when `tracer.enabled` is true, so the
+# NullTracer costs nothing beyond an attribute check. The other optional
+# hooks threaded through the builders (profiling.Profiler, stopping.Limits)
+# follow the same `enabled` convention.
+class Tracer:
+    enabled = True
+
+    def emit(self, event, **fields):
+        raise NotImplementedError
+
+class NullTracer(Tracer):
+    enabled = False
+
+    def emit(self, event, **fields):
+        pass
+
+NULL_TRACER = NullTracer()
+
+# One JSON object per event, one event per line
+class JsonlTracer(Tracer):
+    def __init__(self, file):
+        self.file = file
+
+    def emit(self, event, **fields):
+        self.file.write(json.dumps({"event": event, **fields}, default=to_json) + "\n")
+
+def to_json(value):
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+# "(No: 3, Yes: 5)" from the classes and counts of a leaf cut short by a limit
+def class_distribution(fields):
+    return "(" + ", ".join(f"{c}: {n}" for c, n in zip(fields["classes"], fields["counts"])) + ")"
+
+def generate_indent_tree_blocks(depth, right):
+    return "".join(["│  " if not int(right[i]) else "   " for i in range(depth)])
+
+# Box-drawing explanation of the tree as it is built, one line per step
+class ConsoleTracer(Tracer):
+    def __init__(self, file=None):
+        self.file = file
+
+    def print(self, text=""):
+        print(text, file=self.file)
+
+    def emit(self, event, **fields):
+        getattr(self, f"{fields['criterion']}_{event}")(**fields)
+
+    # -- ID3 (information gain) -------------------------------------------
+
+    def entropy_indent(self, depth):
+        tree_block = "│" if depth > 0 else " "
+        return f"{tree_block}  " * depth
+
+    def entropy_node_entered(self, depth, classes, counts, **fields):
+        indent = self.entropy_indent(depth)
+        present = np.asarray(counts) > 0
+        elements, counts = np.asarray(classes)[present], np.asarray(counts)[present]
+        total_elements = np.sum(counts)
+        entropy_components = [(-counts[i]/total_elements) * np.log2(counts[i]/total_elements) for i in range(len(elements))]
+        parent_entropy = np.sum(entropy_components)
+        block = "├" if depth > 0 else "┌"
+        self.print(f"{indent}{block}──┬─ Parent class entropy: {parent_entropy:.3f}")
+        self.print_entropy_details(elements, counts, entropy_components, depth)
+        self.print(f"{indent}│")
+        self.print(f"{indent}├──┬─ Calculating entropy for features:")
+
+    # Helper function to print entropy calculation details
+    def print_entropy_details(self, elements, counts, entropy_components, depth=0):
+        indent = self.entropy_indent(depth)
+        total_elements = np.sum(counts)
+        details = []
+        for i in range(len(elements)):
+            details.append(f"-{counts[i]}/{total_elements} log2({counts[i]}/{total_elements})")
+        joined_details = " + ".join(details)
+        entropy_values = " + ".join([f"{component:.3f}" for component in entropy_components])
+        total_entropy = np.sum(entropy_components)
+        self.print(f"{indent}│  └─── {joined_details} = {entropy_values} = {total_entropy:.3f}")
+
+    # Information gain details showing the math for the specific attribute
+    # (not the net result)
+    def entropy_candidate_scored(self, depth, feature, index, total, proportions, level_entropies, weighted_impurity, **fields):
+        indent = self.entropy_indent(depth)
+        details = [f"{proportion:.3f} * {entropy_val:.3f}" for proportion, entropy_val in zip(proportions, level_entropies)]
+        joined_details = " + ".join(details)
+        block = "├" if index < total - 1 else "└"
+        self.print(f"{indent}│  {block}─── {feature:16}: {joined_details} = {weighted_impurity:.3f}")
+
+    def entropy_split_chosen(self, depth, feature, impurity, gains, **fields):
+        indent = self.entropy_indent(depth)
+        count_features = len(gains)
+        if count_features == 1:
+            return
+        self.print(f"{indent}├──┬─ Calculating Information Gain for:")
+        for e, (candidate, gain) in enumerate(gains.items()):
+            block = "└────" if e == count_features - 1 else "├────"
+            line = f"{indent}│  {block} {candidate:<15}: {impurity:.3f}-{impurity-gain:.3f}= {gain:.3f}"
+            self.print(line + " <- best feature" if candidate == feature else line)
+
+    def entropy_branch_entered(self, depth, feature, branch, last, pure, **fields):
+        indent = self.entropy_indent(depth)
+        if pure:
+            block = "└" if last else "├"
+            self.print(f"{indent}{block}──┬─ Creating subtree for {feature}='{branch}'")
+        else:
+            self.print(f"{indent}│")
+            self.print(f"{indent}├──┬─ Creating subtree for {feature}='{branch}'")
+
+    def entropy_leaf_created(self, depth, target, label, reason, last=False, **fields):
+        if reason == "pure_branch":
+            indent = self.entropy_indent(depth - 1)
+            done_block = " " if last else "│"
+            self.print(f"{indent}{done_block}  └──── Done! Only one possible value remains for '{target}': '{label}'")
+            return
+        indent = self.entropy_indent(depth)
+        if reason == "pure":
+            self.print(f"{indent}└─── Done! Only one '{target}' remains: '{label}'")
+        elif reason == "empty":
+            self.print(f"{indent}└─── Dataset is empty, returning mode value: {label}")
+        elif reason == "no_features":
+            self.print(f"{indent}└─── Feature space is empty, returning parent node class: {label}")
+        else:
+            self.print(f"{indent}└─── Stopped by {reason}, returning majority class: '{label}' {class_distribution(fields)}")
+
+    def entropy_finished(self, **fields):
+        self.print("│\n└──── Finished ID3 algorithm")
+
+    # -- Gini (binary splits) ---------------------------------------------
+
+    def gini_node_entered(self, depth, path, classes, counts, **fields):
+        indent = generate_indent_tree_blocks(depth, path)
+        present = np.asarray(counts) > 0
+        elements, counts = np.asarray(classes)[present], np.asarray(counts)[present]
+        total_elements = np.sum(counts)
+        gini_components = [(counts[i] / total_elements) ** 2 for i in range(len(elements))]
+        block = "├" if depth > 0 else "┌"
+        root_or_parent = "Root" if depth == 0 else "Parent"
+        calc = self.gini_details(elements, counts, gini_components)
+        self.print(f"{indent}{block}──── {root_or_parent} class Gini: {calc}")
+        self.print(f"{indent}│")
+        self.print(f"{indent}├──┬─ Calculating reduction in impurity for features with binary splits:")
+
+    # Helper function to format Gini calculation details
+    def gini_details(self, elements, counts, gini_components):
+        total_elements = np.sum(counts)
+        details = []
+        for i in range(len(elements)):
+            details.append(f"({counts[i]}/{total_elements})^2")
+        joined_details = " + ".join(details)
+        gini_values = " + ".join([f"{1 - gini_component:0.4f}" for gini_component in gini_components])
+        total_gini = 1 - np.sum(gini_components)
+        return f"{joined_details} = {gini_values} = {total_gini:0.4f}"
+
+    def gini_candidate_scored(self, depth, path, split, kind, impurity, weighted_impurity, **fields):
+        indent = generate_indent_tree_blocks(depth, path)
+        if kind == "numeric":
+            self.print(f"{indent}     ├─ Considering: {split}:\t {weighted_impurity:0.4f}")
+        else:
+            lhs_string = f"{indent}│  ├──── {split}"
+            rhs_string = f": {impurity:0.4f} - {impurity-weighted_impurity:0.4f} = {weighted_impurity:0.4f}"
+            self.print(f"{lhs_string:<55}{rhs_string}")
+
+    def gini_split_chosen(self, depth, path, split, weighted_impurity, **fields):
+        indent = generate_indent_tree_blocks(depth, path)
+        self.print(f"{indent}│  │ ")
+        self.print(f"{indent}│  └──── Best feature to split on: {split}: {weighted_impurity:0.4f}")
+
+    def gini_branch_entered(self, depth, path, branch, side, pure, **fields):
+        indent = generate_indent_tree_blocks(depth, path)
+        self.print(f"{indent}│")
+        if pure:
+            return
+        block = "├" if side == "left" else "└"
+        self.print(f"{indent}{block}──┬─ {side.capitalize()} branch: {branch}")
+
+    def gini_leaf_created(self, depth, path, target, label, reason, branch=None, side=None, **fields):
+        if reason == "pure_branch":
+            indent = generate_indent_tree_blocks(depth - 1, path[:-1])
+            block = "├" if side == "left" else "└"
+            self.print(f"{indent}{block}──── {side.capitalize()} branch: {branch} only has one value for '{target}': '{label}'")
+            return
+        indent = generate_indent_tree_blocks(depth, path)
+        if reason == "pure":
+            self.print(f"{indent}└─── Done! Only one value for '{target}' remains: '{label}'")
+        elif reason == "empty":
+            self.print(f"{indent}└─── Dataset is empty, returning mode value: {label}")
+        elif reason == "no_features":
+            self.print(f"{indent}└─── Feature space is empty, returning parent node class: {label}")
+        elif reason == "no_gain":
+            self.print(f"{indent}└─── No valid feature found, returning parent node class: {label}")
+        else:
+            self.print(f"{indent}└─── Stopped by {reason}, returning majority class: '{label}' {class_distribution(fields)}")
+
+    def gini_finished(self, **fields):
+        self.print("\nFinished Gini tree algorithm")
+
+TRACE_FORMATS = {
+    "none": lambda file: NULL_TRACER,
+    "console": ConsoleTracer,
+    "jsonl": JsonlTracer,
+}
+
+def make_tracer(trace_format, file=None):
+    if trace_format == "jsonl" and file is None:
+        file = sys.stdout
+    return TRACE_FORMATS[trace_format](file)
+
+# Keeps events in memory so they can be replayed into another tracer later,
+# e.g. to forward the trace of a subtree built in a worker process
+class RecordingTracer(Tracer):
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event, **fields):
+        self.events.append((event, fields))
+
+def replay(events, tracer):
+    for event, fields in events:
+        tracer.emit(event, **fields)
@@ -1,131 +1,169 @@
+import sys
+
+# `trees.py predict MODEL INPUT` and `trees.py serve MODEL` only need NumPy
+# and the model file, so hand them over before pandas and the builders
+# are imported
+if __name__ == "__main__" and sys.argv[1:2] == ["predict"]:
+    from predict import main as predict_main
+    predict_main(sys.argv[2:])
+    sys.exit()
+if __name__ == "__main__" and sys.argv[1:2] == ["serve"]:
+    from serve import main as serve_main
+    serve_main(sys.argv[2:])
+    sys.exit()
+
+import os
 import pandas as pd
 import numpy as np
-from graphviz import Digraph
 from infogain import ID3
 from gini import gini_tree
+from tracing import make_tracer
+from streaming import stream_tree
+from profiling import Profiler
+from stopping import Limits
+from model import compile_tree, save_model
+from render import render_tree
+from rules import extract_rules, numpy_source, sql_case
 import argparse
 
 def get_target_classes(df, target_var):
     """Extract all unique values of the target variable from the dataframe"""
     return sorted(df[target_var].unique())
 
-def tree_to_dot(tree, target_var, df, parent_name='', graph=None, node_id=0):
-    # From Plotly's "Set3" color scale which is nice and pastel
-    colors = ['#8dd3c7', '#ffffb3', '#bebada', '#fb8072', 
-              '#80b1d3', '#fdb462', '#b3de69', '#fccde5', 
-              '#d9d9d9', '#bc80bd', '#ccebc5', '#ffed6f']
-                
-    # Get unique target classes and create color mapping
-    target_classes = get_target_classes(df, target_var)
-    
-    # Create color mapping based on number of target classes
-    if len(target_classes) == 2:
-        color_map = {
-            str(target_classes[0]): 'lightcoral',
-            str(target_classes[1]): 'palegreen'
-        }
-    else:
-        color_map = {
-            str(class_val): color 
-            for class_val, color in zip(target_classes, colors)
-        }
-    
-    if graph is None:
-        graph = Digraph(
-            graph_attr={
-                'splines': 'false',
-                'nodesep': '1.0',
-                'ranksep': '1.0',
-            },
-            node_attr={'fontname': 'Helvetica'},
-            edge_attr={'fontname': 'Helvetica'}
-        )
-        graph.node(name=str(node_id), label=str(list(tree.keys())[0]))
-        root_id = node_id
-        node_id += 1
-    else:
-        root_id = parent_name
-        
-    for value, subtree in tree[list(tree.keys())[0]].items():
-        if isinstance(subtree, dict):
-            # Internal decision node - no color
-            graph.node(name=str(node_id), label=str(list(subtree.keys())[0]))
-            if "{" in str(value):
-                value = value.split("{")[1].split("}")[0]
-            graph.edge(str(root_id), str(node_id), label=str(value))
-            graph, node_id = tree_to_dot(subtree, target_var, df, parent_name=node_id, graph=graph, node_id=node_id+1)
-        else:
-            # Leaf node - color based on target variable value
-            color = color_map.get(str(subtree))
-            graph.node(name=str(node_id), 
-                      label=str(subtree), 
-                      shape='box',
-                      fillcolor=color, 
-                      style='filled')
-            if "{" in str(value):
-                value = value.split("{")[1].split("}")[0]
-            graph.edge(str(root_id), str(node_id), xlabel=str(value))
-            node_id += 1
-            
-    return graph, node_id
-
-# Function to extract classification rules
-def extract_rules(tree, target_var, parent_name='', current_rule=''):
-    rules = []
-    root = list(tree.keys())[0]
-    
-    for value, subtree in tree[root].items():
-        if isinstance(subtree, dict):
-            rules += extract_rules(subtree, target_var, root, f"{current_rule} AND {root}={value}" if current_rule else f"{root}={value}")
-        else:
-            rule = f"{current_rule} AND {root}='{value}'" if current_rule else f"{root}='{value}'"
-            rule = f"IF {rule} THEN {target_var}='{subtree}'"
-            rules.append(rule)
-    
-    return rules
-
 def boxprint(text):
     print("┌" + "─" * (len(text) + 2) + "┐")
     print("│ " + text + " │")
     print("└" + "─" * (len(text) + 2) + "┘")
 
-def run_id3(df, target_var):
+# Write the tree as DOT text and lay it out as an SVG file unless `render` is
+# off. With `max_depth` or `max_nodes`, the collapsed subtrees are summarised
+# with the class counts of their training rows, which are only at hand when
+# training in memory (out of core, their leaves are tallied instead).
+def draw_tree(tree, name, target_var, df, stream_from=None, render=True, max_depth=None, max_nodes=None):
+    model = None
+    if (max_depth is not None or max_nodes is not None) and not stream_from:
+        model = compile_tree(tree, features=[col for col in df.columns if col != target_var], data=df,
+                             target_attribute=target_var)
+    return render_tree(tree, get_target_classes(df, target_var), name, max_depth, max_nodes, model, render)
+
+# With `stream_from`, the tree is trained out of core from that CSV file,
+# `chunksize` rows at a time, and `df` only needs the target column
+def run_id3(df, target_var, tracer=None, n_jobs=1, stream_from=None, chunksize=None, profiler=None,
+            render_options={}, limits=None):
     # Run ID3 algorithm using Information Gain
     boxprint(f"Decision tree using Information Gain (ID3) for {target_var}")
-    feature_columns = [col for col in df.columns if col != target_var]
-    entropy_tree = ID3(df, df, feature_columns, target_var)
+    if stream_from:
+        entropy_tree = stream_tree(stream_from, target_var, "entropy", chunksize=chunksize)
+    else:
+        feature_columns = [col for col in df.columns if col != target_var]
+        entropy_tree = ID3(df, df, feature_columns, target_var, tracer=tracer, n_jobs=n_jobs, profiler=profiler, limits=limits)
     print(entropy_tree)
-    graph, _ = tree_to_dot(entropy_tree, target_var, df)
-    graph.render('id3_tree', format='svg', cleanup=True)
-    boxprint("ID3 tree saved as 'id3_tree.svg'.")
+    path = draw_tree(entropy_tree, 'id3_tree', target_var, df, stream_from, **render_options)
+    boxprint(f"ID3 tree saved as '{path}'.")
     rules = extract_rules(entropy_tree, target_var)
     boxprint(f"Classification rules using Information Gain for {target_var}:")
     for rule in rules:
         print("  " + rule)
+    return entropy_tree
 
-def run_gini(df, target_var):
+def run_gini(df, target_var, tracer=None, n_jobs=1, stream_from=None, chunksize=None, profiler=None,
+             render_options={}, limits=None):
     # Run Gini-based decision tree algorithm
     boxprint(f"Decision tree using Gini Index (binary splits) for {target_var}")
-    feature_columns = [col for col in df.columns if col != target_var]
-    gt = gini_tree(df, df, feature_columns, target_var)
+    if stream_from:
+        gt = stream_tree(stream_from, target_var, "gini", chunksize=chunksize)
+    else:
+        feature_columns = [col for col in df.columns if col != target_var]
+        gt = gini_tree(df, df, feature_columns, target_var, tracer=tracer, n_jobs=n_jobs, profiler=profiler, limits=limits)
     print(gt)
-    graph, _ = tree_to_dot(gt, target_var, df)
-    graph.render('gini_tree', format='svg', cleanup=True)
-    boxprint("Gini tree saved as 'gini_tree.svg'.")
+    path = draw_tree(gt, 'gini_tree', target_var, df, stream_from, **render_options)
+    boxprint(f"Gini tree saved as '{path}'.")
     rules = extract_rules(gt, target_var)
     boxprint(f"Classification rules using Gini Index for {target_var}:")
     for rule in rules:
         print("  " + rule)
+    return gt
+
+# Compile a tree and write it in the binary model format. With training data
+# the model keeps per-node class counts (for predict --proba and unseen
+# categories); out of core only the classes are known.
+def save_tree(tree, path, target_var, algorithm, features, df, with_counts=True):
+    model = compile_tree(tree, features=features, classes=np.unique(df[target_var]),
+                         data=df if with_counts else None, target_attribute=target_var)
+    save_model(model, path, metadata={"target": target_var, "algorithm": algorithm})
+    boxprint(f"{ {'id3': 'ID3', 'gini': 'Gini'}[algorithm]} model saved as '{path}'.")
 
-def main():
+# Write the tree's rules as executable scoring code: `<algorithm>_rules.py`
+# defines predict(X) for a DataFrame, `<algorithm>_rules.sql` holds a CASE
+# expression to use in a SELECT over a table with the feature columns
+def export_rules(tree, algorithm, formats, target_var, features, df, with_counts=True):
+    model = compile_tree(tree, features=features, classes=np.unique(df[target_var]),
+                         data=df if with_counts else None, target_attribute=target_var)
+    for form in formats:
+        path = f"{algorithm}_rules.{ {'numpy': 'py', 'sql': 'sql'}[form]}"
+        with open(path, 'w') as f:
+            f.write(numpy_source(model) if form == 'numpy' else sql_case(model) + "\n")
+        boxprint(f"{ {'id3': 'ID3', 'gini': 'Gini'}[algorithm]} rules compiled to {form} in '{path}'.")
+
+# Where to save each tree: MODEL itself for a single algorithm, MODEL with
+# the algorithm inserted before the extension when both are trained
+def model_path(path, algorithm, selected):
+    if selected != 'both':
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{algorithm}{ext}"
+
+# `trees.py [train] TARGET INPUT [options]`; `train` is optional so the
+# original invocation keeps working. `trees.py predict` and `trees.py serve`
+# are handled above; `trees.py sweep` cross-validates (see sweep.py).
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['sweep']:
+        from sweep import main as sweep_main
+        sweep_main(argv[1:])
+        return
+    if argv[:1] == ['train']:
+        argv = argv[1:]
     parser = argparse.ArgumentParser(description='Generate decision trees with a specified target variable')
     parser.add_argument('target_variable', type=str, help='The target variable to predict')
     parser.add_argument('input', type=str, help='Input CSV file path')
-    args = parser.parse_args()
+    parser.add_argument('--trace', type=str, default='console', choices=['console', 'jsonl', 'none'],
+                        help='How to report the tree building steps (default: console)')
+    parser.add_argument('--trace-file', type=str, help='Write the trace to this file instead of stdout')
+    parser.add_argument('--quiet', action='store_true', help='Build the trees silently (same as --trace=none)')
+    parser.add_argument('--n-jobs', type=int, default=1, help='Worker processes used to build each tree (-1 for all cores)')
+    parser.add_argument('--chunksize', type=int, help='Train out of core, reading the input this many rows at a time')
+    parser.add_argument('--profile', type=str, nargs='?', const='profile.json',
+                        help='Profile every node and write the report to this JSON file (default: profile.json)')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='Also record the bytes allocated by every node (slows training and inflates the timings)')
+    parser.add_argument('--algorithm', choices=['both', 'id3', 'gini'], default='both', help='Which trees to build (default: both)')
+    parser.add_argument('--save', type=str, metavar='MODEL',
+                        help='Save the trained model(s) for `trees.py predict` (MODEL.id3/MODEL.gini before the extension when building both)')
+    parser.add_argument('--max-depth', type=int, help='Make every node at this depth a leaf (the root has depth 0)')
+    parser.add_argument('--min-samples-split', type=int, default=2, help='Make nodes with fewer rows than this leaves (default: 2)')
+    parser.add_argument('--min-samples-leaf', type=int, default=1,
+                        help='Only consider splits leaving at least this many rows in every child (default: 1)')
+    parser.add_argument('--min-impurity-decrease', type=float, default=0.0,
+                        help="Only split when the impurity decrease, weighted by the node's share of the rows, is at least this")
+    parser.add_argument('--max-leaf-nodes', type=int, help='Grow each tree best-first to at most this many leaves')
+    parser.add_argument('--max-nodes', type=int, help='Grow each tree best-first to at most this many nodes')
+    parser.add_argument('--time-budget', type=float, metavar='SECONDS', help='Grow each tree best-first for at most this many seconds')
+    parser.add_argument('--export-rules', nargs='+', choices=['numpy', 'sql'], metavar='FORMAT',
+                        help='Compile the rules into scoring code: numpy (id3_rules.py) and/or sql (id3_rules.sql), likewise for gini')
+    parser.add_argument('--no-render', action='store_true',
+                        help="Only write the trees' DOT files (id3_tree.gv, gini_tree.gv) instead of rendering them to SVG")
+    parser.add_argument('--render-depth', type=int, metavar='N', help='Draw nodes down to depth N and summarise deeper subtrees')
+    parser.add_argument('--render-nodes', type=int, metavar='N', help='Draw at most N nodes and summarise the remaining subtrees')
+    args = parser.parse_args(argv)
+    limits = Limits(args.max_depth, args.min_samples_split, args.min_samples_leaf, args.min_impurity_decrease,
+                    args.max_leaf_nodes, args.max_nodes, args.time_budget)
+    if limits.enabled and args.chunksize:
+        parser.error('stopping limits are not supported with --chunksize')
     
-    # Read the data
+    # Read the data (only the header when training out of core)
     try:
-        df = pd.read_csv(args.input)
+        df = pd.read_csv(args.input, nrows=0 if args.chunksize else None)
     except FileNotFoundError:
         print(f"Error: Could not find input file '{args.input}'")
         return
@@ -136,9 +174,40 @@ def main():
         print(f"Available columns: {', '.join(df.columns)}")
         return
     
+    # Out of core, the trees are built from the file; keep just the distinct
+    # target values for coloring the rendered trees
+    stream_from = None
+    feature_columns = [col for col in df.columns if col != args.target_variable]
+    if args.chunksize:
+        stream_from = args.input
+        df = pd.concat(chunk.drop_duplicates() for chunk in
+                       pd.read_csv(args.input, usecols=[args.target_variable], chunksize=args.chunksize)).drop_duplicates()
+    
     # Run both algorithms
-    run_id3(df, args.target_variable)
-    run_gini(df, args.target_variable)
+    trace_format = 'none' if args.quiet else args.trace
+    trace_file = open(args.trace_file, 'w') if args.trace_file else None
+    try:
+        tracer = make_tracer(trace_format, trace_file)
+        profiler = Profiler(track_memory=args.profile_memory) if args.profile else None
+        render_options = {'render': not args.no_render, 'max_depth': args.render_depth, 'max_nodes': args.render_nodes}
+        for algorithm, run in (('id3', run_id3), ('gini', run_gini)):
+            if args.algorithm not in ('both', algorithm):
+                continue
+            tree = run(df, args.target_variable, tracer, args.n_jobs, stream_from, args.chunksize, profiler, render_options, limits)
+            if args.save:
+                save_tree(tree, model_path(args.save, algorithm, args.algorithm), args.target_variable, algorithm,
+                          feature_columns, df, with_counts=not stream_from)
+            if args.export_rules:
+                export_rules(tree, algorithm, args.export_rules, args.target_variable, feature_columns, df,
+                             with_counts=not stream_from)
+        if profiler:
+            with open(args.profile, 'w') as f:
+                profiler.to_json(f)
+            boxprint(f"Training profile saved as '{args.profile}'.")
+            profiler.print_summary()
+    finally:
+        if trace_file:
+            trace_file.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file